@@ -2,69 +2,82 @@ from fastapi import (
     APIRouter,
     UploadFile,
     HTTPException,
-    BackgroundTasks,
     Depends,
 )
-from fastapi.responses import JSONResponse
 import pandas as pd
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-import io
-from database import get_db
-from services.upload import process_csv_file
+import shutil
+import tempfile
+from database import get_async_db, get_db
+from schemas import ImportJob as ImportJobSchema, ImportMode
+from services.import_jobs import (
+    cancel_import_job,
+    create_import_job,
+    get_import_job,
+)
+from services.upload import (
+    NOT_UTF8,
+    REQUIRED_COLUMNS,
+    normalize_columns,
+    read_csv_header,
+)
 
 router = APIRouter(prefix="/accidents")
 
 
-@router.post("/upload")
-async def upload_accidents(
-    background_tasks: BackgroundTasks,
+@router.post("/upload/jobs", response_model=ImportJobSchema, status_code=202)
+def upload_accidents(
     file: UploadFile,
+    mode: ImportMode = "upsert",
     db: Session = Depends(get_db),
 ):
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="File must be a CSV")
 
     try:
-        # Read the CSV file
-        contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode("utf-8")))
+        # Only the header is parsed here, the rows are streamed by the job
+        columns = normalize_columns(read_csv_header(file.file))
+    except pd.errors.EmptyDataError:
+        raise HTTPException(status_code=400, detail="CSV file is empty")
+    except pd.errors.ParserError:
+        raise HTTPException(status_code=400, detail="Invalid CSV format")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail=NOT_UTF8)
 
-        # Validate required columns
-        required_columns = [
-            "date",
-            "latitude",
-            "longitude",
-            "address",
-            "severity",
-            "road_type",
-            "weather",
-            "description",
-            "casualties",
-            "vehicles_involved",
-        ]
+    # Validate required columns
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing_columns:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Missing required columns: {', '.join(missing_columns)}",
+        )
 
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Missing required columns: {', '.join(missing_columns)}",
-            )
+    # The upload is closed once the response is sent, so copy it to a
+    # file owned by the import job
+    with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as spool:
+        shutil.copyfileobj(file.file, spool)
 
-        # Process the CSV file in the background
-        background_tasks.add_task(process_csv_file, df, db)
+    return create_import_job(
+        db, spool.name, file.filename, upsert=mode == "upsert"
+    )
 
-        return JSONResponse(
-            content={
-                "message": "CSV upload started",
-                "total_rows": len(df),
-                "status": "processing",
-            },
-            status_code=202,
-        )
 
-    except pd.errors.EmptyDataError:
-        raise HTTPException(status_code=400, detail="CSV file is empty")
-    except pd.errors.ParserError:
-        raise HTTPException(status_code=400, detail="Invalid CSV format")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@router.get("/upload/{job_id}", response_model=ImportJobSchema)
+async def get_upload_status(
+    job_id: str, db: AsyncSession = Depends(get_async_db)
+):
+    job = await db.run_sync(get_import_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
+@router.post("/upload/{job_id}/cancel", response_model=ImportJobSchema)
+async def cancel_upload(
+    job_id: str, db: AsyncSession = Depends(get_async_db)
+):
+    job = await db.run_sync(cancel_import_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
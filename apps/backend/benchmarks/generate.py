@@ -0,0 +1,317 @@
+"""
+Seeded generator of synthetic accidents shaped like the STATS19 road
+safety data, written as a CSV file the upload endpoint accepts.
+
+    python -m benchmarks.generate 1M accidents.csv --seed 1
+
+The same row count, seed and chunk size always produce the same file.
+"""
+import argparse
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+import pandas as pd
+
+CHUNK_SIZE = 100_000
+FIRST_YEAR = 2015
+YEARS = 5
+
+# City centres accidents cluster around: latitude, longitude, spread in
+# degrees, share of accidents, police force and local authority
+CITIES = [
+    (51.507, -0.128, 0.12, 0.20, "Metropolitan Police", "Westminster"),
+    (53.480, -2.242, 0.08, 0.07, "Greater Manchester", "Manchester"),
+    (52.486, -1.890, 0.08, 0.06, "West Midlands", "Birmingham"),
+    (53.801, -1.549, 0.07, 0.04, "West Yorkshire", "Leeds"),
+    (53.408, -2.992, 0.06, 0.03, "Merseyside", "Liverpool"),
+    (55.864, -4.252, 0.06, 0.03, "Strathclyde", "Glasgow City"),
+    (51.454, -2.588, 0.05, 0.02, "Avon and Somerset", "Bristol, City of"),
+    (54.978, -1.618, 0.05, 0.02, "Northumbria", "Newcastle upon Tyne"),
+    (55.953, -3.188, 0.05, 0.02, "Lothian and Borders", "Edinburgh"),
+    (51.481, -3.179, 0.04, 0.02, "South Wales", "Cardiff"),
+    (52.954, -1.158, 0.04, 0.02, "Nottinghamshire", "Nottingham"),
+    (53.383, -1.465, 0.05, 0.02, "South Yorkshire", "Sheffield"),
+]
+# Forces and districts of the accidents spread across the country
+RURAL_FORCES = [
+    ("Kent", "Maidstone"),
+    ("Thames Valley", "Oxford"),
+    ("Devon and Cornwall", "Cornwall"),
+    ("Norfolk", "Breckland"),
+    ("North Yorkshire", "Harrogate"),
+    ("Cumbria", "Eden"),
+    ("Lincolnshire", "East Lindsey"),
+    ("Dyfed-Powys", "Powys"),
+    ("Northern", "Highland"),
+    ("Hampshire", "Winchester"),
+]
+
+# Values of the category columns with their share of accidents
+CATEGORIES: Dict[str, Tuple[List[str], List[float]]] = {
+    "accident_severity": (
+        ["Slight", "Serious", "Fatal"],
+        [0.85, 0.135, 0.015],
+    ),
+    "first_road_class": (
+        ["A", "Unclassified", "B", "C", "Motorway", "A(M)"],
+        [0.45, 0.30, 0.12, 0.08, 0.04, 0.01],
+    ),
+    "road_type": (
+        [
+            "Single carriageway",
+            "Dual carriageway",
+            "Roundabout",
+            "One way street",
+            "Slip road",
+            "Unknown",
+        ],
+        [0.74, 0.15, 0.065, 0.02, 0.01, 0.015],
+    ),
+    "junction_control": (
+        [
+            "Give way or uncontrolled",
+            "Auto traffic signal",
+            "Not at junction or within 20 metres",
+            "Stop sign",
+            "Authorised person",
+        ],
+        [0.48, 0.10, 0.40, 0.015, 0.005],
+    ),
+    "second_road_class": (
+        ["Unclassified", "A", "B", "C", "Motorway", "A(M)"],
+        [0.55, 0.25, 0.09, 0.09, 0.015, 0.005],
+    ),
+    "pedestrian_crossing_human_control": (
+        [
+            "None within 50 metres",
+            "Control by school crossing patrol",
+            "Control by other authorised person",
+        ],
+        [0.995, 0.003, 0.002],
+    ),
+    "pedestrian_crossing_physical_facilities": (
+        [
+            "No physical crossing facilities within 50 metres",
+            "Pedestrian phase at traffic signal junction",
+            "Pelican, puffin, toucan or similar non-junction pedestrian "
+            "light crossing",
+            "Zebra",
+            "Central refuge",
+            "Footbridge or subway",
+        ],
+        [0.83, 0.07, 0.05, 0.03, 0.018, 0.002],
+    ),
+    "weather_conditions": (
+        [
+            "Fine no high winds",
+            "Raining no high winds",
+            "Other",
+            "Unknown",
+            "Raining + high winds",
+            "Fine + high winds",
+            "Snowing no high winds",
+            "Fog or mist",
+            "Snowing + high winds",
+        ],
+        [0.79, 0.12, 0.025, 0.02, 0.014, 0.013, 0.008, 0.006, 0.004],
+    ),
+    "road_surface_conditions": (
+        [
+            "Dry",
+            "Wet or damp",
+            "Frost or ice",
+            "Snow",
+            "Flood over 3cm. deep",
+        ],
+        [0.70, 0.27, 0.02, 0.008, 0.002],
+    ),
+    "special_conditions_at_site": (
+        [
+            "None",
+            "Roadworks",
+            "Road surface defective",
+            "Oil or diesel",
+            "Mud",
+            "Auto traffic signal - out",
+            "Road sign or marking defective or obscured",
+        ],
+        [0.975, 0.011, 0.004, 0.004, 0.003, 0.002, 0.001],
+    ),
+    "carriageway_hazards": (
+        [
+            "None",
+            "Other object on road",
+            "Any animal in carriageway (except ridden horse)",
+            "Pedestrian in carriageway - not injured",
+            "Previous accident",
+            "Vehicle load on road",
+        ],
+        [0.982, 0.007, 0.005, 0.002, 0.002, 0.002],
+    ),
+    "did_police_officer_attend": (
+        [
+            "Yes",
+            "No",
+            "No - accident was reported using a self completion form "
+            "(self rep only)",
+        ],
+        [0.79, 0.16, 0.05],
+    ),
+}
+SPEED_LIMITS = (
+    [20, 30, 40, 50, 60, 70],
+    [0.05, 0.62, 0.08, 0.04, 0.13, 0.08],
+)
+# Relative number of accidents in each hour of the day, peaking at the
+# morning and evening commutes
+HOUR_WEIGHTS = np.array(
+    [10, 7, 5, 4, 4, 7, 15, 35, 60, 45, 40, 45]
+    + [50, 50, 55, 70, 75, 80, 65, 50, 38, 30, 25, 18],
+    dtype=float,
+)
+
+
+def generate_chunk(rng: np.random.Generator, rows: int) -> pd.DataFrame:
+    """Generate ``rows`` accidents with the random generator."""
+    city_shares = np.array([city[3] for city in CITIES])
+    # The remaining share is spread across the country
+    places = rng.choice(
+        len(CITIES) + 1, rows, p=[*city_shares, 1 - city_shares.sum()]
+    )
+    in_city = places < len(CITIES)
+    city = np.minimum(places, len(CITIES) - 1)
+    rural = rng.integers(0, len(RURAL_FORCES), rows)
+
+    spread = np.array([c[2] for c in CITIES])[city]
+    latitude = np.where(
+        in_city,
+        np.array([c[0] for c in CITIES])[city] + rng.normal(0, spread),
+        rng.uniform(50.2, 57.5, rows),
+    )
+    longitude = np.where(
+        in_city,
+        np.array([c[1] for c in CITIES])[city] + rng.normal(0, spread),
+        rng.uniform(-4.5, 1.5, rows),
+    )
+    # Near enough to the British National Grid for synthetic data
+    northing = (latitude - 49.766) * 111_200
+    easting = 400_000 + (longitude + 2) * 111_320 * np.cos(
+        np.radians(latitude)
+    )
+
+    first_day = np.datetime64(f"{FIRST_YEAR}-01-01")
+    days = (np.datetime64(f"{FIRST_YEAR + YEARS}-01-01") - first_day).item()
+    dates = pd.DatetimeIndex(
+        first_day + rng.integers(0, days.days, rows).astype("timedelta64[D]")
+    )
+    hours = rng.choice(24, rows, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    minutes = rng.integers(0, 60, rows)
+
+    df = pd.DataFrame(
+        {
+            "location_easting": easting.round(),
+            "location_northing": northing.round(),
+            "longitude": longitude.round(6),
+            "latitude": latitude.round(6),
+            "police_force": np.where(
+                in_city,
+                np.array([c[4] for c in CITIES])[city],
+                np.array([f[0] for f in RURAL_FORCES])[rural],
+            ),
+            "number_of_vehicles": 1 + rng.poisson(0.85, rows),
+            "number_of_casualties": 1 + rng.poisson(0.35, rows),
+            "date": dates.strftime("%d/%m/%Y"),
+            # STATS19 numbers the days from 1 for Sunday
+            "day_of_week": (dates.dayofweek.to_numpy() + 1) % 7 + 1,
+            "time": [f"{h:02d}:{m:02d}" for h, m in zip(hours, minutes)],
+            "local_authority_district": np.where(
+                in_city,
+                np.array([c[5] for c in CITIES])[city],
+                np.array([f[1] for f in RURAL_FORCES])[rural],
+            ),
+            "first_road_number": rng.integers(1, 7000, rows).astype(str),
+            "speed_limit": rng.choice(
+                SPEED_LIMITS[0], rows, p=SPEED_LIMITS[1]
+            ),
+            "second_road_number": rng.integers(1, 7000, rows).astype(str),
+            "light_conditions": _light_conditions(rng, hours),
+            "urban_or_rural_area": np.where(
+                in_city | (rng.random(rows) < 0.3), "Urban", "Rural"
+            ),
+            "lsoa_of_accident_location": [
+                f"E0{code}" for code in rng.integers(1000001, 1035000, rows)
+            ],
+            "year": dates.year,
+        }
+    )
+    df["local_authority_highway"] = df["local_authority_district"]
+    for column, (values, shares) in CATEGORIES.items():
+        df[column] = rng.choice(values, rows, p=shares)
+
+    # Only the major roads are numbered
+    unnumbered = df["first_road_class"].isin(["Unclassified", "C"])
+    df.loc[unnumbered, "first_road_number"] = "0"
+    no_junction = df["junction_control"].str.startswith("Not at junction")
+    df.loc[no_junction, "second_road_class"] = None
+    df.loc[no_junction, "second_road_number"] = None
+    return df
+
+
+def generate_accidents(
+    rows: int, seed: int = 0, chunk_size: int = CHUNK_SIZE
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield ``rows`` accidents in chunks of ``chunk_size``. Each chunk has a
+    generator of its own seeded from ``seed`` and the chunk number.
+    """
+    for number, start in enumerate(range(0, rows, chunk_size)):
+        rng = np.random.default_rng([seed, number])
+        yield generate_chunk(rng, min(chunk_size, rows - start))
+
+
+def write_csv(path: str, rows: int, seed: int = 0) -> str:
+    for number, df in enumerate(generate_accidents(rows, seed)):
+        df.to_csv(
+            path, mode="a" if number else "w", header=not number, index=False
+        )
+    return path
+
+
+def parse_rows(value: str) -> int:
+    """A row count such as ``10000``, ``10k`` or ``1M``."""
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    suffix = value[-1:].lower()
+    if suffix in multipliers:
+        return int(float(value[:-1]) * multipliers[suffix])
+    return int(value)
+
+
+def _light_conditions(
+    rng: np.random.Generator, hours: np.ndarray
+) -> np.ndarray:
+    dark = rng.choice(
+        [
+            "Darkness - lights lit",
+            "Darkness - no lighting",
+            "Darkness - lighting unknown",
+            "Darkness - lights unlit",
+        ],
+        len(hours),
+        p=[0.75, 0.18, 0.05, 0.02],
+    )
+    daylight = (hours >= 7) & (hours < 19)
+    # Dusk and dawn move with the seasons
+    daylight ^= rng.random(len(hours)) < 0.08
+    return np.where(daylight, "Daylight", dark)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("rows", type=parse_rows, help="e.g. 10k, 1M, 10M")
+    parser.add_argument("path", help="CSV file to write")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_csv(args.path, args.rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
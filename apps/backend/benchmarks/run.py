@@ -0,0 +1,335 @@
+"""
+Benchmark CSV import, list pagination and the analytics endpoints
+against a database filled with synthetic accidents.
+
+    python -m benchmarks.run --rows 1M --output results.json
+    python -m benchmarks.run --rows 1M --baseline results.json
+
+The database must hold no accidents, it defaults to a new SQLite file.
+Results are written as JSON so later runs can be compared to them.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from benchmarks.generate import parse_rows, write_csv
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Settings the app requires that a database URL makes unused
+PLACEHOLDER_SETTINGS = {
+    "DATABASE_HOST": "localhost",
+    "DATABASE_PORT": "5432",
+    "DATABASE_USER": "benchmark",
+    "DATABASE_PASSWORD": "benchmark",
+    "DATABASE_NAME": "benchmark",
+}
+ANALYTICS_ENDPOINTS = {
+    "summary": "/api/v1/analytics/summary",
+    "by_severity": "/api/v1/analytics/by-severity",
+    "by_road_type": "/api/v1/analytics/by-road-type",
+    "by_weather": "/api/v1/analytics/by-weather",
+    "top_locations": "/api/v1/analytics/top-locations",
+    "hotspots": "/api/v1/analytics/hotspots",
+    "timeseries": "/api/v1/analytics/timeseries",
+    "breakdown": (
+        "/api/v1/analytics/breakdown?dims=road_type,weather_conditions"
+    ),
+    "dashboard": "/api/v1/analytics/dashboard",
+}
+PAGE_SIZE = 100
+
+
+def peak_rss_mb() -> float:
+    """
+    The peak resident set size of this process so far. It never drops, so
+    it is reported once for the whole run rather than per phase.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def latency_stats(seconds: List[float]) -> Dict[str, float]:
+    ms = np.array(seconds) * 1000
+    return {
+        "requests": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def throughput_stats(rows: int, seconds: float) -> Dict[str, float]:
+    return {
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows / seconds, 1),
+    }
+
+
+def timed_requests(
+    request: Callable[[], Any], repeat: int, warmup: int = 1
+) -> List[float]:
+    """Seconds taken by each of ``repeat`` requests after the warmup."""
+    for _ in range(warmup):
+        request()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        request()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def checked(response):
+    if response.status_code >= 400:
+        raise RuntimeError(
+            f"{response.request.url} returned {response.status_code}: "
+            f"{response.text[:200]}"
+        )
+    return response
+
+
+def run(args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    # The app reads its settings when first imported
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["CACHE_BACKEND"] = "memory" if args.cache else "none"
+    for name, value in PLACEHOLDER_SETTINGS.items():
+        os.environ.setdefault(name, value)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import func, select
+    import main
+    from config import get_settings
+    from database import SessionLocal, engine
+    from models import Accident
+    from services.upload import iter_csv_chunks, process_csv_file
+
+    with SessionLocal() as db:
+        if db.scalar(select(func.count(Accident.id))):
+            raise SystemExit(
+                "The benchmark database already holds accidents"
+            )
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "rows": args.rows,
+            "seed": args.seed,
+            "upload_rows": args.upload_rows,
+            "repeat": args.repeat,
+            "dialect": engine.dialect.name,
+            "analytics_engine": get_settings().analytics_engine,
+            "cache": args.cache,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "git_commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+        },
+    }
+
+    path = os.path.join(workdir, "accidents.csv")
+    start = time.perf_counter()
+    write_csv(path, args.rows, args.seed)
+    results["generate"] = throughput_stats(
+        args.rows, time.perf_counter() - start
+    )
+    print(f"generate: {results['generate']}", file=sys.stderr)
+
+    with SessionLocal() as db:
+        start = time.perf_counter()
+        summary = process_csv_file(iter_csv_chunks(path), db)
+        seconds = time.perf_counter() - start
+    if summary["failed"]:
+        raise RuntimeError(f"Import failed: {summary['errors'][:5]}")
+    results["import_service"] = throughput_stats(args.rows, seconds)
+    print(f"import_service: {results['import_service']}", file=sys.stderr)
+    os.remove(path)
+
+    with TestClient(main.app) as client:
+        if args.upload_rows:
+            # Different accidents from the ones already imported
+            upload_path = write_csv(
+                os.path.join(workdir, "upload.csv"),
+                args.upload_rows,
+                args.seed + 1,
+            )
+            with open(upload_path, "rb") as file:
+                start = time.perf_counter()
+                checked(
+                    client.post(
+                        "/api/v1/accidents/upload",
+                        files={"file": ("accidents.csv", file, "text/csv")},
+                    )
+                )
+                seconds = time.perf_counter() - start
+            os.remove(upload_path)
+            results["import_endpoint"] = throughput_stats(
+                args.upload_rows, seconds
+            )
+            print(
+                f"import_endpoint: {results['import_endpoint']}",
+                file=sys.stderr,
+            )
+
+        results["pagination"] = pagination_stats(client, args)
+        print(f"pagination: {results['pagination']}", file=sys.stderr)
+
+        results["analytics"] = {}
+        for name, url in ANALYTICS_ENDPOINTS.items():
+            results["analytics"][name] = latency_stats(
+                timed_requests(
+                    lambda: checked(client.get(url)), args.repeat
+                )
+            )
+            print(
+                f"analytics.{name}: {results['analytics'][name]}",
+                file=sys.stderr,
+            )
+
+    results["meta"]["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return results
+
+
+def pagination_stats(client, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Walk ``args.pages`` pages of the list with the cursor, then time a
+    page far into the list by ``skip`` for comparison.
+    """
+    seconds = []
+    cursor = None
+    for _ in range(args.pages):
+        params = {"limit": PAGE_SIZE}
+        if cursor:
+            params["cursor"] = cursor
+        start = time.perf_counter()
+        response = checked(client.get("/api/v1/accidents/", params=params))
+        seconds.append(time.perf_counter() - start)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    deep = {"limit": PAGE_SIZE, "skip": max(args.rows - PAGE_SIZE, 0)}
+    return {
+        "cursor": latency_stats(seconds),
+        "deep_skip": latency_stats(
+            timed_requests(
+                lambda: checked(
+                    client.get("/api/v1/accidents/", params=deep)
+                ),
+                max(args.repeat // 4, 1),
+            )
+        ),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """
+    One line for every figure measured by both runs, with its change
+    from the baseline in percent.
+    """
+    lines = []
+
+    def walk(current, previous, name):
+        for key, value in current.items():
+            if key not in previous or key == "meta":
+                continue
+            if isinstance(value, dict):
+                walk(value, previous[key], f"{name}{key}.")
+            elif isinstance(value, float) and previous[key]:
+                change = (value - previous[key]) / previous[key] * 100
+                lines.append(
+                    f"{name}{key}: {previous[key]} -> {value} "
+                    f"({change:+.1f}%)"
+                )
+
+    walk(results, baseline, "")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--rows", type=parse_rows, default=10_000, help="e.g. 10k, 1M, 10M"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--database-url",
+        help="SQLAlchemy URL of an empty database, by default a new SQLite "
+        "file",
+    )
+    parser.add_argument(
+        "--upload-rows",
+        type=parse_rows,
+        help="Rows to import through the upload endpoint, by default up to "
+        "100k",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="Requests per endpoint"
+    )
+    parser.add_argument(
+        "--pages", type=int, default=50, help="List pages to walk"
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Keep the analytics response cache enabled",
+    )
+    parser.add_argument("--output", help="JSON file to write results to")
+    parser.add_argument(
+        "--baseline", help="JSON results of an earlier run to compare to"
+    )
+    args = parser.parse_args()
+    if args.upload_rows is None:
+        args.upload_rows = min(args.rows, 100_000)
+
+    sys.path.insert(0, BACKEND_DIR)
+    with tempfile.TemporaryDirectory() as workdir:
+        if not args.database_url:
+            args.database_url = (
+                f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+            )
+        results = run(args, workdir)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        for key in ("rows", "dialect", "analytics_engine", "cache"):
+            if baseline["meta"].get(key) != results["meta"][key]:
+                print(
+                    f"The baseline differs in {key}: "
+                    f"{baseline['meta'].get(key)}",
+                    file=sys.stderr,
+                )
+        for line in compare(results, baseline):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,9 +9,54 @@ class Settings(BaseSettings):
     database_user: str
     database_password: str
     database_name: str
+    database_url: Optional[str] = None
+    # Read-only replica for analytics and listings, the primary if unset
+    database_replica_url: Optional[str] = None
+    # Seconds a client reads from the primary after writing, so it sees
+    # its changes before the replica has them
+    read_your_writes_seconds: int = 5
+    # PostgreSQL connection pool of each engine
+    database_pool_size: int = 5
+    database_max_overflow: int = 10
+    database_pool_recycle_seconds: int = 1800
+    database_pool_pre_ping: bool = True
+    # Longest a request's statement may run on PostgreSQL, 0 for no limit
+    database_statement_timeout_ms: int = 0
+    # Request, SQL and import metrics served at /metrics
+    metrics_enabled: bool = True
+    # Send each request's database time in a Server-Timing header
+    server_timing_enabled: bool = True
+    # Log statements taking at least this many milliseconds, 0 disables
+    slow_query_ms: int = 0
     secret_key: str = "my-super-secret-key-here"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 1000
+    # Threads hashing and verifying passwords
+    password_hash_workers: int = 4
+    # Seconds an authenticated user is cached per token, 0 disables
+    auth_cache_ttl_seconds: int = 60
+    # Tokens whose user is cached at most, per process
+    auth_cache_max_entries: int = 10000
+    upload_chunk_size: int = 10000
+    upload_max_errors: int = 1000
+    # Columns identifying an accident across imports, "*" for every column
+    import_natural_key: str = "date,time,latitude,longitude,police_force"
+    import_workers: int = 2
+    # Processes parsing a background import, 0 uses every core
+    import_processes: int = 1
+    import_range_bytes: int = 16 * 1024 * 1024
+    # Answer analytics from the daily rollup table where filters allow
+    analytics_use_rollup: bool = True
+    # "sql", or "snapshot" to answer analytics from an in-memory columnar
+    # copy of the accidents
+    analytics_engine: str = "sql"
+    snapshot_max_age_seconds: int = 60
+    # Analytics response cache: "memory", "redis" (needs the redis
+    # package) or "none"
+    cache_backend: str = "memory"
+    cache_url: str = "redis://localhost:6379/0"
+    cache_ttl_seconds: int = 300
+    cache_max_entries: int = 1024
 
     model_config = SettingsConfigDict(env_file=".env")
 
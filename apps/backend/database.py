@@ -1,21 +1,105 @@
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from config import get_settings
+from services.metrics import instrument_engine, timed_pool_class
 
 settings = get_settings()
 
 
-SQLALCHEMY_DATABASE_URL = (
+SQLALCHEMY_DATABASE_URL = settings.database_url or (
     f"postgresql://{settings.database_user}:{settings.database_password}"
     f"@{settings.database_host}:{settings.database_port}/"
     f"{settings.database_name}"
 )
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Async driver used by the API for each database
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+# Set on responses to writes, while it lasts reads go to the primary
+READ_PRIMARY_COOKIE = "read_primary"
+
+
+def async_database_url(url: str) -> URL:
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+def engine_options(url: URL, statement_timeout: bool = False) -> dict:
+    """
+    Pool settings for an engine on ``url``, and with ``statement_timeout``
+    the configured limit on each statement of an asyncpg engine. Both only
+    apply to PostgreSQL.
+    """
+    if url.get_backend_name() != "postgresql":
+        return {}
+    options = {
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_recycle": settings.database_pool_recycle_seconds,
+        "pool_pre_ping": settings.database_pool_pre_ping,
+    }
+    timeout = settings.database_statement_timeout_ms
+    if statement_timeout and timeout:
+        # Set by asyncpg on every connection it opens
+        options["connect_args"] = {
+            "server_settings": {"statement_timeout": str(timeout)}
+        }
+    return options
+
+
+def pool_options(url: URL, name: str) -> dict:
+    """A pool timing its checkouts as engine ``name``, with metrics on."""
+    if not settings.metrics_enabled:
+        return {}
+    return {"poolclass": timed_pool_class(url, name)}
+
+
+def create_api_engine(url: str, name: str):
+    url = async_database_url(url)
+    return create_async_engine(
+        url,
+        **engine_options(url, statement_timeout=True),
+        **pool_options(url, name),
+    )
+
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    **engine_options(make_url(SQLALCHEMY_DATABASE_URL)),
+    **pool_options(make_url(SQLALCHEMY_DATABASE_URL), "sync"),
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Request handlers use the async engines. The sync one remains for the
+# migrations, the bulk loader and the background workers, which are not
+# subject to the statement timeout.
+async_engine = create_api_engine(SQLALCHEMY_DATABASE_URL, "async")
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+if settings.database_replica_url:
+    replica_engine = create_api_engine(
+        settings.database_replica_url, "replica"
+    )
+else:
+    replica_engine = async_engine
+ReadSessionLocal = async_sessionmaker(
+    replica_engine, autoflush=False, expire_on_commit=False
+)
+
+if settings.metrics_enabled:
+    instrument_engine(engine, "sync")
+    instrument_engine(async_engine.sync_engine, "async")
+    if replica_engine is not async_engine:
+        instrument_engine(replica_engine.sync_engine, "replica")
+
 Base = declarative_base()
 
 
@@ -26,3 +110,24 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db(request: Request):
+    """
+    Session for read-only queries, on the replica unless the client wrote
+    in the last ``read_your_writes_seconds``.
+    """
+    if READ_PRIMARY_COOKIE in request.cookies:
+        factory = AsyncSessionLocal
+    else:
+        factory = ReadSessionLocal
+    request.state.replica_read = replica_engine is not async_engine and (
+        factory is ReadSessionLocal
+    )
+    async with factory() as db:
+        yield db
@@ -1,5 +1,26 @@
-from database import engine, Base
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from database import engine
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "alembic.ini")
+
+# The schema created by Base.metadata.create_all before migrations existed
+LEGACY_REVISION = "0001"
 
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    config = Config(ALEMBIC_INI)
+    config.set_main_option(
+        "script_location",
+        os.path.join(os.path.dirname(__file__), "migrations"),
+    )
+    config.attributes["configure_logger"] = False
+
+    inspector = inspect(engine)
+    if inspector.has_table("accidents") and not inspector.has_table(
+        "alembic_version"
+    ):
+        command.stamp(config, LEGACY_REVISION)
+    command.upgrade(config, "head")
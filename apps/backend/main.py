@@ -1,9 +1,14 @@
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from routers import accidents, analytics, auth
 from api import upload
 from init_db import init_db
 from config import get_settings
+from database import READ_PRIMARY_COOKIE
+from services import metrics
+from services.categories import category_codes
 
 settings = get_settings()
 
@@ -11,6 +16,8 @@ app = FastAPI(title="Accident Analysis API")
 
 # Initialize database
 init_db()
+# Read before serving, so no request waits for it
+category_codes.reload()
 
 
 # Configure CORS
@@ -20,8 +27,59 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "Server-Timing"],
 )
 
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    """
+    After a successful write, send the client's reads to the primary for
+    a while so the replica's lag does not hide its change.
+    """
+    response = await call_next(request)
+    if (
+        settings.database_replica_url
+        and request.method not in ("GET", "HEAD", "OPTIONS")
+        and response.status_code < 400
+    ):
+        response.set_cookie(
+            READ_PRIMARY_COOKIE,
+            "1",
+            max_age=settings.read_your_writes_seconds,
+            httponly=True,
+        )
+    return response
+
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """
+    Time the request and count its SQL statements, for /metrics and the
+    Server-Timing header. A streamed body is not timed past its headers.
+    """
+    if not settings.metrics_enabled:
+        return await call_next(request)
+    stats = metrics.start_request(request)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        metrics.finish_request(
+            stats, request.method, 500, time.perf_counter() - started
+        )
+        raise
+    seconds = time.perf_counter() - started
+    metrics.finish_request(
+        stats, request.method, response.status_code, seconds
+    )
+    if settings.server_timing_enabled:
+        response.headers["Server-Timing"] = metrics.server_timing(
+            stats, seconds
+        )
+    return response
+
+
 # Include routers
 app.include_router(
     accidents.router,
@@ -54,3 +112,13 @@ app.include_router(
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Accident Analysis API"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Metrics of this process in the Prometheus text format."""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(
+        metrics.registry.render(), media_type=metrics.CONTENT_TYPE
+    )
@@ -0,0 +1,92 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "accidents",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("location_easting", sa.Float(), nullable=True),
+        sa.Column("location_northing", sa.Float(), nullable=True),
+        sa.Column("longitude", sa.Float(), nullable=True),
+        sa.Column("latitude", sa.Float(), nullable=True),
+        sa.Column("police_force", sa.String(), nullable=True),
+        sa.Column("accident_severity", sa.String(), nullable=False),
+        sa.Column("number_of_vehicles", sa.Integer(), nullable=True),
+        sa.Column("number_of_casualties", sa.Integer(), nullable=True),
+        sa.Column("date", sa.String(), nullable=False),
+        sa.Column("day_of_week", sa.Integer(), nullable=True),
+        sa.Column("time", sa.String(), nullable=True),
+        sa.Column("local_authority_district", sa.String(), nullable=True),
+        sa.Column("local_authority_highway", sa.String(), nullable=True),
+        sa.Column("first_road_class", sa.String(), nullable=True),
+        sa.Column("first_road_number", sa.String(), nullable=True),
+        sa.Column("road_type", sa.String(), nullable=True),
+        sa.Column("speed_limit", sa.Integer(), nullable=True),
+        sa.Column("junction_control", sa.String(), nullable=True),
+        sa.Column("second_road_class", sa.String(), nullable=True),
+        sa.Column("second_road_number", sa.String(), nullable=True),
+        sa.Column(
+            "pedestrian_crossing_human_control", sa.String(), nullable=True
+        ),
+        sa.Column(
+            "pedestrian_crossing_physical_facilities",
+            sa.String(),
+            nullable=True,
+        ),
+        sa.Column("light_conditions", sa.String(), nullable=True),
+        sa.Column("weather_conditions", sa.String(), nullable=True),
+        sa.Column("road_surface_conditions", sa.String(), nullable=True),
+        sa.Column("special_conditions_at_site", sa.String(), nullable=True),
+        sa.Column("carriageway_hazards", sa.String(), nullable=True),
+        sa.Column("urban_or_rural_area", sa.String(), nullable=True),
+        sa.Column("did_police_officer_attend", sa.String(), nullable=True),
+        sa.Column("lsoa_of_accident_location", sa.String(), nullable=True),
+        sa.Column("year", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_accidents_id", "accidents", ["id"])
+
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=True,
+        ),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_users_email", table_name="users")
+    op.drop_index("ix_users_id", table_name="users")
+    op.drop_table("users")
+    op.drop_index("ix_accidents_id", table_name="accidents")
+    op.drop_table("accidents")
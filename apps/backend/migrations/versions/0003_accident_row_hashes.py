@@ -0,0 +1,232 @@
+"""accident natural key and content hash
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:20:00.000000
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import pandas as pd
+import sqlalchemy as sa
+
+from config import get_settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+# The accident columns hashed at this revision, with their kind
+FLOAT_COLUMNS = [
+    "location_easting",
+    "location_northing",
+    "longitude",
+    "latitude",
+]
+INTEGER_COLUMNS = [
+    "number_of_vehicles",
+    "number_of_casualties",
+    "day_of_week",
+    "speed_limit",
+    "year",
+]
+SOURCE_COLUMNS = [
+    "location_easting",
+    "location_northing",
+    "longitude",
+    "latitude",
+    "police_force",
+    "accident_severity",
+    "number_of_vehicles",
+    "number_of_casualties",
+    "date",
+    "day_of_week",
+    "time",
+    "local_authority_district",
+    "local_authority_highway",
+    "first_road_class",
+    "first_road_number",
+    "road_type",
+    "speed_limit",
+    "junction_control",
+    "second_road_class",
+    "second_road_number",
+    "pedestrian_crossing_human_control",
+    "pedestrian_crossing_physical_facilities",
+    "light_conditions",
+    "weather_conditions",
+    "road_surface_conditions",
+    "special_conditions_at_site",
+    "carriageway_hazards",
+    "urban_or_rural_area",
+    "did_police_officer_attend",
+    "lsoa_of_accident_location",
+    "year",
+]
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y"]
+TIME_FORMATS = ["%H:%M", "%H:%M:%S", "%H:%M:%S.%f"]
+# How pandas wrote missing values before uploads were converted per column
+MISSING_VALUES = ["", "nan", "NaN", "None", "NaT"]
+
+logger = logging.getLogger(f"alembic.{__name__}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "accidents", sa.Column("natural_key", sa.BigInteger(), nullable=True)
+    )
+    op.add_column(
+        "accidents", sa.Column("content_hash", sa.BigInteger(), nullable=True)
+    )
+    for name in ("rows_inserted", "rows_updated", "rows_skipped"):
+        op.add_column(
+            "import_jobs",
+            sa.Column(name, sa.Integer(), nullable=False, server_default="0"),
+        )
+
+    backfill_row_hashes()
+
+    # Duplicates imported before natural keys existed keep a NULL key, only
+    # the oldest copy of each accident is matched by later imports
+    op.execute(
+        "UPDATE accidents SET natural_key = NULL WHERE id IN ("
+        "SELECT id FROM (SELECT id, row_number() OVER ("
+        "PARTITION BY natural_key ORDER BY id) AS position FROM accidents "
+        "WHERE natural_key IS NOT NULL) AS ranked WHERE position > 1)"
+    )
+    op.create_index(
+        "ix_accidents_natural_key", "accidents", ["natural_key"], unique=True
+    )
+
+
+def backfill_row_hashes():
+    bind = op.get_bind()
+    settings = get_settings()
+    if settings.import_natural_key.strip() == "*":
+        key_columns = SOURCE_COLUMNS
+    else:
+        key_columns = [
+            name.strip() for name in settings.import_natural_key.split(",")
+        ]
+    accidents = sa.table(
+        "accidents",
+        sa.column("id"),
+        sa.column("natural_key"),
+        sa.column("content_hash"),
+    )
+    statement = (
+        accidents.update()
+        .where(accidents.c.id == sa.bindparam("accident_id"))
+        .values(
+            natural_key=sa.bindparam("key"),
+            content_hash=sa.bindparam("hash"),
+        )
+    )
+
+    last_id = 0
+    unparsed = 0
+    while True:
+        df = pd.read_sql(
+            sa.text(
+                f"SELECT id, {', '.join(SOURCE_COLUMNS)} FROM accidents "
+                "WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ),
+            bind,
+            params={"last_id": last_id, "limit": BATCH_SIZE},
+        )
+        if df.empty:
+            break
+        last_id = int(df["id"].max())
+
+        values, failed = normalize(df)
+        unparsed += int(failed.sum())
+        bind.execute(
+            statement,
+            [
+                {"accident_id": int(accident_id), "key": key, "hash": h}
+                for accident_id, key, h in zip(
+                    df["id"],
+                    hash_rows(values, key_columns),
+                    hash_rows(values, SOURCE_COLUMNS),
+                )
+            ],
+        )
+
+    if unparsed:
+        logger.warning(
+            "%s accidents hold a date, time or number that could not be "
+            "parsed and are hashed by their stored text",
+            unparsed,
+        )
+
+
+def normalize(df: pd.DataFrame):
+    """
+    The stored values as the upload conversion of this revision writes
+    them, so they hash like the same rows arriving in a new file, and
+    whether each row held a value that could not be converted. Such
+    values are kept as stored.
+    """
+    raw = df[SOURCE_COLUMNS].astype(object)
+    raw = raw.apply(lambda values: values.map(_text, na_action="ignore"))
+    raw = raw.where(~raw.isin(MISSING_VALUES), None)
+    values = raw.copy()
+    failed = pd.Series(False, index=df.index)
+
+    def convert(name: str, converted: pd.Series):
+        nonlocal failed
+        kept = raw[name].notna() & converted.isna()
+        failed |= kept
+        values[name] = converted.astype(object).where(~kept, raw[name])
+
+    for name in FLOAT_COLUMNS:
+        convert(
+            name, pd.to_numeric(raw[name], errors="coerce").astype("float64")
+        )
+    for name in INTEGER_COLUMNS:
+        numbers = pd.to_numeric(raw[name], errors="coerce")
+        convert(name, numbers.where(numbers % 1 == 0).astype("Int64"))
+    # Typed columns may hand back a date with a time of day
+    convert("date", _parse(raw["date"].str[:10], DATE_FORMATS, "%Y-%m-%d"))
+    convert("time", _parse(raw["time"], TIME_FORMATS, "%H:%M:%S"))
+    return values, failed
+
+
+def hash_rows(df: pd.DataFrame, columns) -> list:
+    """services.row_hashes.hash_rows at this revision."""
+    values = df[columns].astype(object)
+    canonical = values.where(values.notna(), "").astype(str)
+    hashes = pd.util.hash_pandas_object(canonical, index=False)
+    return [int(h) for h in hashes.to_numpy().view("int64")]
+
+
+def _text(value) -> str:
+    return str(value).strip()
+
+
+def _parse(values: pd.Series, formats, output_format: str) -> pd.Series:
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for fmt in formats:
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(
+            values[missing], format=fmt, errors="coerce"
+        )
+    return parsed.dt.strftime(output_format).astype(object)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_accidents_natural_key", table_name="accidents")
+    for name in ("rows_skipped", "rows_updated", "rows_inserted"):
+        op.drop_column("import_jobs", name)
+    op.drop_column("accidents", "content_hash")
+    op.drop_column("accidents", "natural_key")
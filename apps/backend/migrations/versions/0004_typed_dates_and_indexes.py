@@ -0,0 +1,153 @@
+"""typed accident date and time columns and analytics indexes
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import pandas as pd
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXED_COLUMNS = [
+    "date",
+    "accident_severity",
+    "road_type",
+    "weather_conditions",
+    "police_force",
+]
+BATCH_SIZE = 10000
+# Times as uploaded, and as the ORM writes them on SQLite after a downgrade
+TIME_FORMATS = ["%H:%M", "%H:%M:%S", "%H:%M:%S.%f"]
+
+# Dates were stored as uploaded, either ISO or STATS19's DD/MM/YYYY
+PG_DATE = (
+    r"CASE WHEN date ~ '^\d{1,2}/\d{1,2}/\d{4}$' "
+    r"THEN to_date(date, 'DD/MM/YYYY') ELSE substr(date, 1, 10)::date END"
+)
+PG_TIME = (
+    r"CASE WHEN time ~ '^([01]?\d|2[0-3]):[0-5]\d(:[0-5]\d(\.\d+)?)?$' "
+    r"THEN time::time END"
+)
+PG_INVALID_DATES = (
+    r"SELECT count(*) FROM accidents WHERE NOT ("
+    r"date ~ '^\d{4}-\d{2}-\d{2}' OR date ~ '^\d{1,2}/\d{1,2}/\d{4}$')"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        check_dates(bind.execute(sa.text(PG_INVALID_DATES)).scalar())
+        op.alter_column(
+            "accidents",
+            "date",
+            type_=sa.Date(),
+            existing_nullable=False,
+            postgresql_using=PG_DATE,
+        )
+        op.alter_column(
+            "accidents",
+            "time",
+            type_=sa.Time(),
+            existing_nullable=True,
+            postgresql_using=PG_TIME,
+        )
+    else:
+        # SQLite has no date storage class, the ORM types read and write
+        # ISO strings, so only the stored values need rewriting
+        normalize_date_strings(bind)
+
+    for name in INDEXED_COLUMNS:
+        op.create_index(f"ix_accidents_{name}", "accidents", [name])
+
+
+def check_dates(invalid: int):
+    if invalid:
+        raise RuntimeError(
+            f"{invalid} accidents have a date that is neither YYYY-MM-DD nor "
+            "DD/MM/YYYY, correct or delete them before upgrading"
+        )
+
+
+def normalize_date_strings(bind):
+    """
+    Rewrite stored dates and times as ISO strings in batches.
+    """
+    accidents = sa.table(
+        "accidents", sa.column("id"), sa.column("date"), sa.column("time")
+    )
+    statement = (
+        accidents.update()
+        .where(accidents.c.id == sa.bindparam("accident_id"))
+        .values(date=sa.bindparam("new_date"), time=sa.bindparam("new_time"))
+    )
+
+    last_id = 0
+    while True:
+        df = pd.read_sql(
+            sa.select(accidents)
+            .where(accidents.c.id > last_id)
+            .order_by(accidents.c.id)
+            .limit(BATCH_SIZE),
+            bind,
+        )
+        if df.empty:
+            break
+        last_id = int(df["id"].max())
+
+        # Mirrors the PostgreSQL conversion, which drops any time of day
+        dates = pd.to_datetime(
+            df["date"].str[:10], format="%Y-%m-%d", errors="coerce"
+        )
+        dates = dates.fillna(
+            pd.to_datetime(df["date"], format="%d/%m/%Y", errors="coerce")
+        )
+        times = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+        for fmt in TIME_FORMATS:
+            times = times.fillna(
+                pd.to_datetime(df["time"], format=fmt, errors="coerce")
+            )
+        check_dates(int(dates.isna().sum()))
+
+        bind.execute(
+            statement,
+            [
+                {
+                    "accident_id": int(accident_id),
+                    "new_date": None if pd.isna(d) else d.strftime("%Y-%m-%d"),
+                    "new_time": None if pd.isna(t) else t.strftime("%H:%M:%S"),
+                }
+                for accident_id, d, t in zip(df["id"], dates, times)
+            ],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in reversed(INDEXED_COLUMNS):
+        op.drop_index(f"ix_accidents_{name}", table_name="accidents")
+
+    if op.get_bind().dialect.name == "postgresql":
+        op.alter_column(
+            "accidents",
+            "time",
+            type_=sa.String(),
+            postgresql_using="to_char(time, 'HH24:MI:SS')",
+        )
+        op.alter_column(
+            "accidents",
+            "date",
+            type_=sa.String(),
+            postgresql_using="to_char(date, 'YYYY-MM-DD')",
+        )
@@ -0,0 +1,64 @@
+"""daily accident rollup table
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 09:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "accident_daily_rollups",
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("accident_severity", sa.String(), nullable=False),
+        sa.Column("road_type", sa.String(), nullable=False),
+        sa.Column("weather_conditions", sa.String(), nullable=False),
+        sa.Column("police_force", sa.String(), nullable=False),
+        sa.Column("accident_count", sa.Integer(), nullable=False),
+        sa.Column("casualties_sum", sa.Integer(), nullable=False),
+        sa.Column("casualties_count", sa.Integer(), nullable=False),
+        sa.Column("vehicles_sum", sa.Integer(), nullable=False),
+        sa.Column("vehicles_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint(
+            "date",
+            "accident_severity",
+            "road_type",
+            "weather_conditions",
+            "police_force",
+        ),
+    )
+    # The rollup as services.rollup.rebuild_rollup built it at this
+    # revision, with NULL categories stored as ""
+    keys = "date, " + ", ".join(
+        f"coalesce({name}, '')"
+        for name in [
+            "accident_severity",
+            "road_type",
+            "weather_conditions",
+            "police_force",
+        ]
+    )
+    op.execute(
+        f"INSERT INTO accident_daily_rollups SELECT {keys}, count(id), "
+        "coalesce(sum(number_of_casualties), 0), count(number_of_casualties), "
+        "coalesce(sum(number_of_vehicles), 0), count(number_of_vehicles) "
+        f"FROM accidents GROUP BY {keys}"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("accident_daily_rollups")
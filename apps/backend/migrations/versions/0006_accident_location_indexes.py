@@ -0,0 +1,29 @@
+"""accident location indexes
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 09:50:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_accidents_longitude", "accidents", ["longitude"])
+    op.create_index("ix_accidents_latitude", "accidents", ["latitude"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_accidents_latitude", table_name="accidents")
+    op.drop_index("ix_accidents_longitude", table_name="accidents")
@@ -0,0 +1,139 @@
+"""accident geohash
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+import logging
+from functools import reduce
+from typing import Sequence, Union
+
+from alembic import op
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+# services.geohash at this revision
+GEOHASH_PRECISION = 9
+BASE32 = np.array(list("0123456789bcdefghjkmnpqrstuvwxyz"))
+
+logger = logging.getLogger(f"alembic.{__name__}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "accidents", sa.Column("geohash", sa.String(12), nullable=True)
+    )
+    backfill_geohashes(op.get_bind())
+    op.create_index("ix_accidents_geohash", "accidents", ["geohash"])
+
+
+def backfill_geohashes(bind):
+    accidents = sa.table(
+        "accidents",
+        sa.column("id"),
+        sa.column("latitude"),
+        sa.column("longitude"),
+        sa.column("geohash"),
+    )
+    statement = (
+        accidents.update()
+        .where(accidents.c.id == sa.bindparam("accident_id"))
+        .values(geohash=sa.bindparam("new_geohash"))
+    )
+
+    last_id = 0
+    out_of_range = 0
+    while True:
+        df = pd.read_sql(
+            sa.select(
+                accidents.c.id, accidents.c.latitude, accidents.c.longitude
+            )
+            .where(
+                accidents.c.id > last_id,
+                accidents.c.latitude.isnot(None),
+                accidents.c.longitude.isnot(None),
+            )
+            .order_by(accidents.c.id)
+            .limit(BATCH_SIZE),
+            bind,
+        )
+        if df.empty:
+            break
+        last_id = int(df["id"].max())
+
+        df["geohash"] = encode_geohashes(df["latitude"], df["longitude"])
+        out_of_range += int(df["geohash"].isna().sum())
+        df = df[df["geohash"].notna()]
+        if len(df):
+            bind.execute(
+                statement,
+                [
+                    {"accident_id": int(accident_id), "new_geohash": value}
+                    for accident_id, value in zip(df["id"], df["geohash"])
+                ],
+            )
+
+    if out_of_range:
+        logger.warning(
+            "%s accidents have coordinates out of range and no geohash",
+            out_of_range,
+        )
+
+
+def encode_geohashes(latitude: pd.Series, longitude: pd.Series) -> pd.Series:
+    """
+    Geohash every coordinate pair, None where either is missing or out of
+    range.
+    """
+    lat = pd.to_numeric(latitude, errors="coerce").to_numpy(dtype=float)
+    lon = pd.to_numeric(longitude, errors="coerce").to_numpy(dtype=float)
+    valid = (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+
+    # Longitude takes the even bits, counting from the most significant
+    bits = 5 * GEOHASH_PRECISION
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    lon_cells = _cells(lon, -180, 360, lon_bits, valid)
+    lat_cells = _cells(lat, -90, 180, lat_bits, valid)
+
+    code = np.zeros(len(lat), dtype=np.int64)
+    for position in range(bits):
+        if position % 2 == 0:
+            bit = (lon_cells >> (lon_bits - 1 - position // 2)) & 1
+        else:
+            bit = (lat_cells >> (lat_bits - 1 - position // 2)) & 1
+        code = (code << 1) | bit
+
+    characters = [
+        BASE32[(code >> (5 * (GEOHASH_PRECISION - 1 - index))) & 31]
+        for index in range(GEOHASH_PRECISION)
+    ]
+    hashes = pd.Series(
+        reduce(np.char.add, characters), index=latitude.index, dtype=object
+    )
+    return hashes.where(valid, None)
+
+
+def _cells(
+    values: np.ndarray, low: float, span: float, bits: int, valid: np.ndarray
+) -> np.ndarray:
+    count = 1 << bits
+    scaled = np.floor((np.where(valid, values, low) - low) / span * count)
+    return np.clip(scaled, 0, count - 1).astype(np.int64)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_accidents_geohash", table_name="accidents")
+    op.drop_column("accidents", "geohash")
@@ -0,0 +1,33 @@
+"""accident grid reference indexes
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 10:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_accidents_location_easting", "accidents", ["location_easting"]
+    )
+    op.create_index(
+        "ix_accidents_location_northing", "accidents", ["location_northing"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_accidents_location_northing", table_name="accidents")
+    op.drop_index("ix_accidents_location_easting", table_name="accidents")
@@ -0,0 +1,176 @@
+"""accident category lookup table
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 10:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# services.categories.CATEGORY_COLUMNS at this revision
+CATEGORY_COLUMNS = [
+    "police_force",
+    "accident_severity",
+    "local_authority_district",
+    "local_authority_highway",
+    "first_road_class",
+    "road_type",
+    "junction_control",
+    "second_road_class",
+    "pedestrian_crossing_human_control",
+    "pedestrian_crossing_physical_facilities",
+    "light_conditions",
+    "weather_conditions",
+    "road_surface_conditions",
+    "special_conditions_at_site",
+    "carriageway_hazards",
+    "urban_or_rural_area",
+    "did_police_officer_attend",
+]
+INDEXED_COLUMNS = [
+    "police_force",
+    "accident_severity",
+    "road_type",
+    "weather_conditions",
+]
+ROLLUP_DIMENSIONS = [
+    "accident_severity",
+    "road_type",
+    "weather_conditions",
+    "police_force",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "accident_categories",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("attribute", sa.String(), nullable=False),
+        sa.Column("value", sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("attribute", "value"),
+    )
+    for name in CATEGORY_COLUMNS:
+        op.execute(
+            f"INSERT INTO accident_categories (attribute, value) "
+            f"SELECT DISTINCT '{name}', {name} FROM accidents "
+            f"WHERE {name} IS NOT NULL"
+        )
+
+    replace_columns(
+        sa.Integer(),
+        "integer",
+        "SELECT id FROM accident_categories "
+        "WHERE attribute = $1 AND value = $2",
+        lambda name: (
+            f"(SELECT id FROM accident_categories "
+            f"WHERE attribute = '{name}' AND value = accidents.{name})"
+        ),
+    )
+
+    rebuild_rollup(sa.Integer(), "0")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    replace_columns(
+        sa.String(),
+        "varchar",
+        "SELECT value FROM accident_categories WHERE id = $2::integer",
+        lambda name: (
+            f"(SELECT value FROM accident_categories "
+            f"WHERE id = accidents.{name})"
+        ),
+    )
+    rebuild_rollup(sa.String(), "''")
+    op.drop_table("accident_categories")
+
+
+def replace_columns(type_, pg_type, pg_lookup, expression):
+    """
+    Replace every category column of accidents by one of ``type_`` holding
+    ``expression`` of the old value.
+
+    PostgreSQL changes the types in place, rewriting the table and its
+    indexes once, through a function running ``pg_lookup`` with the
+    attribute and old value as parameters: a USING clause cannot hold
+    the subquery. Adding, filling and dropping columns instead would
+    leave the table about twice its size until a VACUUM FULL.
+    """
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            f"CREATE FUNCTION pg_temp.category_lookup(varchar, varchar) "
+            f"RETURNS {pg_type} LANGUAGE sql STABLE AS $$ {pg_lookup} $$"
+        )
+        op.execute(
+            "ALTER TABLE accidents "
+            + ", ".join(
+                f"ALTER COLUMN {name} TYPE {pg_type} USING "
+                f"pg_temp.category_lookup('{name}', {name}::varchar)"
+                for name in CATEGORY_COLUMNS
+            )
+        )
+        op.execute("DROP FUNCTION pg_temp.category_lookup(varchar, varchar)")
+        op.alter_column("accidents", "accident_severity", nullable=False)
+        return
+
+    # Every code is filled in by a single pass over the table
+    for name in CATEGORY_COLUMNS:
+        op.add_column("accidents", sa.Column(f"{name}_new", type_))
+    op.execute(
+        "UPDATE accidents SET "
+        + ", ".join(
+            f"{name}_new = {expression(name)}" for name in CATEGORY_COLUMNS
+        )
+    )
+
+    # SQLite cannot change the type of a column
+    for name in INDEXED_COLUMNS:
+        op.drop_index(f"ix_accidents_{name}", table_name="accidents")
+    for name in CATEGORY_COLUMNS:
+        op.execute(f"ALTER TABLE accidents DROP COLUMN {name}")
+        op.execute(f"ALTER TABLE accidents RENAME COLUMN {name}_new TO {name}")
+    for name in INDEXED_COLUMNS:
+        op.create_index(f"ix_accidents_{name}", "accidents", [name])
+
+
+def rebuild_rollup(type_, null):
+    """
+    Recreate the rollup with dimensions of ``type_``, NULL stored as
+    ``null``, and fill it as services.rollup.rebuild_rollup does.
+    """
+    op.drop_table("accident_daily_rollups")
+    op.create_table(
+        "accident_daily_rollups",
+        sa.Column("date", sa.Date(), nullable=False),
+        *(
+            sa.Column(name, type_, nullable=False)
+            for name in ROLLUP_DIMENSIONS
+        ),
+        sa.Column("accident_count", sa.Integer(), nullable=False),
+        sa.Column("casualties_sum", sa.Integer(), nullable=False),
+        sa.Column("casualties_count", sa.Integer(), nullable=False),
+        sa.Column("vehicles_sum", sa.Integer(), nullable=False),
+        sa.Column("vehicles_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("date", *ROLLUP_DIMENSIONS),
+    )
+    keys = "date, " + ", ".join(
+        f"coalesce({name}, {null})" for name in ROLLUP_DIMENSIONS
+    )
+    op.execute(
+        f"INSERT INTO accident_daily_rollups SELECT {keys}, count(id), "
+        "coalesce(sum(number_of_casualties), 0), count(number_of_casualties), "
+        "coalesce(sum(number_of_vehicles), 0), count(number_of_vehicles) "
+        f"FROM accidents GROUP BY {keys}"
+    )
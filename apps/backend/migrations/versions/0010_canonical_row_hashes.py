@@ -0,0 +1,202 @@
+"""recompute accident row hashes over canonical numbers
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from datetime import time
+from typing import Sequence, Union
+
+from alembic import op
+import pandas as pd
+import sqlalchemy as sa
+
+from config import get_settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+# services.row_hashes.SOURCE_COLUMNS and NUMERIC_COLUMNS at this revision
+SOURCE_COLUMNS = [
+    "location_easting",
+    "location_northing",
+    "longitude",
+    "latitude",
+    "police_force",
+    "accident_severity",
+    "number_of_vehicles",
+    "number_of_casualties",
+    "date",
+    "day_of_week",
+    "time",
+    "local_authority_district",
+    "local_authority_highway",
+    "first_road_class",
+    "first_road_number",
+    "road_type",
+    "speed_limit",
+    "junction_control",
+    "second_road_class",
+    "second_road_number",
+    "pedestrian_crossing_human_control",
+    "pedestrian_crossing_physical_facilities",
+    "light_conditions",
+    "weather_conditions",
+    "road_surface_conditions",
+    "special_conditions_at_site",
+    "carriageway_hazards",
+    "urban_or_rural_area",
+    "did_police_officer_attend",
+    "lsoa_of_accident_location",
+    "year",
+]
+NUMERIC_COLUMNS = [
+    "location_easting",
+    "location_northing",
+    "longitude",
+    "latitude",
+    "number_of_vehicles",
+    "number_of_casualties",
+    "day_of_week",
+    "speed_limit",
+    "year",
+]
+# services.categories.CATEGORY_COLUMNS at this revision
+CATEGORY_COLUMNS = [
+    "police_force",
+    "accident_severity",
+    "local_authority_district",
+    "local_authority_highway",
+    "first_road_class",
+    "road_type",
+    "junction_control",
+    "second_road_class",
+    "pedestrian_crossing_human_control",
+    "pedestrian_crossing_physical_facilities",
+    "light_conditions",
+    "weather_conditions",
+    "road_surface_conditions",
+    "special_conditions_at_site",
+    "carriageway_hazards",
+    "urban_or_rural_area",
+    "did_police_officer_attend",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keys change in place, so they may clash until every row is done
+    op.drop_index("ix_accidents_natural_key", table_name="accidents")
+    rehash_rows(op.get_bind())
+
+    op.execute(
+        "UPDATE accidents SET natural_key = NULL WHERE id IN ("
+        "SELECT id FROM (SELECT id, row_number() OVER ("
+        "PARTITION BY natural_key ORDER BY id) AS position FROM accidents "
+        "WHERE natural_key IS NOT NULL) AS ranked WHERE position > 1)"
+    )
+    op.create_index(
+        "ix_accidents_natural_key", "accidents", ["natural_key"], unique=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The schema is unchanged. Earlier code hashes whole floats with a
+    # fraction, so after a downgrade re-imports may update such rows once.
+
+
+def rehash_rows(bind):
+    """
+    Recompute natural_key and content_hash of every accident as
+    services.row_hashes did at this revision.
+    """
+    settings = get_settings()
+    if settings.import_natural_key.strip() == "*":
+        key_columns = SOURCE_COLUMNS
+    else:
+        key_columns = [
+            name.strip() for name in settings.import_natural_key.split(",")
+        ]
+    values = dict(
+        bind.execute(
+            sa.text("SELECT id, value FROM accident_categories")
+        ).all()
+    )
+    accidents = sa.table(
+        "accidents",
+        sa.column("id"),
+        sa.column("natural_key"),
+        sa.column("content_hash"),
+    )
+    statement = (
+        accidents.update()
+        .where(accidents.c.id == sa.bindparam("accident_id"))
+        .values(
+            natural_key=sa.bindparam("key"),
+            content_hash=sa.bindparam("hash"),
+        )
+    )
+
+    last_id = 0
+    while True:
+        df = pd.read_sql(
+            sa.text(
+                f"SELECT id, {', '.join(SOURCE_COLUMNS)} FROM accidents "
+                "WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ),
+            bind,
+            params={"last_id": last_id, "limit": BATCH_SIZE},
+        )
+        if df.empty:
+            break
+        last_id = int(df["id"].max())
+
+        for name in CATEGORY_COLUMNS:
+            df[name] = df[name].map(values)
+        # SQLite hands back the stored strings, with microseconds
+        df["date"] = df["date"].astype(str).str[:10]
+        df["time"] = df["time"].map(
+            lambda value: str(time.fromisoformat(str(value))),
+            na_action="ignore",
+        )
+        bind.execute(
+            statement,
+            [
+                {"accident_id": int(accident_id), "key": int(key), "hash": h}
+                for accident_id, key, h in zip(
+                    df["id"],
+                    hash_rows(df, key_columns),
+                    hash_rows(df, SOURCE_COLUMNS),
+                )
+            ],
+        )
+
+
+def hash_rows(df: pd.DataFrame, columns) -> list:
+    canonical = pd.DataFrame(
+        {
+            name: canonical_strings(df[name], name in NUMERIC_COLUMNS)
+            for name in columns
+        },
+        index=df.index,
+    )
+    hashes = pd.util.hash_pandas_object(canonical, index=False)
+    return [int(h) for h in hashes.to_numpy().view("int64")]
+
+
+def canonical_strings(values: pd.Series, numeric: bool) -> pd.Series:
+    if not numeric:
+        values = values.astype(object)
+        return values.where(values.notna(), "").astype(str)
+    numbers = pd.to_numeric(values, errors="coerce").astype("float64")
+    strings = numbers.astype(str)
+    whole = (numbers % 1 == 0) & (numbers.abs() < 2**53)
+    strings[whole] = numbers[whole].astype("int64").astype(str)
+    return strings.where(numbers.notna(), "")
@@ -0,0 +1,43 @@
+"""clear natural keys of accidents missing a part of theirs
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from config import get_settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Accidents that cannot be told apart by their key no longer share one
+    key = get_settings().import_natural_key.strip()
+    if key == "*":
+        return
+    names = [name.strip() for name in key.split(",")]
+    accidents = sa.table(
+        "accidents", sa.column("natural_key"), *map(sa.column, names)
+    )
+    op.execute(
+        accidents.update()
+        .where(sa.or_(*(accidents.c[name].is_(None) for name in names)))
+        .values(natural_key=None)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The schema is unchanged. Earlier code inserts the accidents left
+    # without a key again when their file is re-imported.
@@ -1,43 +1,104 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    Float,
+    Integer,
+    JSON,
+    String,
+    Time,
+    UniqueConstraint,
+)
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 from database import Base
+from services.categories import Category
 
 
 class Accident(Base):
     __tablename__ = "accidents"
 
     id = Column(Integer, primary_key=True, index=True)
-    location_easting = Column(Float)
-    location_northing = Column(Float)
-    longitude = Column(Float)
-    latitude = Column(Float)
-    police_force = Column(String)
-    accident_severity = Column(String, nullable=False)
+    location_easting = Column(Float, index=True)
+    location_northing = Column(Float, index=True)
+    longitude = Column(Float, index=True)
+    latitude = Column(Float, index=True)
+    police_force = Column(Category("police_force"), index=True)
+    accident_severity = Column(
+        Category("accident_severity"), nullable=False, index=True
+    )
     number_of_vehicles = Column(Integer)
     number_of_casualties = Column(Integer)
-    date = Column(String, nullable=False)
+    date = Column(Date, nullable=False, index=True)
     day_of_week = Column(Integer)
-    time = Column(String, nullable=True)
-    local_authority_district = Column(String)
-    local_authority_highway = Column(String)
-    first_road_class = Column(String)
+    time = Column(Time, nullable=True)
+    local_authority_district = Column(Category("local_authority_district"))
+    local_authority_highway = Column(Category("local_authority_highway"))
+    first_road_class = Column(Category("first_road_class"))
     first_road_number = Column(String)
-    road_type = Column(String)
+    road_type = Column(Category("road_type"), index=True)
     speed_limit = Column(Integer)
-    junction_control = Column(String)
-    second_road_class = Column(String)
+    junction_control = Column(Category("junction_control"))
+    second_road_class = Column(Category("second_road_class"))
     second_road_number = Column(String)
-    pedestrian_crossing_human_control = Column(String)
-    pedestrian_crossing_physical_facilities = Column(String)
-    light_conditions = Column(String)
-    weather_conditions = Column(String)
-    road_surface_conditions = Column(String)
-    special_conditions_at_site = Column(String)
-    carriageway_hazards = Column(String)
-    urban_or_rural_area = Column(String)
-    did_police_officer_attend = Column(String)
+    pedestrian_crossing_human_control = Column(
+        Category("pedestrian_crossing_human_control")
+    )
+    pedestrian_crossing_physical_facilities = Column(
+        Category("pedestrian_crossing_physical_facilities")
+    )
+    light_conditions = Column(Category("light_conditions"))
+    weather_conditions = Column(Category("weather_conditions"), index=True)
+    road_surface_conditions = Column(Category("road_surface_conditions"))
+    special_conditions_at_site = Column(Category("special_conditions_at_site"))
+    carriageway_hazards = Column(Category("carriageway_hazards"))
+    urban_or_rural_area = Column(Category("urban_or_rural_area"))
+    did_police_officer_attend = Column(Category("did_police_officer_attend"))
     lsoa_of_accident_location = Column(String)
     year = Column(Integer)
+    # Row hashes maintained by the import path, see services/row_hashes.py
+    natural_key = Column(BigInteger, unique=True, index=True)
+    content_hash = Column(BigInteger)
+    # Derived from latitude and longitude, see services/geohash.py
+    geohash = Column(String(12), index=True)
+
+
+class AccidentCategory(Base):
+    """The distinct values of the accident columns stored as codes"""
+
+    __tablename__ = "accident_categories"
+    __table_args__ = (UniqueConstraint("attribute", "value"),)
+
+    id = Column(Integer, primary_key=True)
+    attribute = Column(String, nullable=False)
+    value = Column(String, nullable=False)
+
+
+class AccidentDailyRollup(Base):
+    """Accident totals per day and category, see services/rollup.py"""
+
+    __tablename__ = "accident_daily_rollups"
+
+    date = Column(Date, primary_key=True)
+    # NULL is stored as code 0, so it can be part of the key
+    accident_severity = Column(
+        Category("accident_severity", null_code=0), primary_key=True
+    )
+    road_type = Column(Category("road_type", null_code=0), primary_key=True)
+    weather_conditions = Column(
+        Category("weather_conditions", null_code=0), primary_key=True
+    )
+    police_force = Column(
+        Category("police_force", null_code=0), primary_key=True
+    )
+    accident_count = Column(Integer, nullable=False)
+    casualties_sum = Column(Integer, nullable=False)
+    # Rows with a value, the denominator of the average
+    casualties_count = Column(Integer, nullable=False)
+    vehicles_sum = Column(Integer, nullable=False)
+    vehicles_count = Column(Integer, nullable=False)
 
 
 class User(Base):
@@ -49,3 +110,38 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+
+    id = Column(String, primary_key=True)
+    filename = Column(String)
+    status = Column(String, nullable=False, default="queued")
+    rows_processed = Column(Integer, nullable=False, default=0)
+    rows_loaded = Column(Integer, nullable=False, default=0)
+    rows_failed = Column(Integer, nullable=False, default=0)
+    rows_inserted = Column(Integer, nullable=False, default=0)
+    rows_updated = Column(Integer, nullable=False, default=0)
+    rows_skipped = Column(Integer, nullable=False, default=0)
+    errors = Column(JSON, nullable=False, default=list)
+    error = Column(String)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        finished_at = _as_utc(self.finished_at or datetime.now(timezone.utc))
+        elapsed = (finished_at - _as_utc(self.started_at)).total_seconds()
+        return self.rows_processed / elapsed if elapsed > 0 else 0.0
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes for timezone-aware columns
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
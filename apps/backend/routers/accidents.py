@@ -1,152 +1,468 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+    File,
+)
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
 import pandas as pd
-import io
-from typing import List
+from fastapi.responses import StreamingResponse
+from typing import Callable, List, Literal, Optional
+from datetime import date
 from models import Accident
 from schemas import (
     Accident as AccidentSchema,
+    AccidentBatchUpdate,
     AccidentCreate,
     AccidentUpdate,
+    BatchItemResult,
+    ExportFormat,
+    ImportMode,
+    ListFormat,
+)
+from database import get_async_db, get_async_read_db, get_db
+from services.batch import (
+    KEY_CONFLICT,
+    MAX_BATCH_SIZE,
+    REQUIRED_FIELDS,
+    WRITTEN_STATUSES,
+    create_accidents,
+    delete_accidents,
+    delete_matching,
+    update_accidents,
+)
+from services.cache import abump_data_version
+from services.export import (
+    EXPORT_COLUMNS,
+    EXPORT_FORMATS,
+    parquet_available,
+    stream_export,
+)
+from services.filters import AccidentFilters
+from services.geohash import encode_geohash
+from services.pagination import decode_cursor, encode_cursor
+from services.rollup import refresh_rollup
+from services.serialization import dumps, rows_to_columns, rows_to_objects
+from services.spatial import within_planar_radius, within_radius
+from services.row_hashes import SOURCE_COLUMNS, record_hashes
+from services.upload import (
+    NOT_UTF8,
+    REQUIRED_COLUMNS,
+    iter_csv_chunks,
+    normalize_columns,
+    process_csv_file,
+    read_csv_header,
 )
-from database import get_db
 
 router = APIRouter(prefix="/accidents")
 
 
 @router.post("/upload")
-async def upload_accidents(
+def upload_accidents(
     file: UploadFile = File(...),
+    mode: ImportMode = "upsert",
     db: Session = Depends(get_db),
 ):
-    # Read the uploaded CSV file
-    content = await file.read()
-    df = pd.read_csv(io.StringIO(content.decode("utf-8")))
-
-    # Create accidents from the CSV data
-    accidents = []
-
-    for index, row in df.iterrows():
-        accident = Accident(
-            date=row["date"],
-            time=row.get("time"),
-            location_easting=row.get("location_easting"),
-            location_northing=row.get("location_northing"),
-            longitude=row.get("longitude"),
-            latitude=row.get("latitude"),
-            police_force=row.get("police_force"),
-            accident_severity=row["accident_severity"],
-            number_of_vehicles=row.get("number_of_vehicles"),
-            number_of_casualties=row.get("number_of_casualties"),
-            day_of_week=row.get("day_of_week"),
-            local_authority_district=row.get("local_authority_district"),
-            local_authority_highway=row.get("local_authority_highway"),
-            first_road_class=row.get("first_road_class"),
-            first_road_number=row.get("first_road_number"),
-            road_type=row.get("road_type"),
-            speed_limit=row.get("speed_limit"),
-            junction_control=row.get("junction_control"),
-            second_road_class=row.get("second_road_class"),
-            second_road_number=row.get("second_road_number"),
-            pedestrian_crossing_human_control=row.get(
-                "pedestrian_crossing_human_control"
-            ),
-            pedestrian_crossing_physical_facilities=row.get(
-                "pedestrian_crossing_physical_facilities"
-            ),
-            light_conditions=row.get("light_conditions"),
-            weather_conditions=row.get("weather_conditions"),
-            road_surface_conditions=row.get("road_surface_conditions"),
-            special_conditions_at_site=row.get("special_conditions_at_site"),
-            carriageway_hazards=row.get("carriageway_hazards"),
-            urban_or_rural_area=row.get("urban_or_rural_area"),
-            did_police_officer_attend=row.get("did_police_officer_attend"),
-            lsoa_of_accident_location=row.get("lsoa_of_accident_location"),
-            year=row.get("year"),
+    """
+    Import a CSV file of accidents. Runs in the thread pool on a sync
+    session, as the bulk loader copies rows through the psycopg2
+    connection.
+    """
+    try:
+        columns = normalize_columns(read_csv_header(file.file))
+    except pd.errors.EmptyDataError:
+        raise HTTPException(status_code=400, detail="CSV file is empty")
+    except pd.errors.ParserError:
+        raise HTTPException(status_code=400, detail="Invalid CSV format")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail=NOT_UTF8)
+
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing_columns:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Missing required columns: {', '.join(missing_columns)}",
         )
 
-        accidents.append(accident)
+    chunks = iter_csv_chunks(file.file)
+    try:
+        # Stream the uploaded CSV file one chunk at a time
+        results = process_csv_file(
+            chunks,
+            db,
+            atomic=True,
+            upsert=mode == "upsert",
+        )
+    except pd.errors.ParserError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Invalid CSV format")
+    except UnicodeDecodeError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=NOT_UTF8)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="File contains accidents that were already imported",
+        )
+    finally:
+        chunks.close()
 
-    db.add_all(accidents)
-    db.commit()
     return {
         "message": "Accidents uploaded successfully",
-        "count": len(
-            accidents,
-        ),
+        "count": results["successful"],
+        "inserted": results["inserted"],
+        "updated": results["updated"],
+        "skipped": results["skipped"],
+        "failed": results["failed"],
+        "errors": results["errors"],
     }
 
 
 @router.get("/", response_model=List[AccidentSchema])
-def get_accidents(
+async def get_accidents(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(
-        get_db,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    format: ListFormat = "default",
+    filters: AccidentFilters = Depends(),
+    db: AsyncSession = Depends(
+        get_async_read_db,
     ),
 ):
-    accidents = db.query(Accident).offset(skip).limit(limit).all()
-    return accidents
+    """
+    List accidents in id order. When more match, the ``X-Next-Cursor``
+    header holds the ``cursor`` for the next page, which unlike ``skip``
+    costs the same however deep the page is.
+    The ``fast`` and ``columnar`` formats skip building a model per
+    accident, see ``ListFormat``.
+    """
+    query = filters.apply(select(Accident))
+    return await _page(db, query, response, limit, cursor, skip, format)
+
+
+@router.get("/within", response_model=List[AccidentSchema])
+async def get_accidents_within(
+    response: Response,
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    easting: Optional[float] = None,
+    northing: Optional[float] = None,
+    radius: Optional[float] = Query(None, gt=0, description="In metres"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    format: ListFormat = "default",
+    filters: AccidentFilters = Depends(),
+    db: AsyncSession = Depends(
+        get_async_read_db,
+    ),
+):
+    """
+    Accidents inside the ``bbox`` and/or within ``radius`` metres of
+    either ``latitude``/``longitude`` or the British National Grid
+    ``easting``/``northing``, paged like the accident list.
+    """
+    by_degrees = latitude is not None or longitude is not None
+    by_grid = easting is not None or northing is not None
+    if by_degrees and by_grid:
+        raise HTTPException(
+            status_code=400,
+            detail="Give the centre as latitude/longitude or "
+            "easting/northing, not both",
+        )
+    if (by_degrees or by_grid) != (radius is not None):
+        raise HTTPException(
+            status_code=400,
+            detail="A radius needs a centre and a centre needs a radius",
+        )
+    if radius is None and filters.bbox is None:
+        raise HTTPException(
+            status_code=400, detail="Give a bbox or a radius and centre"
+        )
+
+    query = filters.apply(select(Accident))
+    if by_degrees:
+        if latitude is None or longitude is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Both latitude and longitude are required",
+            )
+        query = within_radius(query, latitude, longitude, radius)
+    elif by_grid:
+        if easting is None or northing is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Both easting and northing are required",
+            )
+        query = within_planar_radius(query, easting, northing, radius)
+    return await _page(db, query, response, limit, cursor, format=format)
+
+
+@router.get("/export")
+def export_accidents(
+    format: ExportFormat = "csv",
+    compress: Optional[Literal["gzip"]] = None,
+    filters: AccidentFilters = Depends(),
+):
+    """
+    Stream every accident matching the filters as a file download. Rows
+    are read in batches and written straight to the response, so memory
+    use does not grow with the number of rows.
+    """
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(
+            status_code=400, detail="Parquet export requires pyarrow"
+        )
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"accidents.{extension}"
+    if compress == "gzip":
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        stream_export(filters, format, compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.post("/batch", response_model=List[BatchItemResult])
+async def create_accidents_batch(
+    accidents: List[AccidentCreate] = Body(..., max_length=MAX_BATCH_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Create many accidents in one transaction. Accidents whose natural key
+    is taken are skipped with a ``conflict`` status, the others created.
+    """
+    return await _run_batch(
+        db,
+        create_accidents,
+        [accident.model_dump() for accident in accidents],
+    )
+
+
+@router.patch("/batch", response_model=List[BatchItemResult])
+async def update_accidents_batch(
+    changes: List[AccidentBatchUpdate] = Body(
+        ..., max_length=MAX_BATCH_SIZE
+    ),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Update many accidents in one transaction, each item giving the ``id``
+    and only the fields to change.
+    """
+    return await _run_batch(
+        db,
+        update_accidents,
+        [
+            {**change.model_dump(exclude_unset=True), "id": change.id}
+            for change in changes
+        ],
+    )
+
+
+@router.delete("/batch", response_model=List[BatchItemResult])
+async def delete_accidents_batch(
+    ids: List[int] = Body(..., max_length=MAX_BATCH_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Delete many accidents by id in one transaction."""
+    return await _run_batch(db, delete_accidents, ids)
+
+
+@router.delete("/")
+async def delete_accidents_matching(
+    filters: AccidentFilters = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Delete every accident matching the filters, of which at least one is
+    required.
+    """
+    if not filters.columns:
+        raise HTTPException(
+            status_code=400, detail="Give at least one filter"
+        )
+    count = await db.run_sync(delete_matching, filters)
+    await db.commit()
+    if count:
+        await abump_data_version()
+    return {"message": "Accidents deleted successfully", "count": count}
 
 
 @router.get("/{accident_id}", response_model=AccidentSchema)
-def get_accident(
+async def get_accident(
     accident_id: int,
-    db: Session = Depends(
-        get_db,
+    db: AsyncSession = Depends(
+        get_async_read_db,
     ),
 ):
-    accident = db.query(Accident).filter(Accident.id == accident_id).first()
+    accident = await db.get(Accident, accident_id)
     if accident is None:
         raise HTTPException(status_code=404, detail="Accident not found")
     return accident
 
 
 @router.post("/", response_model=AccidentSchema)
-def create_accident(
+async def create_accident(
     accident: AccidentCreate,
-    db: Session = Depends(
-        get_db,
+    db: AsyncSession = Depends(
+        get_async_db,
     ),
 ):
-    db_accident = Accident(**accident.model_dump())
+    data = accident.model_dump()
+    db_accident = Accident(
+        **data,
+        **record_hashes(data),
+        geohash=encode_geohash(data["latitude"], data["longitude"]),
+    )
     db.add(db_accident)
-    db.commit()
-    db.refresh(db_accident)
+    await _commit_or_conflict(db, [db_accident.date])
+    await db.refresh(db_accident)
     return db_accident
 
 
 @router.put("/{accident_id}", response_model=AccidentSchema)
-def update_accident(
+async def update_accident(
     accident_id: int,
     accident: AccidentUpdate,
-    db: Session = Depends(
-        get_db,
+    db: AsyncSession = Depends(
+        get_async_db,
     ),
 ):
-    db_accident = db.query(Accident).filter(Accident.id == accident_id).first()
+    db_accident = await db.get(Accident, accident_id)
     if db_accident is None:
         raise HTTPException(status_code=404, detail="Accident not found")
 
+    previous_date = db_accident.date
     for field, value in accident.model_dump(exclude_unset=True).items():
         setattr(db_accident, field, value)
+    if db_accident.date is None or db_accident.accident_severity is None:
+        raise HTTPException(status_code=422, detail=REQUIRED_FIELDS)
+
+    source = {name: getattr(db_accident, name) for name in SOURCE_COLUMNS}
+    for field, value in record_hashes(source).items():
+        setattr(db_accident, field, value)
+    db_accident.geohash = encode_geohash(
+        db_accident.latitude, db_accident.longitude
+    )
 
-    db.commit()
-    db.refresh(db_accident)
+    await _commit_or_conflict(db, [previous_date, db_accident.date])
+    await db.refresh(db_accident)
     return db_accident
 
 
 @router.delete("/{accident_id}")
-def delete_accident(
+async def delete_accident(
     accident_id: int,
-    db: Session = Depends(
-        get_db,
+    db: AsyncSession = Depends(
+        get_async_db,
     ),
 ):
-    db_accident = db.query(Accident).filter(Accident.id == accident_id).first()
+    db_accident = await db.get(Accident, accident_id)
     if db_accident is None:
         raise HTTPException(status_code=404, detail="Accident not found")
 
-    db.delete(db_accident)
-    db.commit()
+    await db.delete(db_accident)
+    await db.flush()
+    await db.run_sync(refresh_rollup, [db_accident.date])
+    await db.commit()
+    await abump_data_version()
     return {"message": "Accident deleted successfully"}
+
+
+async def _page(
+    db: AsyncSession,
+    query: Select,
+    response: Response,
+    limit: int,
+    cursor: Optional[str],
+    skip: int = 0,
+    format: ListFormat = "default",
+):
+    """
+    Return up to ``limit`` accidents the query selects in id order, after the
+    ``cursor`` if given, and set ``X-Next-Cursor`` when more follow.
+    A ``format`` other than the default selects plain rows and returns
+    them already encoded.
+    """
+    query = query.order_by(Accident.id)
+    if cursor:
+        try:
+            query = query.filter(Accident.id > decode_cursor(cursor))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    elif skip:
+        query = query.offset(skip)
+
+    # One extra row tells whether there is a next page
+    query = query.limit(limit + 1)
+    if format == "default":
+        accidents = (await db.scalars(query)).all()
+    else:
+        accidents = (
+            await db.execute(query.with_only_columns(*EXPORT_COLUMNS))
+        ).all()
+    if len(accidents) > limit:
+        accidents = accidents[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(accidents[-1].id)
+    if format == "default":
+        return accidents
+
+    if format == "columnar":
+        body = rows_to_columns(
+            [column.name for column in EXPORT_COLUMNS], accidents
+        )
+    else:
+        body = rows_to_objects(accidents)
+    # Returned responses do not get the headers set on ``response``
+    return Response(
+        dumps(body),
+        media_type="application/json",
+        headers=dict(response.headers),
+    )
+
+
+async def _commit_or_conflict(db: AsyncSession, dates: List[date]):
+    try:
+        await db.flush()
+        await db.run_sync(refresh_rollup, dates)
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        # Drivers name the violated unique index in the message
+        if "natural_key" not in str(e.orig):
+            raise
+        raise HTTPException(status_code=409, detail=KEY_CONFLICT)
+    await abump_data_version()
+
+
+async def _run_batch(db: AsyncSession, operation: Callable, items: list):
+    """
+    Run a batch operation of services.batch and commit it. A conflicting
+    concurrent write rolls back the whole batch.
+    """
+    try:
+        results = await db.run_sync(operation, items)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="The batch conflicts with a concurrent change, retry it",
+        )
+    if any(result["status"] in WRITTEN_STATUSES for result in results):
+        await abump_data_version()
+    return results
@@ -1,7 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import func, desc, cast, Date
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from dataclasses import asdict
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query as QueryParam,
+    Request,
+)
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, func, desc, literal, null, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql import Select
+from typing import Callable, List, Optional, Union
 from datetime import date
 from models import Accident
 from schemas import (
@@ -10,34 +20,119 @@ from schemas import (
     RoadTypeStats,
     WeatherStats,
     LocationStats,
+    HotspotStats,
+    AnalyticsResponse,
+    BreakdownRow,
+    SnapshotStats,
+    SplitDimension,
+    TimeInterval,
+    TimeSeriesPoint,
+)
+from config import get_settings
+from database import get_async_read_db
+from services.breakdown import (
+    BREAKDOWN_DIMENSIONS,
+    BREAKDOWN_METRICS,
+    MAX_BREAKDOWN_DIMENSIONS,
+    breakdown_statement,
+    parse_names,
+)
+from services.cache import cached_response
+from services.filters import EQUALITY_FILTERS, AccidentFilters
+from services.geohash import GEOHASH_PRECISION
+from services.rollup import (
+    dimension,
+    measures,
+    rollup_enabled,
+    source_table,
 )
-from database import get_db
+from services.snapshot import (
+    bytes_per_million_rows,
+    current_snapshot,
+    use_snapshot,
+)
+from services.timeseries import DATE_INTERVALS, bucket_expression
+
+settings = get_settings()
 
 router = APIRouter(prefix="/analytics")
 
+# Breakdowns returned by the dashboard, keyed by the name tagging their rows
+DASHBOARD_DIMENSIONS = {
+    "severity": "accident_severity",
+    "road_type": "road_type",
+    "weather": "weather_conditions",
+}
+
+
+def filter_dates(
+    query: Union[Query, Select],
+    start_date: Optional[date],
+    end_date: Optional[date],
+    use_rollup: bool = False,
+) -> Union[Query, Select]:
+    # Compare the typed column directly so the date index can be used
+    column = dimension("date", use_rollup)
+    if start_date:
+        query = query.filter(column >= start_date)
+    if end_date:
+        query = query.filter(column <= end_date)
+    return query
+
+
+def summary_columns(use_rollup: bool) -> list:
+    return [
+        measure.label(name if name != "count" else "total_accidents")
+        for name, measure in measures(use_rollup).items()
+    ]
+
+
+async def run_query(db: AsyncSession, query: Callable, *args):
+    """
+    Run a query function, written against a sync Session, on the async
+    session's connection. A stale snapshot is refreshed in a worker thread
+    first so neither its load nor the data version check hold up the
+    event loop.
+    """
+    if settings.analytics_engine == "snapshot":
+        use_snapshot(await run_in_threadpool(current_snapshot))
+    return await db.run_sync(query, *args)
+
 
 @router.get("/summary", response_model=AnalyticsSummary)
-def get_analytics_summary(
+async def get_analytics_summary(
+    request: Request,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    query = db.query(
-        func.count(Accident.id).label("total_accidents"),
-        func.avg(Accident.number_of_casualties).label("average_casualties"),
-        func.avg(Accident.number_of_vehicles).label("average_vehicles"),
-        func.sum(Accident.number_of_casualties).label("total_casualties"),
-        func.sum(Accident.number_of_vehicles).label("total_vehicles"),
+    return await cached_response(
+        request,
+        lambda: run_query(db, query_summary, start_date, end_date),
+        start_date=start_date,
+        end_date=end_date,
     )
 
-    if start_date:
-        query = query.filter(cast(Accident.date, Date) >= start_date)
-    if end_date:
-        query = query.filter(cast(Accident.date, Date) <= end_date)
 
-    result = query.first()
+def query_summary(
+    db: Session, start_date: Optional[date], end_date: Optional[date]
+) -> AnalyticsSummary:
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        filters = AccidentFilters(start_date=start_date, end_date=end_date)
+        return build_summary(snapshot.summary(filters))
+
+    use_rollup = rollup_enabled()
+    query = db.query(*summary_columns(use_rollup))
+
+    query = filter_dates(query, start_date, end_date, use_rollup)
+
+    return build_summary(query.first())
+
+
+def build_summary(result) -> AnalyticsSummary:
     return AnalyticsSummary(
-        total_accidents=result.total_accidents,
+        total_accidents=result.total_accidents or 0,
         average_casualties=float(result.average_casualties or 0),
         average_vehicles=float(result.average_vehicles or 0),
         total_casualties=result.total_casualties or 0,
@@ -45,126 +140,198 @@ def get_analytics_summary(
     )
 
 
+def breakdown_rows(
+    db: Session,
+    dimensions: List[str],
+    metrics: List[str],
+    filters: AccidentFilters,
+    limit: Optional[int] = None,
+) -> list:
+    """
+    The rows of a breakdown, from the snapshot when it is enabled.
+    """
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        return snapshot.breakdown(dimensions, metrics, filters, limit)
+    return db.execute(
+        breakdown_statement(dimensions, metrics, filters).limit(limit)
+    ).all()
+
+
+@router.get("/breakdown", response_model=List[BreakdownRow])
+async def get_breakdown(
+    request: Request,
+    dims: str = QueryParam(
+        ...,
+        description=(
+            "Comma separated accident columns to group by, at most "
+            f"{MAX_BREAKDOWN_DIMENSIONS}"
+        ),
+    ),
+    metrics: Optional[str] = QueryParam(
+        None,
+        description="Comma separated metrics, count and percentage if unset",
+    ),
+    limit: int = QueryParam(1000, ge=1, le=10000),
+    filters: AccidentFilters = Depends(),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    Accident metrics per combination of values of up to three columns,
+    busiest first. Percentages are of all the filtered accidents, or with
+    ``row_percentage`` of those sharing the first column's value.
+    """
+    try:
+        dimensions = parse_names(dims, BREAKDOWN_DIMENSIONS, "dimension", [])
+        selected = parse_names(
+            metrics, BREAKDOWN_METRICS, "metric", ["count", "percentage"]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not 1 <= len(dimensions) <= MAX_BREAKDOWN_DIMENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Give 1 to {MAX_BREAKDOWN_DIMENSIONS} dimensions",
+        )
+
+    return await cached_response(
+        request,
+        lambda: run_query(
+            db, query_breakdown, dimensions, selected, filters, limit
+        ),
+        dims=dimensions,
+        metrics=selected,
+        limit=limit,
+        **asdict(filters),
+    )
+
+
+def query_breakdown(
+    db: Session,
+    dimensions: List[str],
+    metrics: List[str],
+    filters: AccidentFilters,
+    limit: int,
+) -> List[BreakdownRow]:
+    results = breakdown_rows(db, dimensions, metrics, filters, limit)
+
+    return [
+        BreakdownRow(
+            dimensions=dict(zip(dimensions, row)),
+            metrics={
+                name: metric_value(name, value)
+                for name, value in zip(metrics, row[len(dimensions):])
+            },
+        )
+        for row in results
+    ]
+
+
+def metric_value(name: str, value):
+    if name.startswith(("count", "total_")):
+        return int(value or 0)
+    return float(value) if value is not None else None
+
+
 @router.get("/by-severity", response_model=List[SeverityStats])
-def get_accidents_by_severity(
+async def get_accidents_by_severity(
+    request: Request,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    # First, get the total count with date filters
-    total_query = db.query(func.count(Accident.id))
-    if start_date:
-        total_query = total_query.filter(
-            cast(Accident.date, Date) >= start_date,
-        )
-    if end_date:
-        total_query = total_query.filter(cast(Accident.date, Date) <= end_date)
-    total = total_query.scalar() or 1
-
-    # Then get the grouped data
-    query = db.query(
-        Accident.accident_severity, func.count(Accident.id).label("count")
-    ).group_by(Accident.accident_severity)
+    return await cached_response(
+        request,
+        lambda: run_query(db, query_by_severity, start_date, end_date),
+        start_date=start_date,
+        end_date=end_date,
+    )
 
-    if start_date:
-        query = query.filter(cast(Accident.date, Date) >= start_date)
-    if end_date:
-        query = query.filter(cast(Accident.date, Date) <= end_date)
 
-    results = query.all()
+def query_by_severity(
+    db: Session, start_date: Optional[date], end_date: Optional[date]
+) -> List[SeverityStats]:
+    results = breakdown_rows(
+        db,
+        ["accident_severity"],
+        ["count", "percentage"],
+        AccidentFilters(start_date=start_date, end_date=end_date),
+    )
 
     return [
         SeverityStats(
             severity=severity,
             count=count,
-            percentage=(count / total) * 100,
+            percentage=percentage,
         )
-        for severity, count in results
+        for severity, count, percentage in results
     ]
 
 
 @router.get("/by-road-type", response_model=List[RoadTypeStats])
-def get_accidents_by_road_type(
+async def get_accidents_by_road_type(
+    request: Request,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    # First, get the total count with date filters
-    total_query = db.query(func.count(Accident.id))
-    if start_date:
-        total_query = total_query.filter(
-            cast(Accident.date, Date) >= start_date,
-        )
-    if end_date:
-        total_query = total_query.filter(cast(Accident.date, Date) <= end_date)
-    total = total_query.scalar() or 1
-
-    # Then get the grouped data
-    query = db.query(
-        Accident.road_type, func.count(Accident.id).label("count")
-    ).group_by(Accident.road_type)
+    return await cached_response(
+        request,
+        lambda: run_query(db, query_by_road_type, start_date, end_date),
+        start_date=start_date,
+        end_date=end_date,
+    )
 
-    if start_date:
-        query = query.filter(cast(Accident.date, Date) >= start_date)
-    if end_date:
-        query = query.filter(cast(Accident.date, Date) <= end_date)
 
-    results = query.all()
+def query_by_road_type(
+    db: Session, start_date: Optional[date], end_date: Optional[date]
+) -> List[RoadTypeStats]:
+    results = breakdown_rows(
+        db,
+        ["road_type"],
+        ["count", "percentage"],
+        AccidentFilters(start_date=start_date, end_date=end_date),
+    )
 
     return [
-        RoadTypeStats(
-            road_type=road_type, count=count, percentage=(count / total) * 100
-        )
-        for road_type, count in results
+        RoadTypeStats(road_type=road_type, count=count, percentage=percentage)
+        for road_type, count, percentage in results
     ]
 
 
 @router.get("/by-weather", response_model=List[WeatherStats])
-def get_accidents_by_weather(
+async def get_accidents_by_weather(
+    request: Request,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    try:
-        # First, get the total count with date filters
-        total_query = db.query(func.count(Accident.id))
-        if start_date:
-            total_query = total_query.filter(
-                cast(Accident.date, Date) >= start_date,
-            )
-        if end_date:
-            total_query = total_query.filter(
-                cast(Accident.date, Date) <= end_date,
-            )
-        total = total_query.scalar() or 1
-
-        # Then get the grouped data
-        query = (
-            db.query(
-                Accident.weather_conditions,
-                func.count(Accident.id).label("count"),
-                func.round(func.count(Accident.id) * 100.0 / total, 2).label(
-                    "percentage"
-                ),
-            )
-            .group_by(Accident.weather_conditions)
-            .order_by(func.count(Accident.id).desc())
-        )
+    return await cached_response(
+        request,
+        lambda: run_query(db, query_by_weather, start_date, end_date),
+        start_date=start_date,
+        end_date=end_date,
+    )
 
-        if start_date:
-            query = query.filter(cast(Accident.date, Date) >= start_date)
-        if end_date:
-            query = query.filter(cast(Accident.date, Date) <= end_date)
 
-        results = query.all()
+def query_by_weather(
+    db: Session, start_date: Optional[date], end_date: Optional[date]
+) -> List[WeatherStats]:
+    try:
+        results = breakdown_rows(
+            db,
+            ["weather_conditions"],
+            ["count", "percentage"],
+            AccidentFilters(start_date=start_date, end_date=end_date),
+        )
 
         return [
             WeatherStats(
-                weather_condition=row.weather_conditions,
-                count=row.count,
-                percentage=row.percentage,
+                weather_condition=weather_condition,
+                count=count,
+                percentage=round(float(percentage), 2),
             )
-            for row in results
+            for weather_condition, count, percentage in results
         ]
     except Exception as e:
         error_msg = "Error retrieving weather statistics"
@@ -172,31 +339,322 @@ def get_accidents_by_weather(
 
 
 @router.get("/top-locations", response_model=List[LocationStats])
-def get_top_locations(
+async def get_top_locations(
+    request: Request,
     limit: int = 10,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    query = (
-        db.query(
-            Accident.longitude,
-            Accident.latitude,
-            func.count(Accident.id).label("count"),
-        )
-        .group_by(Accident.longitude, Accident.latitude)
-        .order_by(desc("count"))
-        .limit(limit)
+    return await cached_response(
+        request,
+        lambda: run_query(
+            db, query_top_locations, limit, start_date, end_date
+        ),
+        limit=limit,
+        start_date=start_date,
+        end_date=end_date,
     )
 
-    if start_date:
-        query = query.filter(cast(Accident.date, Date) >= start_date)
-    if end_date:
-        query = query.filter(cast(Accident.date, Date) <= end_date)
 
-    results = query.all()
+def query_top_locations(
+    db: Session,
+    limit: int,
+    start_date: Optional[date],
+    end_date: Optional[date],
+) -> List[LocationStats]:
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        filters = AccidentFilters(start_date=start_date, end_date=end_date)
+        return [
+            LocationStats(longitude=longitude, latitude=latitude, count=count)
+            for longitude, latitude, count in snapshot.top_locations(
+                limit, filters
+            )
+        ]
+
+    query = db.query(
+        Accident.longitude,
+        Accident.latitude,
+        func.count(Accident.id).label("count"),
+    ).filter(Accident.longitude.isnot(None), Accident.latitude.isnot(None))
+
+    query = filter_dates(query, start_date, end_date)
+
+    results = (
+        query.group_by(Accident.longitude, Accident.latitude)
+        .order_by(desc("count"))
+        .limit(limit)
+        .all()
+    )
 
     return [
         LocationStats(longitude=longitude, latitude=latitude, count=count)
         for longitude, latitude, count in results
     ]
+
+
+@router.get("/hotspots", response_model=List[HotspotStats])
+async def get_hotspots(
+    request: Request,
+    precision: int = QueryParam(6, ge=1, le=GEOHASH_PRECISION),
+    limit: int = QueryParam(500, ge=1, le=10000),
+    filters: AccidentFilters = Depends(),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    The busiest geohash cells of the given precision, 6 being cells of
+    about 1.2 x 0.6 km, with the accident count and mean position of each.
+    """
+    return await cached_response(
+        request,
+        lambda: run_query(db, query_hotspots, precision, limit, filters),
+        precision=precision,
+        limit=limit,
+        **asdict(filters),
+    )
+
+
+def query_hotspots(
+    db: Session, precision: int, limit: int, filters: AccidentFilters
+) -> List[HotspotStats]:
+    # Cells at every precision are prefixes of the stored geohash
+    cell = func.substr(Accident.geohash, 1, precision)
+    count = func.count(Accident.id)
+    query = db.query(
+        cell,
+        func.avg(Accident.longitude),
+        func.avg(Accident.latitude),
+        count,
+    ).filter(Accident.geohash.isnot(None))
+
+    query = filters.apply(query)
+
+    results = query.group_by(cell).order_by(count.desc()).limit(limit)
+
+    return [
+        HotspotStats(
+            geohash=geohash,
+            longitude=longitude,
+            latitude=latitude,
+            count=count,
+        )
+        for geohash, longitude, latitude, count in results
+    ]
+
+
+@router.get("/timeseries", response_model=List[TimeSeriesPoint])
+async def get_timeseries(
+    request: Request,
+    interval: TimeInterval = "month",
+    split_by: Optional[SplitDimension] = None,
+    filters: AccidentFilters = Depends(),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    Accident counts and casualties per period, optionally one series per
+    value of ``split_by``, in bucket order.
+    """
+    return await cached_response(
+        request,
+        lambda: run_query(
+            db, query_timeseries, interval, split_by, filters
+        ),
+        interval=interval,
+        split_by=split_by,
+        **asdict(filters),
+    )
+
+
+def query_timeseries(
+    db: Session,
+    interval: str,
+    split_by: Optional[str],
+    filters: AccidentFilters,
+) -> List[TimeSeriesPoint]:
+    split_column = EQUALITY_FILTERS.get(split_by)
+    # The rollup has one row per day, hours need the accidents
+    use_rollup = interval in DATE_INTERVALS and rollup_enabled(
+        split_column, *filters.columns
+    )
+    table = source_table(use_rollup)
+    selected = measures(use_rollup)
+
+    bucket = bucket_expression(
+        interval, table, db.get_bind().dialect.name
+    ).label("bucket")
+    groups = [bucket]
+    if split_column:
+        groups.append(dimension(split_column, use_rollup).label("group"))
+
+    query = db.query(
+        *groups,
+        selected["count"].label("count"),
+        selected["total_casualties"].label("total_casualties"),
+    )
+    query = filters.apply(query, table)
+    query = query.group_by(*groups).order_by(*groups)
+
+    return [
+        TimeSeriesPoint(
+            bucket=row.bucket,
+            group=row.group if split_column else None,
+            count=row.count,
+            total_casualties=row.total_casualties or 0,
+        )
+        for row in query
+    ]
+
+
+@router.get("/dashboard", response_model=AnalyticsResponse)
+async def get_dashboard(
+    request: Request,
+    limit: int = 10,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    return await cached_response(
+        request,
+        lambda: run_query(db, query_dashboard, limit, start_date, end_date),
+        limit=limit,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+
+def query_dashboard(
+    db: Session,
+    limit: int,
+    start_date: Optional[date],
+    end_date: Optional[date],
+) -> AnalyticsResponse:
+    """
+    Everything the analytics dashboard shows, in two queries: one for the
+    summary and the severity, road type and weather breakdowns, one for
+    the top locations, which the rollup cannot answer. With the snapshot
+    enabled no query is run. Breakdowns are ordered by count, most first,
+    then by value.
+    """
+    breakdowns = {name: [] for name in DASHBOARD_DIMENSIONS}
+    summary = None
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        filters = AccidentFilters(start_date=start_date, end_date=end_date)
+        summary = build_summary(snapshot.summary(filters))
+        for name, column in DASHBOARD_DIMENSIONS.items():
+            breakdowns[name] = snapshot.breakdown([column], ["count"], filters)
+    else:
+        statement = dashboard_statement(db, start_date, end_date)
+        for row in db.execute(statement):
+            if row.dimension is None:
+                summary = build_summary(row)
+            else:
+                breakdowns[row.dimension].append(
+                    (row.value, row.total_accidents)
+                )
+    # Neither path returns the groups in a set order
+    for name, items in breakdowns.items():
+        breakdowns[name] = sorted(
+            items,
+            key=lambda item: (-item[1], item[0] is None, item[0] or ""),
+        )
+
+    total = summary.total_accidents or 1
+    return AnalyticsResponse(
+        summary=summary,
+        by_severity=[
+            SeverityStats(
+                severity=severity,
+                count=count,
+                percentage=count * 100.0 / total,
+            )
+            for severity, count in breakdowns["severity"]
+        ],
+        by_road_type=[
+            RoadTypeStats(
+                road_type=road_type,
+                count=count,
+                percentage=count * 100.0 / total,
+            )
+            for road_type, count in breakdowns["road_type"]
+        ],
+        by_weather=[
+            WeatherStats(
+                weather_condition=weather_condition,
+                count=count,
+                percentage=round(count * 100.0 / total, 2),
+            )
+            for weather_condition, count in breakdowns["weather"]
+        ],
+        top_locations=query_top_locations(db, limit, start_date, end_date),
+    )
+
+
+def dashboard_statement(
+    db: Session, start_date: Optional[date], end_date: Optional[date]
+):
+    """
+    Aggregate the summary and every dashboard breakdown in one statement.
+    Each row is tagged with the dimension it groups by, the summary row
+    with NULL. PostgreSQL computes all of them in a single scan with
+    GROUPING SETS, other engines run one grouped select per dimension
+    combined with UNION ALL. The rollup is used when it is enabled.
+    """
+    use_rollup = rollup_enabled(*DASHBOARD_DIMENSIONS.values())
+    aggregates = summary_columns(use_rollup)
+    columns = {
+        name: dimension(column, use_rollup)
+        for name, column in DASHBOARD_DIMENSIONS.items()
+    }
+
+    if db.get_bind().dialect.name == "postgresql":
+        tag = case(
+            *(
+                (func.grouping(column) == 0, name)
+                for name, column in columns.items()
+            ),
+            else_=null(),
+        )
+        # Only the grouped column is set on a row, the others are NULL
+        statement = select(
+            tag.label("dimension"),
+            func.coalesce(*columns.values()).label("value"),
+            *aggregates,
+        ).group_by(func.grouping_sets(*columns.values(), tuple_()))
+        return filter_dates(statement, start_date, end_date, use_rollup)
+
+    selects = [
+        select(
+            literal(name).label("dimension"),
+            column.label("value"),
+            *aggregates,
+        ).group_by(column)
+        for name, column in columns.items()
+    ]
+    selects.append(
+        select(null().label("dimension"), null().label("value"), *aggregates)
+    )
+    selects = [
+        filter_dates(statement, start_date, end_date, use_rollup)
+        for statement in selects
+    ]
+    return selects[0].union_all(*selects[1:])
+
+
+@router.get("/snapshot", response_model=SnapshotStats)
+def get_snapshot_stats():
+    """
+    Size of the in-memory analytics snapshot, loading it if need be.
+    """
+    snapshot = current_snapshot()
+    if snapshot is None:
+        raise HTTPException(
+            status_code=404, detail="The analytics snapshot is disabled"
+        )
+    return SnapshotStats(
+        rows=len(snapshot),
+        memory_bytes=snapshot.nbytes,
+        bytes_per_million_rows=bytes_per_million_rows(snapshot),
+        data_version=snapshot.version,
+    )
@@ -1,13 +1,17 @@
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timezone
 from jose import JWTError, jwt
 
-from database import get_db
+from database import get_async_db
 from models import User
 from schemas import (
     UserCreate,
@@ -17,6 +21,7 @@ from schemas import (
     UserUpdate,
 )
 from config import get_settings
+from services.cache import MemoryCache
 
 router = APIRouter(prefix="/auth")
 
@@ -26,6 +31,13 @@ settings = get_settings()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# bcrypt is slow on purpose, so it runs on a few threads of its own
+# rather than on the event loop or the shared thread pool
+hash_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers,
+    thread_name_prefix="bcrypt",
+)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -35,6 +47,27 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def run_hashing(function, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hash_executor, function, *args)
+
+
+# Users by token, apart from the analytics cache so its payloads cannot
+# evict them. Each process keeps its own, so a change made through another
+# process shows once the entries expire.
+principal_cache = MemoryCache(settings.auth_cache_max_entries)
+
+
+def principal_key(email: str, token: str) -> str:
+    digest = hashlib.sha256(token.encode()).hexdigest()
+    return f"principal:{email}:{digest}"
+
+
+def invalidate_principals(email: str):
+    """Forget the cached principal of every token of the user."""
+    principal_cache.delete_prefix(f"principal:{email}:")
+
+
 def create_access_token(
     data: dict,
     expires_delta: Optional[timedelta] = None,
@@ -54,8 +87,13 @@ def create_access_token(
 
 
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-):
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> UserSchema:
+    """
+    The user the bearer token belongs to. Principals are cached for
+    ``auth_cache_ttl_seconds`` per token, saving the users query.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -71,18 +109,32 @@ async def get_current_user(
         token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.email == token_data.email).first()
+
+    key = principal_key(token_data.email, token)
+    if settings.auth_cache_ttl_seconds:
+        principal = principal_cache.get(key)
+        if principal is not None:
+            return UserSchema.model_validate_json(principal)
+
+    user = await db.scalar(select(User).where(User.email == token_data.email))
     if user is None:
         raise credentials_exception
-    return user
+    principal = UserSchema.model_validate(user)
+    if settings.auth_cache_ttl_seconds:
+        principal_cache.set(
+            key, principal.model_dump_json(), settings.auth_cache_ttl_seconds
+        )
+    return principal
 
 
 @router.post("/signup", response_model=UserSchema)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+async def create_user(
+    user: UserCreate, db: AsyncSession = Depends(get_async_db)
+):
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await run_hashing(get_password_hash, user.password)
     db_user = User(
         name=user.name,
         email=user.email,
@@ -90,20 +142,23 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
         created_at=datetime.now(tz=timezone.utc),
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 @router.post("/token", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(
-        get_db,
+    db: AsyncSession = Depends(
+        get_async_db,
     ),
 ):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(
+    user = await db.scalar(
+        select(User).where(User.email == form_data.username)
+    )
+    if not user or not await run_hashing(
+        verify_password,
         form_data.password,
         user.hashed_password,
     ):
@@ -122,22 +177,25 @@ async def login(
 
 
 @router.get("/me", response_model=UserSchema)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(
+    current_user: UserSchema = Depends(get_current_user),
+):
     return current_user
 
 
 @router.patch("/me", response_model=UserSchema)
 async def update_user(
     user_update: UserUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: UserSchema = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
+    user = await db.get(User, current_user.id)
     # Update only the name field
-    current_user.name = user_update.name
-    current_user.updated_at = datetime.now(tz=timezone.utc)
+    user.name = user_update.name
+    user.updated_at = datetime.now(tz=timezone.utc)
 
-    db.add(current_user)
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(user)
+    invalidate_principals(user.email)
 
-    return current_user
+    return user
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, field_validator, field_serializer, EmailStr
-from typing import Optional, List
-from datetime import time, datetime
+from pydantic import BaseModel, field_validator, EmailStr
+from typing import Optional, List, Dict, Any, Literal, Union
+from datetime import date as Date, time as Time, datetime
 
 
 class AccidentBase(BaseModel):
@@ -12,9 +12,9 @@ class AccidentBase(BaseModel):
     accident_severity: str
     number_of_vehicles: Optional[int] = None
     number_of_casualties: Optional[int] = None
-    date: str
+    date: Date
     day_of_week: Optional[int] = None
-    time: Optional[str] = None
+    time: Optional[Time] = None
     local_authority_district: Optional[str] = None
     local_authority_highway: Optional[str] = None
     first_road_class: Optional[str] = None
@@ -36,37 +36,48 @@ class AccidentBase(BaseModel):
     lsoa_of_accident_location: Optional[str] = None
     year: Optional[int] = None
 
-    @field_validator("time")
+    @field_validator("time", mode="before")
     def validate_time(cls, v):
-        if v is None or v == "":
+        # The dashboard form sends an empty string when no time is set
+        if v == "":
             return None
-        if isinstance(v, str):
-            try:
-                return time.fromisoformat(v)
-            except ValueError:
-                return None
         return v
 
-    @field_serializer("time")
-    def serialize_time(self, time_value: Optional[str], _info):
-        if time_value is None:
-            return None
-        return time_value
-
 
 class AccidentCreate(AccidentBase):
-    time: Optional[str] = None
+    pass
 
 
 class AccidentUpdate(AccidentBase):
     accident_severity: Optional[str] = None
-    date: Optional[str] = None
-    time: Optional[str] = None
+    date: Optional[Date] = None
+
+
+class AccidentBatchUpdate(AccidentUpdate):
+    id: int
+
+
+BatchStatus = Literal[
+    "created",
+    "updated",
+    "unchanged",
+    "deleted",
+    "conflict",
+    "not_found",
+    "invalid",
+]
+
+
+class BatchItemResult(BaseModel):
+    # Position of the item in the request
+    index: int
+    id: Optional[int] = None
+    status: BatchStatus
+    detail: Optional[str] = None
 
 
 class Accident(AccidentBase):
     id: int
-    time: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -87,13 +98,13 @@ class SeverityStats(BaseModel):
 
 
 class RoadTypeStats(BaseModel):
-    road_type: str
+    road_type: Optional[str]
     count: int
     percentage: float
 
 
 class WeatherStats(BaseModel):
-    weather_condition: str
+    weather_condition: Optional[str]
     count: int
     percentage: float
 
@@ -105,9 +116,42 @@ class LocationStats(BaseModel):
     location_name: Optional[str] = None
 
 
+class HotspotStats(BaseModel):
+    geohash: str
+    # Mean position of the accidents in the cell
+    longitude: float
+    latitude: float
+    count: int
+
+
+TimeInterval = Literal["hour", "day_of_week", "day", "week", "month", "year"]
+SplitDimension = Literal["severity", "road_type", "weather", "police_force"]
+
+
+class TimeSeriesPoint(BaseModel):
+    # Hour of day, STATS19 day of week or the first day of the period
+    bucket: Union[int, Date]
+    group: Optional[str] = None
+    count: int
+    total_casualties: int
+
+
+class BreakdownRow(BaseModel):
+    # Keyed by the dimension and metric names requested
+    dimensions: Dict[str, Union[int, str, None]]
+    metrics: Dict[str, Union[int, float, None]]
+
+
+class SnapshotStats(BaseModel):
+    rows: int
+    memory_bytes: int
+    bytes_per_million_rows: int
+    data_version: int
+
+
 class DateRangeFilter(BaseModel):
-    start_date: Optional[str] = None
-    end_date: Optional[str] = None
+    start_date: Optional[Date] = None
+    end_date: Optional[Date] = None
 
 
 class AnalyticsResponse(BaseModel):
@@ -152,3 +196,31 @@ class TokenData(BaseModel):
 
 class UserUpdate(BaseModel):
     name: str
+
+
+ImportMode = Literal["upsert", "append"]
+ExportFormat = Literal["csv", "ndjson", "parquet"]
+# "fast" encodes the same list as "default" straight from the rows,
+# "columnar" as an object holding each field's array of values
+ListFormat = Literal["default", "fast", "columnar"]
+
+
+class ImportJob(BaseModel):
+    id: str
+    filename: Optional[str] = None
+    status: str
+    rows_processed: int
+    rows_loaded: int
+    rows_failed: int
+    rows_inserted: int
+    rows_updated: int
+    rows_skipped: int
+    rows_per_second: float
+    errors: List[Dict[str, Any]]
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,239 @@
+from typing import Any, Dict, Iterable, List, Optional
+import pandas as pd
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+from models import Accident
+from services.bulk_load import COLUMNS, LOOKUP_BATCH_SIZE, to_records
+from services.categories import category_codes
+from services.filters import AccidentFilters
+from services.geohash import add_geohashes
+from services.rollup import refresh_rollup
+from services.row_hashes import SOURCE_COLUMNS, add_row_hashes
+
+MAX_BATCH_SIZE = 5000
+# Statuses of items that changed the accidents
+WRITTEN_STATUSES = {"created", "updated", "deleted"}
+KEY_CONFLICT = "An accident with the same natural key already exists"
+REQUIRED_FIELDS = "date and accident_severity cannot be null"
+
+
+def create_accidents(
+    db: Session, accidents: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Insert the accidents in one statement, skipping those whose natural
+    key is taken, by a stored accident or an earlier item. Accidents
+    without a natural key never conflict. Returns the result of every
+    item in order.
+    """
+    df = _derive(accidents)
+    keys = _keys(df)
+    existing = _lookup(db, Accident.natural_key, keys, Accident.id)
+    results = [None] * len(accidents)
+    seen = set()
+    for index, key in enumerate(keys):
+        if key is None:
+            continue
+        if key in existing or key in seen:
+            # The id of the accident holding the key, if already stored
+            accident_id = existing[key][0] if key in existing else None
+            results[index] = _result(
+                index, "conflict", accident_id, KEY_CONFLICT
+            )
+        seen.add(key)
+
+    new = df[[result is None for result in results]]
+    if len(new):
+        category_codes.register_frame(db, new)
+        # Accidents without a natural key are told apart by position
+        ids = db.execute(
+            insert(Accident).returning(
+                Accident.id, sort_by_parameter_order=True
+            ),
+            to_records(new[COLUMNS]),
+        ).scalars().all()
+        refresh_rollup(db, new["date"])
+        for index, accident_id in zip(new.index, ids):
+            results[index] = _result(index, "created", accident_id)
+    return results
+
+
+def update_accidents(
+    db: Session, changes: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Apply each change, the ``id`` of an accident and the fields to set, in
+    one statement. Changes leaving an accident as it was are not written.
+    Returns the result of every item in order.
+    """
+    current = _lookup(
+        db,
+        Accident.id,
+        [change["id"] for change in changes],
+        Accident.content_hash,
+        *(getattr(Accident, name) for name in SOURCE_COLUMNS),
+    )
+    results = [None] * len(changes)
+    records = {}
+    seen = set()
+    for index, change in enumerate(changes):
+        accident_id = change["id"]
+        row = current.get(accident_id)
+        if row is None:
+            results[index] = _result(index, "not_found", accident_id)
+            continue
+        if accident_id in seen:
+            results[index] = _result(
+                index,
+                "conflict",
+                accident_id,
+                "The accident is changed by an earlier item",
+            )
+            continue
+        seen.add(accident_id)
+        record = {**row._asdict(), **change}
+        if record["date"] is None or record["accident_severity"] is None:
+            results[index] = _result(
+                index, "invalid", accident_id, REQUIRED_FIELDS
+            )
+            continue
+        records[index] = record
+
+    df = _derive(records.values(), index=list(records))
+    changed = df["content_hash"] != pd.Series(
+        [records[index]["content_hash"] for index in df.index],
+        index=df.index,
+    )
+    for index in df.index[~changed]:
+        results[index] = _result(index, "unchanged", records[index]["id"])
+    df = df[changed]
+
+    keys = _keys(df)
+    taken = _lookup(db, Accident.natural_key, keys, Accident.id)
+    seen = set()
+    for index, key in zip(df.index, keys):
+        if key is None:
+            continue
+        accident_id = records[index]["id"]
+        if taken.get(key, (accident_id,))[0] != accident_id or key in seen:
+            results[index] = _result(
+                index, "conflict", accident_id, KEY_CONFLICT
+            )
+        seen.add(key)
+
+    df = df[[results[index] is None for index in df.index]]
+    if len(df):
+        category_codes.register_frame(db, df)
+        rows = to_records(df[COLUMNS])
+        for index, row in zip(df.index, rows):
+            row["id"] = records[index]["id"]
+        db.execute(update(Accident), rows)
+        # An update may move an accident to another day
+        refresh_rollup(
+            db,
+            [records[index]["date"] for index in df.index]
+            + [current[records[index]["id"]].date for index in df.index],
+        )
+        for index in df.index:
+            results[index] = _result(index, "updated", records[index]["id"])
+    return results
+
+
+def delete_accidents(db: Session, ids: List[int]) -> List[Dict[str, Any]]:
+    """
+    Delete the accidents by id without loading them. Returns the result
+    of every item in order, an id given again being already deleted.
+    """
+    unique = list(dict.fromkeys(ids))
+    deleted = {}
+    for start in range(0, len(unique), LOOKUP_BATCH_SIZE):
+        rows = db.execute(
+            delete(Accident)
+            .where(Accident.id.in_(unique[start:start + LOOKUP_BATCH_SIZE]))
+            .returning(Accident.id, Accident.date)
+            .execution_options(synchronize_session=False)
+        )
+        deleted.update(rows.all())
+    refresh_rollup(db, deleted.values())
+    results = []
+    seen = set()
+    for index, accident_id in enumerate(ids):
+        found = accident_id in deleted and accident_id not in seen
+        seen.add(accident_id)
+        results.append(
+            _result(index, "deleted" if found else "not_found", accident_id)
+        )
+    return results
+
+
+def delete_matching(db: Session, filters: AccidentFilters) -> int:
+    """
+    Delete every accident matching the filters in one statement and
+    return how many were.
+    """
+    dates = db.execute(
+        filters.apply(select(Accident.date).distinct())
+    ).scalars().all()
+    result = db.execute(
+        filters.apply(delete(Accident)).execution_options(
+            synchronize_session=False
+        )
+    )
+    refresh_rollup(db, dates)
+    return result.rowcount
+
+
+def _derive(
+    records: Iterable[Dict[str, Any]], index: Optional[list] = None
+) -> pd.DataFrame:
+    """
+    The accidents as a frame holding the derived columns too, computed as
+    for a single accident. Object columns keep every value's own type, so
+    the hashes do not depend on the other rows.
+    """
+    df = pd.DataFrame(
+        [
+            {name: record.get(name) for name in SOURCE_COLUMNS}
+            for record in records
+        ],
+        columns=SOURCE_COLUMNS,
+        index=index,
+        dtype=object,
+    )
+    return add_row_hashes(add_geohashes(df))
+
+
+def _keys(df: pd.DataFrame) -> List[Optional[int]]:
+    """The natural keys of the accidents, None for those without one."""
+    return [
+        None if pd.isna(key) else int(key) for key in df["natural_key"]
+    ]
+
+
+def _lookup(db: Session, key, values, *columns) -> Dict[Any, Any]:
+    """The ``columns`` of the accidents whose ``key`` is in ``values``."""
+    values = [value for value in dict.fromkeys(values) if value is not None]
+    found = {}
+    for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+        rows = db.execute(
+            select(*columns, key).where(
+                key.in_(values[start:start + LOOKUP_BATCH_SIZE])
+            )
+        )
+        for row in rows:
+            found[row[-1]] = row
+    return found
+
+
+def _result(
+    index: int,
+    status: str,
+    accident_id: Optional[int] = None,
+    detail: Optional[str] = None,
+) -> Dict[str, Any]:
+    return {
+        "index": index,
+        "id": accident_id,
+        "status": status,
+        "detail": detail,
+    }
@@ -0,0 +1,103 @@
+from sqlalchemy import func, select
+from sqlalchemy.sql import Select
+from typing import Dict, List, Optional
+from services.filters import EQUALITY_FILTERS, AccidentFilters
+from services.rollup import (
+    dimension,
+    measures,
+    rollup_enabled,
+    source_table,
+)
+
+# Accident columns that can be grouped by, by name. The filter parameter
+# names are accepted as well.
+BREAKDOWN_DIMENSIONS: Dict[str, str] = {
+    **EQUALITY_FILTERS,
+    **{
+        column: column
+        for column in [
+            "accident_severity",
+            "police_force",
+            "day_of_week",
+            "year",
+            "local_authority_district",
+            "local_authority_highway",
+            "first_road_class",
+            "second_road_class",
+            "road_type",
+            "speed_limit",
+            "junction_control",
+            "pedestrian_crossing_human_control",
+            "pedestrian_crossing_physical_facilities",
+            "light_conditions",
+            "weather_conditions",
+            "road_surface_conditions",
+            "special_conditions_at_site",
+            "carriageway_hazards",
+            "urban_or_rural_area",
+            "did_police_officer_attend",
+        ]
+    },
+}
+BREAKDOWN_METRICS = [
+    "count",
+    "percentage",
+    "row_percentage",
+    "total_casualties",
+    "total_vehicles",
+    "average_casualties",
+    "average_vehicles",
+]
+MAX_BREAKDOWN_DIMENSIONS = 3
+
+
+def parse_names(
+    value: Optional[str], allowed, kind: str, default: List[str]
+) -> List[str]:
+    """
+    Split a comma separated list of names, raising ValueError on a name
+    not in ``allowed`` or given twice.
+    """
+    if not value:
+        return default
+    names = [name.strip() for name in value.split(",")]
+    for name in names:
+        if name not in allowed:
+            raise ValueError(
+                f"Unknown {kind} '{name}', expected one of: "
+                + ", ".join(allowed)
+            )
+    if len(set(names)) != len(names):
+        raise ValueError(f"A {kind} is given more than once")
+    return names
+
+
+def breakdown_statement(
+    dimensions: List[str], metrics: List[str], filters: AccidentFilters
+) -> Select:
+    """
+    Group the filtered accidents by every dimension at once, one row per
+    combination present, with the metrics labelled by name and the
+    dimensions by the names given. Percentages are computed with window
+    functions over the grouped rows, ``percentage`` of all the accidents
+    and ``row_percentage`` of those sharing the first dimension's value.
+    Rows come busiest first. The rollup is used when it holds every
+    column involved.
+    """
+    names = [BREAKDOWN_DIMENSIONS[name] for name in dimensions]
+    use_rollup = rollup_enabled(*names, *filters.columns)
+    columns = [dimension(name, use_rollup) for name in names]
+
+    aggregates = measures(use_rollup)
+    count = aggregates["count"]
+    aggregates["percentage"] = count * 100.0 / func.sum(count).over()
+    aggregates["row_percentage"] = (
+        count * 100.0 / func.sum(count).over(partition_by=columns[0])
+    )
+
+    statement = select(
+        *(column.label(name) for name, column in zip(dimensions, columns)),
+        *(aggregates[name].label(name) for name in metrics),
+    )
+    statement = filters.apply(statement, source_table(use_rollup))
+    return statement.group_by(*columns).order_by(count.desc(), *columns)
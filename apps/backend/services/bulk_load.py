@@ -0,0 +1,237 @@
+import io
+import pandas as pd
+from sqlalchemy import insert, select, text, update
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Tuple
+from models import Accident
+from services.cache import bump_data_version
+from services.categories import category_codes
+from services.geohash import add_geohashes
+from services.rollup import merge_rollup, refresh_rollup
+from services.row_hashes import add_row_hashes
+
+COLUMNS = [
+    column.name
+    for column in Accident.__table__.columns
+    if not column.primary_key
+]
+STAGING_TABLE = "accidents_staging"
+LOOKUP_BATCH_SIZE = 500
+
+
+def to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Convert a converted chunk into plain Python dicts with NULLs as None.
+    """
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+class BulkLoader:
+    """
+    Write converted upload chunks into the accidents table.
+
+    On PostgreSQL each chunk is streamed with ``COPY ... FROM STDIN``; other
+    engines fall back to a batched executemany insert. With ``atomic`` the
+    rows are collected in a staging table (PostgreSQL) or a single open
+    transaction and only become visible when ``finish`` is called, otherwise
+    every chunk is committed as soon as it is written.
+
+    With ``upsert`` rows are matched to existing accidents on their natural
+    key: new rows are inserted, changed rows updated and identical rows
+    skipped, so loading the same file twice is a no-op. Rows without a
+    natural key are always inserted.
+
+    Inserted rows are added to the daily rollup and the days of updated
+    rows recomputed, in the same transaction as the rows, as are the codes
+    of new category values.
+    """
+
+    def __init__(self, db: Session, atomic: bool = False, upsert: bool = True):
+        self.db = db
+        self.atomic = atomic
+        self.upsert = upsert
+        self.use_copy = db.get_bind().dialect.name == "postgresql"
+        self.rows_loaded = 0
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        self._staging = False
+        self._dates = set()
+
+    def load(self, df: pd.DataFrame) -> int:
+        if not len(df):
+            return 0
+
+        df = add_row_hashes(add_geohashes(df))
+        category_codes.register_frame(self.db, df)
+        if self.upsert:
+            # A key repeated within the chunk is resolved by its last row
+            unique = df[
+                df["natural_key"].isna()
+                | ~df.duplicated("natural_key", keep="last")
+            ]
+            self.skipped += len(df) - len(unique)
+            self._upsert(unique)
+        elif self.use_copy:
+            table = Accident.__tablename__
+            if self.atomic:
+                self._create_staging_table()
+                table = STAGING_TABLE
+            self._copy(df, table)
+            merge_rollup(self.db, df)
+            self.inserted += len(df)
+        else:
+            self.db.execute(insert(Accident), to_records(df[COLUMNS]))
+            merge_rollup(self.db, df)
+            self.inserted += len(df)
+
+        if not self.atomic:
+            self._refresh_rollup()
+            self.db.commit()
+            bump_data_version()
+            # The staging table is dropped on commit
+            self._staging = False
+        self.rows_loaded += len(df)
+        return len(df)
+
+    def finish(self) -> int:
+        if self._staging and not self.upsert:
+            self.db.execute(
+                text(
+                    f"INSERT INTO {Accident.__tablename__} ({_columns()}) "
+                    f"SELECT {_columns()} FROM {STAGING_TABLE}"
+                )
+            )
+        self._staging = False
+        self._refresh_rollup()
+        self.db.commit()
+        bump_data_version()
+        return self.rows_loaded
+
+    def _upsert(self, df: pd.DataFrame):
+        if self.use_copy:
+            self._create_staging_table()
+            self._copy(df, STAGING_TABLE)
+            # An update may move an accident to another day
+            self._dates.update(
+                self.db.execute(
+                    text(
+                        f"SELECT DISTINCT a.date "
+                        f"FROM {Accident.__tablename__} a "
+                        f"JOIN {STAGING_TABLE} s USING (natural_key) "
+                        f"WHERE a.content_hash "
+                        f"IS DISTINCT FROM s.content_hash"
+                    )
+                ).scalars()
+            )
+            new, updated = self._merge_staging(df)
+            self.db.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+        else:
+            new, updated = self._merge_records(df)
+        merge_rollup(self.db, new)
+        self.inserted += len(new)
+        self.updated += updated
+        self.skipped += len(df) - len(new) - updated
+
+    def _refresh_rollup(self):
+        refresh_rollup(self.db, self._dates)
+        self._dates = set()
+
+    def _merge_staging(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+        """
+        Merge the staged rows into the accidents, the rows inserted and the
+        number updated.
+        """
+        table = Accident.__tablename__
+        assignments = ", ".join(
+            f"{name} = EXCLUDED.{name}" for name in COLUMNS
+        )
+        # xmax is only set on rows the statement updated
+        merged = self.db.execute(
+            text(
+                f"INSERT INTO {table} ({_columns()}) "
+                f"SELECT {_columns()} FROM {STAGING_TABLE} "
+                f"ON CONFLICT (natural_key) DO UPDATE SET {assignments} "
+                f"WHERE {table}.content_hash "
+                f"IS DISTINCT FROM EXCLUDED.content_hash "
+                f"RETURNING natural_key, date, xmax = 0 AS inserted"
+            )
+        ).all()
+        inserted = {key for key, _, new in merged if new}
+        self._dates.update(day for _, day, new in merged if not new)
+        new = df[df["natural_key"].isna() | df["natural_key"].isin(inserted)]
+        return new, len(merged) - len(new)
+
+    def _merge_records(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+        ids = {}
+        hashes = {}
+        dates = {}
+        keys = df["natural_key"].dropna().tolist()
+        for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            rows = self.db.execute(
+                select(
+                    Accident.natural_key,
+                    Accident.id,
+                    Accident.content_hash,
+                    Accident.date,
+                ).where(
+                    Accident.natural_key.in_(
+                        keys[start:start + LOOKUP_BATCH_SIZE]
+                    )
+                )
+            )
+            for key, accident_id, content_hash, day in rows:
+                ids[key] = accident_id
+                hashes[key] = content_hash
+                dates[key] = day
+
+        found = df["natural_key"].isin(ids)
+        new = df[~found]
+        changed = df[
+            found & (df["content_hash"] != df["natural_key"].map(hashes))
+        ]
+
+        if len(new):
+            self.db.execute(insert(Accident), to_records(new[COLUMNS]))
+        if len(changed):
+            # An update may move an accident to another day
+            self._dates.update(changed["natural_key"].map(dates))
+            self._dates.update(changed["date"])
+            records = to_records(changed[COLUMNS])
+            for record, key in zip(records, changed["natural_key"]):
+                record["id"] = ids[key]
+            self.db.execute(update(Accident), records)
+        return new, len(changed)
+
+    def _create_staging_table(self):
+        if self._staging:
+            return
+        self.db.execute(
+            text(
+                f"CREATE TEMPORARY TABLE {STAGING_TABLE} ON COMMIT DROP AS "
+                f"SELECT {_columns()} FROM {Accident.__tablename__} "
+                "WITH NO DATA"
+            )
+        )
+        self._staging = True
+
+    def _copy(self, df: pd.DataFrame, table: str):
+        buffer = io.StringIO()
+        # Missing values are written as unquoted empty fields, which COPY
+        # reads back as NULL. COPY bypasses the column types, so categories
+        # are written as their codes.
+        category_codes.encode_frame(df[COLUMNS]).to_csv(
+            buffer, header=False, index=False
+        )
+        buffer.seek(0)
+
+        connection = self.db.connection().connection
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table} ({_columns()}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+
+
+def _columns() -> str:
+    return ", ".join(COLUMNS)
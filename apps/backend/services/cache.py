@@ -0,0 +1,196 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from typing import Any, Awaitable, Callable, Optional
+from config import get_settings
+from services.serialization import dumps
+
+settings = get_settings()
+
+DATA_VERSION_KEY = "data_version"
+
+
+class MemoryCache:
+    """
+    Process local cache evicting the least recently used entry once
+    ``max_entries`` is reached. Entries expire ``ttl`` seconds after they
+    were set. Counters are kept apart and never evicted.
+
+    Like every backend its methods have coroutine twins, prefixed with
+    ``a``, for request handlers.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            return self._counters[key]
+
+    def delete_prefix(self, prefix: str):
+        """Drop every entry whose key starts with ``prefix``."""
+        with self._lock:
+            matching = [key for key in self._entries if key.startswith(prefix)]
+            for key in matching:
+                del self._entries[key]
+
+    # Nothing here waits, so the coroutines run the methods directly
+    async def aget(self, key: str) -> Optional[str]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: str, ttl: Optional[int] = None):
+        self.set(key, value, ttl)
+
+    async def aincr(self, key: str, amount: int = 1) -> int:
+        return self.incr(key, amount)
+
+
+class RedisCache:
+    """
+    Cache shared between processes, backed by Redis compatible clients
+    exposing ``get``, ``set`` and ``incr``: a blocking one for the import
+    workers and other threads, and an asyncio one for request handlers so
+    a round trip does not block the event loop.
+    """
+
+    def __init__(
+        self, client, async_client, prefix: str = "accident-analyser:"
+    ):
+        self.client = client
+        self.async_client = async_client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisCache":
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError:
+            raise RuntimeError(
+                "The redis cache backend requires the redis package"
+            )
+        return cls(
+            redis.Redis.from_url(url, decode_responses=True),
+            redis.asyncio.Redis.from_url(url, decode_responses=True),
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None):
+        self.client.set(self.prefix + key, value, ex=ttl or None)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return int(self.client.incr(self.prefix + key, amount))
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await self.async_client.get(self.prefix + key)
+
+    async def aset(self, key: str, value: str, ttl: Optional[int] = None):
+        await self.async_client.set(self.prefix + key, value, ex=ttl or None)
+
+    async def aincr(self, key: str, amount: int = 1) -> int:
+        return int(await self.async_client.incr(self.prefix + key, amount))
+
+
+@lru_cache
+def get_cache():
+    if settings.cache_backend == "redis":
+        return RedisCache.from_url(settings.cache_url)
+    if settings.cache_backend == "memory":
+        return MemoryCache(settings.cache_max_entries)
+    return None
+
+
+def data_version() -> int:
+    cache = get_cache()
+    return cache.incr(DATA_VERSION_KEY, 0) if cache is not None else 0
+
+
+async def adata_version() -> int:
+    cache = get_cache()
+    return await cache.aincr(DATA_VERSION_KEY, 0) if cache is not None else 0
+
+
+def bump_data_version():
+    """
+    Invalidate every cached response. Call after committing a change to
+    the accidents.
+    """
+    cache = get_cache()
+    if cache is not None:
+        cache.incr(DATA_VERSION_KEY)
+
+
+async def abump_data_version():
+    """``bump_data_version`` for request handlers."""
+    cache = get_cache()
+    if cache is not None:
+        await cache.aincr(DATA_VERSION_KEY)
+
+
+async def cached_response(
+    request: Request, compute: Callable[[], Awaitable[Any]], **params
+) -> Response:
+    """
+    Return the JSON body the ``compute`` coroutine produces, cached per
+    path, ``params`` and data version. The body's ETag is sent along and a
+    matching ``If-None-Match`` is answered with 304 Not Modified. Bodies
+    computed on the read replica are served but not cached.
+    """
+    cache = get_cache()
+    key = ":".join(
+        [
+            "response",
+            str(await adata_version()),
+            request.url.path,
+            json.dumps(jsonable_encoder(params), sort_keys=True),
+        ]
+    )
+
+    body = await cache.aget(key) if cache is not None else None
+    if body is None:
+        body = dumps(await compute()).decode()
+        # A lagging replica may not hold every change the version counts
+        replica_read = getattr(request.state, "replica_read", False)
+        if cache is not None and not replica_read:
+            await cache.aset(key, body, settings.cache_ttl_seconds)
+
+    etag = '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    matches = [
+        tag.strip().removeprefix("W/")
+        for tag in request.headers.get("if-none-match", "").split(",")
+    ]
+    if etag in matches or "*" in matches:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
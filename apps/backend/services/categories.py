@@ -0,0 +1,294 @@
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+from itertools import chain
+from typing import Dict, Iterable, Mapping, Optional, Set
+import pandas as pd
+from sqlalchemy import event, insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, SessionTransaction
+from sqlalchemy.types import Integer, TypeDecorator
+from database import engine
+
+# Accident columns stored as codes into accident_categories
+CATEGORY_COLUMNS = [
+    "police_force",
+    "accident_severity",
+    "local_authority_district",
+    "local_authority_highway",
+    "first_road_class",
+    "road_type",
+    "junction_control",
+    "second_road_class",
+    "pedestrian_crossing_human_control",
+    "pedestrian_crossing_physical_facilities",
+    "light_conditions",
+    "weather_conditions",
+    "road_surface_conditions",
+    "special_conditions_at_site",
+    "carriageway_hazards",
+    "urban_or_rural_area",
+    "did_police_officer_attend",
+]
+REGISTER_BATCH_SIZE = 500
+# Bound for a value that was never stored, so it matches no row
+UNKNOWN_CODE = -1
+# Key of the codes a session registered but has not committed, in its info
+PENDING_KEY = "pending_category_codes"
+
+# The pending codes of the session that last registered values in this
+# context, which is where its statements are bound
+_pending_codes: ContextVar[Optional[dict]] = ContextVar(
+    "pending_category_codes", default=None
+)
+
+
+class CategoryCodes:
+    """
+    The codes of every category value, read from accident_categories.
+    Codes are unique across attributes, so a code alone is enough to
+    decode it.
+
+    Codes registered by a session are only visible to it, in the context
+    it registered them from, until it commits. They are forgotten when it
+    rolls back or closes without committing.
+
+    Codes are read once on first use. A value or code another process
+    stored since is looked up on its own when first needed.
+    """
+
+    def __init__(self):
+        self._codes: Dict[tuple, int] = {}
+        self._values: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def code(self, attribute: str, value: str) -> Optional[int]:
+        key = (attribute, value)
+        code = self._codes.get(key)
+        pending = _pending_codes.get()
+        if code is None and pending:
+            code = pending["codes"].get(key)
+        return code
+
+    def value(self, code: int) -> Optional[str]:
+        value = self._values.get(code)
+        pending = _pending_codes.get()
+        if value is None and pending:
+            value = pending["values"].get(code)
+        return value
+
+    def encode(self, attribute: str, value: str) -> int:
+        self._load_once()
+        code = self.code(attribute, value)
+        if code is None:
+            # Possibly stored by another process since the codes were read
+            code = self._lookup(attribute=attribute, value=value)
+        return UNKNOWN_CODE if code is None else code
+
+    def decode(self, code: int) -> str:
+        self._load_once()
+        value = self.value(code)
+        if value is None and self._lookup(id=code) is not None:
+            value = self.value(code)
+        if value is None:
+            raise LookupError(f"Unknown category code {code}")
+        return value
+
+    def register(self, session: Session, values: Mapping[str, Iterable[str]]):
+        """
+        Store the values of each attribute that have no code yet, in the
+        session's transaction.
+        """
+        from models import AccidentCategory
+
+        self._load_once()
+        missing = [
+            {"attribute": attribute, "value": value}
+            for attribute, attribute_values in values.items()
+            for value in set(attribute_values)
+            if self.code(attribute, value) is None
+        ]
+        if not missing:
+            return
+
+        table = AccidentCategory.__table__
+        connection = session.connection()
+        dialect = connection.dialect.name
+        pending = session.info.setdefault(
+            PENDING_KEY, {"codes": {}, "values": {}}
+        )
+        _pending_codes.set(pending)
+        for start in range(0, len(missing), REGISTER_BATCH_SIZE):
+            batch = missing[start:start + REGISTER_BATCH_SIZE]
+            if dialect == "postgresql":
+                statement = postgresql_insert(table).on_conflict_do_nothing()
+            elif dialect == "sqlite":
+                statement = sqlite_insert(table).on_conflict_do_nothing()
+            else:
+                statement = insert(table)
+            connection.execute(statement.values(batch))
+
+            attributes = defaultdict(list)
+            for item in batch:
+                attributes[item["attribute"]].append(item["value"])
+            for attribute, names in attributes.items():
+                rows = connection.execute(
+                    select(table.c.id, table.c.value).where(
+                        table.c.attribute == attribute,
+                        table.c.value.in_(names),
+                    )
+                )
+                for code, value in rows:
+                    pending["codes"][(attribute, value)] = code
+                    pending["values"][code] = value
+
+    def register_frame(self, session: Session, df: pd.DataFrame):
+        self.register(
+            session,
+            {
+                column: df[column].dropna().unique()
+                for column in CATEGORY_COLUMNS
+                if column in df.columns
+            },
+        )
+
+    def encode_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Replace the category values of a registered frame by codes."""
+        codes = {}
+        for column in CATEGORY_COLUMNS:
+            if column in df.columns:
+                codes[column] = df[column].map(
+                    lambda value: self.encode(column, value),
+                    na_action="ignore",
+                ).astype("Int64")
+        return df.assign(**codes)
+
+    def reload(self):
+        from models import AccidentCategory
+
+        table = AccidentCategory.__table__
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(table.c.id, table.c.attribute, table.c.value)
+            ).all()
+        self._remember(rows)
+        self._loaded = True
+
+    def commit(self, session: Session):
+        pending = session.info.pop(PENDING_KEY, None)
+        if pending:
+            with self._lock:
+                self._codes = {**self._codes, **pending["codes"]}
+                self._values = {**self._values, **pending["values"]}
+            self._discard(pending)
+
+    def rollback(self, session: Session):
+        pending = session.info.pop(PENDING_KEY, None)
+        if pending:
+            self._discard(pending)
+
+    def _load_once(self):
+        if not self._loaded:
+            self.reload()
+
+    def _lookup(self, **columns) -> Optional[int]:
+        """
+        Read the code matching ``columns`` into the cache and return its id,
+        or None if there is none.
+        """
+        from models import AccidentCategory
+
+        table = AccidentCategory.__table__
+        criteria = [table.c[name] == value for name, value in columns.items()]
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(table.c.id, table.c.attribute, table.c.value).where(
+                    *criteria
+                )
+            ).all()
+        self._remember(rows)
+        return rows[0].id if rows else None
+
+    def _remember(self, rows):
+        # Merged, as codes committed meanwhile may be missing from rows
+        with self._lock:
+            self._codes = {
+                **self._codes,
+                **{
+                    (attribute, value): code
+                    for code, attribute, value in rows
+                },
+            }
+            self._values = {
+                **self._values,
+                **{code: value for code, _, value in rows},
+            }
+
+    def _discard(self, pending: dict):
+        # Emptied too where the context still refers to them
+        pending["codes"].clear()
+        pending["values"].clear()
+
+
+category_codes = CategoryCodes()
+
+
+class Category(TypeDecorator):
+    """
+    A category value stored as its code in accident_categories. Values
+    must be registered before they are written, which happens on flush
+    and in the bulk loader. ``null_code`` stores NULL as a code, so the
+    column can be part of a key.
+    """
+
+    impl = Integer
+    cache_ok = True
+
+    def __init__(self, attribute: str, null_code: Optional[int] = None):
+        super().__init__()
+        self.attribute = attribute
+        self.null_code = null_code
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return self.null_code
+        return category_codes.encode(self.attribute, value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or value == self.null_code:
+            return None
+        return category_codes.decode(value)
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_codes(session):
+    category_codes.commit(session)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _rollback_codes(session, previous_transaction):
+    # Codes of a rolled back savepoint are registered again when needed
+    category_codes.rollback(session)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_codes(session, transaction: SessionTransaction):
+    if transaction.parent is None:
+        category_codes.rollback(session)
+
+
+@event.listens_for(Session, "before_flush")
+def _register_flushed_values(session, flush_context, instances):
+    from models import Accident
+
+    values: Dict[str, Set[str]] = defaultdict(set)
+    for instance in chain(session.new, session.dirty):
+        if isinstance(instance, Accident):
+            for column in CATEGORY_COLUMNS:
+                value = getattr(instance, column)
+                if value is not None:
+                    values[column].add(value)
+    if values:
+        category_codes.register(session, values)
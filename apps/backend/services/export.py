@@ -0,0 +1,160 @@
+import csv
+import importlib.util
+import io
+import json
+import zlib
+from datetime import date, time
+from sqlalchemy import Date, Float, Integer, Time, select
+from typing import Any, Iterable, Iterator, List, Optional
+from database import SessionLocal
+from models import Accident
+from services.filters import AccidentFilters
+from services.row_hashes import DERIVED_COLUMNS
+
+# The fields of schemas.Accident, in table order
+EXPORT_COLUMNS = [
+    column
+    for column in Accident.__table__.columns
+    if column.name not in DERIVED_COLUMNS
+]
+EXPORT_BATCH_SIZE = 5000
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def iter_accident_batches(
+    filters: AccidentFilters, batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[List[Any]]:
+    """
+    Yield the filtered accidents as lists of plain rows in id order.
+    Rows are fetched ``batch_size`` at a time through a server side cursor
+    where the driver supports one, in a session of their own since the
+    response is streamed after the request's session is closed.
+    """
+    statement = filters.apply(
+        select(*EXPORT_COLUMNS).order_by(Accident.id)
+    ).execution_options(yield_per=batch_size)
+    with SessionLocal() as db:
+        yield from db.execute(statement).partitions()
+
+
+def export_csv(batches: Iterable[List[Any]]) -> Iterator[bytes]:
+    # The header uses the upload's column names, so exports re-import
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(column.name for column in EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield _drain(buffer).encode()
+    yield _drain(buffer).encode()
+
+
+def export_ndjson(batches: Iterable[List[Any]]) -> Iterator[bytes]:
+    for rows in batches:
+        yield "".join(
+            json.dumps(row._asdict(), default=_isoformat) + "\n"
+            for row in rows
+        ).encode()
+
+
+def export_parquet(batches: Iterable[List[Any]]) -> Iterator[bytes]:
+    """
+    Write every batch as a Parquet row group. Requires pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            (column.name, _arrow_type(pa, column.type))
+            for column in EXPORT_COLUMNS
+        ]
+    )
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in batches:
+            writer.write_table(
+                pa.Table.from_pylist([row._asdict() for row in rows], schema)
+            )
+            yield sink.drain()
+    yield sink.drain()
+
+
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(
+    filters: AccidentFilters, format: str, compress: Optional[str] = None
+) -> Iterator[bytes]:
+    writers = {
+        "csv": export_csv,
+        "ndjson": export_ndjson,
+        "parquet": export_parquet,
+    }
+    chunks = writers[format](iter_accident_batches(filters))
+    if compress == "gzip":
+        chunks = gzip_stream(chunks)
+    return chunks
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file handing out what was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _drain(buffer: io.StringIO) -> str:
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def _isoformat(value):
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _arrow_type(pa, column_type):
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, Date):
+        return pa.date32()
+    if isinstance(column_type, Time):
+        return pa.time64("us")
+    return pa.string()
@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+from datetime import date
+from fastapi import Query as QueryParam
+from sqlalchemy.orm import Query
+from sqlalchemy.sql import Select
+from typing import Annotated, List, Optional, Tuple, Union
+from models import Accident
+
+NUMBER = r"-?\d+(\.\d+)?"
+BBOX_PATTERN = rf"^{NUMBER},{NUMBER},{NUMBER},{NUMBER}$"
+
+# Filters matching a column exactly, by query parameter
+EQUALITY_FILTERS = {
+    "severity": "accident_severity",
+    "road_type": "road_type",
+    "weather": "weather_conditions",
+    "police_force": "police_force",
+}
+
+
+@dataclass
+class AccidentFilters:
+    """
+    Accident filters read from the query string, every one of them served
+    by an index. Use as ``filters: AccidentFilters = Depends()``.
+    """
+
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    severity: Optional[str] = None
+    road_type: Optional[str] = None
+    weather: Optional[str] = None
+    police_force: Optional[str] = None
+    bbox: Annotated[
+        Optional[str],
+        QueryParam(
+            pattern=BBOX_PATTERN,
+            description="Bounding box as west,south,east,north in degrees",
+        ),
+    ] = None
+
+    @property
+    def bounds(self) -> Optional[Tuple[float, float, float, float]]:
+        if self.bbox is None:
+            return None
+        west, south, east, north = map(float, self.bbox.split(","))
+        return west, south, east, north
+
+    @property
+    def columns(self) -> List[str]:
+        """The columns the given filters constrain."""
+        columns = []
+        if self.start_date or self.end_date:
+            columns.append("date")
+        for parameter, column in EQUALITY_FILTERS.items():
+            if getattr(self, parameter) is not None:
+                columns.append(column)
+        if self.bbox is not None:
+            columns.extend(["longitude", "latitude"])
+        return columns
+
+    def apply(
+        self, query: Union[Query, Select], table=Accident
+    ) -> Union[Query, Select]:
+        """
+        Filter the query on ``table``, the accidents or a table such as the
+        rollup holding every column in ``columns``.
+        """
+        if self.start_date:
+            query = query.filter(table.date >= self.start_date)
+        if self.end_date:
+            query = query.filter(table.date <= self.end_date)
+
+        for parameter, column in EQUALITY_FILTERS.items():
+            value = getattr(self, parameter)
+            if value is not None:
+                query = query.filter(getattr(table, column) == value)
+
+        if self.bounds:
+            west, south, east, north = self.bounds
+            query = query.filter(
+                table.longitude.between(west, east),
+                table.latitude.between(south, north),
+            )
+        return query
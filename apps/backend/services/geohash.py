@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+from functools import reduce
+from typing import Optional
+
+# Cells of about 5 x 5 metres, coarser cells are prefixes of the hash
+GEOHASH_PRECISION = 9
+BASE32 = np.array(list("0123456789bcdefghjkmnpqrstuvwxyz"))
+
+
+def encode_geohashes(
+    latitude: pd.Series,
+    longitude: pd.Series,
+    precision: int = GEOHASH_PRECISION,
+) -> pd.Series:
+    """
+    Geohash every coordinate pair, None where either is missing or out of
+    range.
+    """
+    lat = pd.to_numeric(latitude, errors="coerce").to_numpy(dtype=float)
+    lon = pd.to_numeric(longitude, errors="coerce").to_numpy(dtype=float)
+    valid = (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+
+    # Longitude takes the even bits, counting from the most significant
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    lon_cells = _cells(lon, -180, 360, lon_bits, valid)
+    lat_cells = _cells(lat, -90, 180, lat_bits, valid)
+
+    code = np.zeros(len(lat), dtype=np.int64)
+    for position in range(bits):
+        if position % 2 == 0:
+            bit = (lon_cells >> (lon_bits - 1 - position // 2)) & 1
+        else:
+            bit = (lat_cells >> (lat_bits - 1 - position // 2)) & 1
+        code = (code << 1) | bit
+
+    characters = [
+        BASE32[(code >> (5 * (precision - 1 - index))) & 31]
+        for index in range(precision)
+    ]
+    hashes = pd.Series(
+        reduce(np.char.add, characters), index=latitude.index, dtype=object
+    )
+    return hashes.where(valid, None)
+
+
+def encode_geohash(
+    latitude: Optional[float],
+    longitude: Optional[float],
+    precision: int = GEOHASH_PRECISION,
+) -> Optional[str]:
+    hashes = encode_geohashes(
+        pd.Series([latitude], dtype=object),
+        pd.Series([longitude], dtype=object),
+        precision,
+    )
+    return hashes.iloc[0]
+
+
+def add_geohashes(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(geohash=encode_geohashes(df["latitude"], df["longitude"]))
+
+
+def _cells(
+    values: np.ndarray, low: float, span: float, bits: int, valid: np.ndarray
+) -> np.ndarray:
+    count = 1 << bits
+    scaled = np.floor((np.where(valid, values, low) - low) / span * count)
+    return np.clip(scaled, 0, count - 1).astype(np.int64)
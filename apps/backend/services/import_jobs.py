@@ -0,0 +1,118 @@
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from sqlalchemy.orm import Session
+from config import get_settings
+from database import SessionLocal
+from models import ImportJob
+from services.parallel_import import process_csv_file_parallel
+from services.upload import iter_csv_chunks, process_csv_file
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.import_workers,
+    thread_name_prefix="import",
+)
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+def create_import_job(
+    db: Session, path: str, filename: str, upsert: bool = True
+) -> ImportJob:
+    """
+    Record a queued import of the CSV file at ``path`` and hand it to the
+    worker pool. The worker owns ``path`` and removes it when done.
+    """
+    job = ImportJob(id=uuid.uuid4().hex, filename=filename, status="queued")
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    executor.submit(run_import_job, job.id, path, upsert)
+    return job
+
+
+def get_import_job(db: Session, job_id: str) -> Optional[ImportJob]:
+    return db.get(ImportJob, job_id)
+
+
+def cancel_import_job(db: Session, job_id: str) -> Optional[ImportJob]:
+    job = db.get(ImportJob, job_id)
+    if job is None:
+        return None
+    if job.status in ("queued", "running"):
+        job.cancel_requested = True
+        db.commit()
+        db.refresh(job)
+    return job
+
+
+def run_import_job(job_id: str, path: str, upsert: bool = True):
+    """
+    Run an import outside the request lifecycle. Progress is written to the
+    job row after every chunk, and a cancellation request is honoured before
+    the next chunk starts. Chunks already loaded are kept.
+    """
+    jobs = SessionLocal()
+    db = SessionLocal()
+    try:
+        job = jobs.get(ImportJob, job_id)
+        if job.cancel_requested:
+            _finish(jobs, job, "cancelled")
+            return
+        job.status = "running"
+        job.started_at = datetime.now(tz=timezone.utc)
+        jobs.commit()
+
+        def on_chunk(results: Dict[str, Any]):
+            job.rows_processed = results["total_rows"]
+            job.rows_loaded = results["successful"]
+            job.rows_failed = results["failed"]
+            job.rows_inserted = results["inserted"]
+            job.rows_updated = results["updated"]
+            job.rows_skipped = results["skipped"]
+            job.errors = list(results["errors"])
+            jobs.commit()
+            # Expire so a cancellation from another session is seen
+            jobs.refresh(job, ["cancel_requested"])
+            if job.cancel_requested:
+                raise ImportCancelled()
+
+        try:
+            if settings.import_processes != 1:
+                process_csv_file_parallel(
+                    path, db, upsert=upsert, on_chunk=on_chunk
+                )
+            else:
+                process_csv_file(
+                    iter_csv_chunks(path), db, upsert=upsert, on_chunk=on_chunk
+                )
+        except ImportCancelled:
+            db.rollback()
+            _finish(jobs, job, "cancelled")
+            return
+        except Exception as e:
+            logger.exception("Import job %s failed", job_id)
+            db.rollback()
+            job.error = str(e)
+            _finish(jobs, job, "failed")
+            return
+
+        _finish(jobs, job, "completed")
+    finally:
+        db.close()
+        jobs.close()
+        os.remove(path)
+
+
+def _finish(jobs: Session, job: ImportJob, status: str):
+    job.status = status
+    job.finished_at = datetime.now(tz=timezone.utc)
+    jobs.commit()
@@ -0,0 +1,351 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import URL, Engine
+from starlette.routing import Match
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency buckets in seconds, as the Prometheus
+# clients use by default
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+# Route label of statements run outside a request, by background imports
+NO_ROUTE = "none"
+# Route label of requests matching no route, so bad paths add no labels
+UNMATCHED_ROUTE = "unmatched"
+# Longest part of a slow statement that is logged
+SLOW_QUERY_LOG_CHARS = 2000
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metric:
+    """
+    A metric with a value per combination of ``labels``, rendered in the
+    Prometheus text format.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in sorted(values):
+            lines.extend(self._samples(dict(zip(self.labels, key)), value))
+        return "\n".join(lines)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _samples(self, labels: Dict[str, str], value):
+        yield f"{self.name}{_labels(labels)} {_number(value)}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels=(),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # Count per bucket, then the sum of every value
+            counts = self._values.setdefault(
+                key, [0] * (len(self.buckets) + 1) + [0.0]
+            )
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def _samples(self, labels: Dict[str, str], value):
+        cumulative = 0
+        bounds = [*map(_number, self.buckets), "+Inf"]
+        for bound, count in zip(bounds, value):
+            cumulative += count
+            yield (
+                f"{self.name}_bucket{_labels({**labels, 'le': bound})} "
+                f"{cumulative}"
+            )
+        yield f"{self.name}_sum{_labels(labels)} {_number(value[-1])}"
+        yield f"{self.name}_count{_labels(labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self._add(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self._add(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self._add(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+registry = Registry()
+request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to respond to a request, until the response headers",
+    ["method", "route", "status"],
+)
+request_statements = registry.histogram(
+    "http_request_db_statements",
+    "SQL statements run by a request",
+    ["route"],
+    buckets=STATEMENT_BUCKETS,
+)
+db_statements = registry.counter(
+    "db_statements_total", "SQL statements run", ["route"]
+)
+db_seconds = registry.counter(
+    "db_statement_seconds_total",
+    "Time spent running SQL statements",
+    ["route"],
+)
+pool_checked_out = registry.gauge(
+    "db_pool_checked_out_connections",
+    "Connections checked out of the pool",
+    ["engine"],
+)
+pool_checkout = registry.histogram(
+    "db_pool_checkout_seconds",
+    "Time to check a connection out of the pool, waiting included",
+    ["engine"],
+)
+pool_connect = registry.histogram(
+    "db_pool_connect_seconds",
+    "Time to open a new database connection for the pool",
+    ["engine"],
+)
+imports = registry.counter(
+    "accident_imports_total", "Imports of CSV files", ["outcome"]
+)
+import_rows = registry.counter(
+    "accident_import_rows_total",
+    "Rows of imported CSV files",
+    ["result", "outcome"],
+)
+import_seconds = registry.counter(
+    "accident_import_seconds_total",
+    "Time spent importing CSV files",
+    ["outcome"],
+)
+
+
+class RequestStats:
+    """The database work of a request, for its metrics and headers."""
+
+    def __init__(self, route: str = NO_ROUTE):
+        self.route = route
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+# Shared with the tasks and threads the request runs in, which copy the
+# context but still update the same object
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def start_request(request: Request) -> RequestStats:
+    stats = RequestStats(route_label(request))
+    _request_stats.set(stats)
+    return stats
+
+
+def route_label(request: Request) -> str:
+    """The path template of the route the request is for."""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return UNMATCHED_ROUTE
+
+
+def finish_request(
+    stats: RequestStats, method: str, status: int, seconds: float
+):
+    request_duration.observe(
+        seconds, method=method, route=stats.route, status=status
+    )
+    request_statements.observe(stats.statements, route=stats.route)
+
+
+def server_timing(stats: RequestStats, seconds: float) -> str:
+    """A ``Server-Timing`` header value for the request."""
+    return (
+        f'db;dur={stats.db_seconds * 1000:.1f};'
+        f'desc="{stats.statements} statements", '
+        f"total;dur={seconds * 1000:.1f}"
+    )
+
+
+def record_import(results: dict, seconds: float, outcome: str):
+    """
+    Count an import and the rows of its summary, see ``process_csv_file``.
+    ``outcome`` is ``success``, or ``failure`` for an import that raised,
+    whose rows were loaded until then.
+    """
+    imports.inc(outcome=outcome)
+    for result in ("inserted", "updated", "skipped", "failed"):
+        import_rows.inc(results[result], result=result, outcome=outcome)
+    import_seconds.inc(seconds, outcome=outcome)
+
+
+def instrument_engine(engine: Engine, name: str):
+    """
+    Record the statements of a sync engine, or the ``sync_engine`` of an
+    async one, the connections checked out of its pool and the time it
+    takes to open new ones.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_statement(
+        connection, cursor, statement, parameters, context, executemany
+    ):
+        connection.info["statement_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish_statement(
+        connection, cursor, statement, parameters, context, executemany
+    ):
+        started = connection.info.pop("statement_started", None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        stats = _request_stats.get()
+        route = stats.route if stats else NO_ROUTE
+        if stats:
+            stats.statements += 1
+            stats.db_seconds += seconds
+        db_statements.inc(route=route)
+        db_seconds.inc(seconds, route=route)
+        slow = settings.slow_query_ms
+        if slow and seconds * 1000 >= slow:
+            logger.warning(
+                "Slow query on %s took %.1f ms: %s",
+                route,
+                seconds * 1000,
+                statement[:SLOW_QUERY_LOG_CHARS],
+            )
+
+    @event.listens_for(engine, "do_connect")
+    def _start_connect(dialect, connection_record, cargs, cparams):
+        connection_record.info["connect_started"] = time.perf_counter()
+
+    @event.listens_for(engine.pool, "connect")
+    def _finish_connect(dbapi_connection, connection_record):
+        started = connection_record.info.pop("connect_started", None)
+        if started is not None:
+            pool_connect.observe(time.perf_counter() - started, engine=name)
+
+    @event.listens_for(engine.pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_checked_out.inc(engine=name)
+
+    @event.listens_for(engine.pool, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        pool_checked_out.dec(engine=name)
+
+
+def timed_pool_class(url: URL, name: str) -> type:
+    """
+    The pool class an engine on ``url`` uses by default, recording how long
+    each checkout of engine ``name`` takes. Pass it as ``poolclass``.
+    """
+    pool_class = url.get_dialect().get_pool_class(url)
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return pool_class.connect(self)
+        finally:
+            pool_checkout.observe(time.perf_counter() - started, engine=name)
+
+    return type(
+        f"Timed{pool_class.__name__}", (pool_class,), {"connect": connect}
+    )
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{name}="{_escape(value)}"' for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value: str) -> str:
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,24 @@
+import base64
+import json
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    Opaque cursor for the page following the row with ``last_id``.
+    """
+    payload = json.dumps({"id": last_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    The id a cursor continues after, raises ``ValueError`` if malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if not isinstance(last_id, int):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return last_id
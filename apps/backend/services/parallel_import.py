@@ -0,0 +1,106 @@
+import io
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import pandas as pd
+from sqlalchemy.orm import Session
+from config import get_settings
+from services.upload import (
+    convert_chunk,
+    load_converted_chunks,
+    read_csv_header,
+)
+
+settings = get_settings()
+
+
+def split_line_ranges(
+    path: str, range_bytes: int
+) -> Iterator[Tuple[int, int]]:
+    """
+    Split the data rows of a CSV file into ``(start, end)`` byte ranges of
+    roughly ``range_bytes``, each ending on a line boundary. Quoted fields
+    containing line breaks are not supported.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        f.readline()
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + range_bytes, size))
+            f.readline()
+            end = f.tell()
+            yield start, end
+            start = end
+
+
+def convert_range(
+    path: str, columns: List[str], start: int, end: int
+) -> Tuple[int, pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    Parse and validate one byte range of a CSV file in a worker process.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    if not data.strip():
+        return 0, convert_chunk(pd.DataFrame(columns=columns))[0], []
+
+    df = pd.read_csv(
+        io.BytesIO(data),
+        names=columns,
+        header=None,
+        encoding="utf-8",
+        dtype=str,
+    )
+    return (len(df), *convert_chunk(df))
+
+
+def iter_converted_ranges(
+    path: str, workers: int
+) -> Iterator[Tuple[int, pd.DataFrame, List[Dict[str, Any]]]]:
+    """
+    Convert a CSV file on a process pool, yielding the results in file
+    order. At most two ranges per worker are in flight at once, so memory
+    stays bounded however large the file is.
+    """
+    with open(path, "rb") as f:
+        columns = read_csv_header(f)
+
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        # The API process runs threads, which forked children must not inherit
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    pending = deque()
+    try:
+        for start, end in split_line_ranges(path, settings.import_range_bytes):
+            future = pool.submit(convert_range, path, columns, start, end)
+            pending.append(future)
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def process_csv_file_parallel(
+    path: str,
+    db: Session,
+    workers: Optional[int] = None,
+    atomic: bool = False,
+    upsert: bool = True,
+    on_chunk: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Parse and validate the CSV file at ``path`` on ``workers`` processes
+    while this process alone writes the results to the database.
+    Returns the same summary as ``process_csv_file``.
+    """
+    workers = workers or settings.import_processes or os.cpu_count()
+    return load_converted_chunks(
+        iter_converted_ranges(path, workers), db, atomic, upsert, on_chunk
+    )
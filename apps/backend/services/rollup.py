@@ -0,0 +1,160 @@
+import pandas as pd
+from datetime import date
+from sqlalchemy import delete, func, insert, literal_column, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ColumnElement
+from typing import Dict, Iterable, Optional, Union
+from config import get_settings
+from models import Accident, AccidentDailyRollup
+
+settings = get_settings()
+
+# Accident columns the rollup is keyed by besides the date
+ROLLUP_DIMENSIONS = [
+    "accident_severity",
+    "road_type",
+    "weather_conditions",
+    "police_force",
+]
+# Rollup columns a day's rows add up to
+ROLLUP_MEASURES = [
+    "accident_count",
+    "casualties_sum",
+    "casualties_count",
+    "vehicles_sum",
+    "vehicles_count",
+]
+REFRESH_BATCH_SIZE = 500
+
+
+def rollup_enabled(*filters: Optional[str]) -> bool:
+    """
+    Whether analytics can be answered from the rollup: it must be enabled
+    and every column filtered or grouped by must be one it is keyed by.
+    """
+    if not settings.analytics_use_rollup:
+        return False
+    return all(
+        name is None or name == "date" or name in ROLLUP_DIMENSIONS
+        for name in filters
+    )
+
+
+def source_table(use_rollup: bool):
+    return AccidentDailyRollup if use_rollup else Accident
+
+
+def dimension(name: str, use_rollup: bool) -> ColumnElement:
+    return getattr(source_table(use_rollup), name)
+
+
+def measures(use_rollup: bool) -> Dict[str, ColumnElement]:
+    """
+    The aggregates analytics report, computed over either the accidents
+    or the rollup with the same result.
+    """
+    if not use_rollup:
+        return {
+            "count": func.count(Accident.id),
+            "average_casualties": func.avg(Accident.number_of_casualties),
+            "average_vehicles": func.avg(Accident.number_of_vehicles),
+            "total_casualties": func.sum(Accident.number_of_casualties),
+            "total_vehicles": func.sum(Accident.number_of_vehicles),
+        }
+
+    rollup = AccidentDailyRollup
+    return {
+        "count": func.sum(rollup.accident_count),
+        "average_casualties": func.sum(rollup.casualties_sum)
+        * 1.0
+        / func.nullif(func.sum(rollup.casualties_count), 0),
+        "average_vehicles": func.sum(rollup.vehicles_sum)
+        * 1.0
+        / func.nullif(func.sum(rollup.vehicles_count), 0),
+        "total_casualties": func.sum(rollup.casualties_sum),
+        "total_vehicles": func.sum(rollup.vehicles_sum),
+    }
+
+
+def refresh_rollup(db: Union[Session, Connection], dates: Iterable[date]):
+    """
+    Recompute the rollup rows of the given days from the accidents table.
+    Called in the same transaction as every write to accidents, with the
+    days of the rows written both before and after the change.
+    """
+    dates = sorted(set(dates))
+    for start in range(0, len(dates), REFRESH_BATCH_SIZE):
+        batch = dates[start:start + REFRESH_BATCH_SIZE]
+        db.execute(
+            delete(AccidentDailyRollup).where(
+                AccidentDailyRollup.date.in_(batch)
+            )
+        )
+        db.execute(_aggregate(Accident.date.in_(batch)))
+
+
+def merge_rollup(db: Session, df: pd.DataFrame):
+    """
+    Add accidents just inserted, as converted rows, to the rollup without
+    reading the accidents table back. Days of updated or deleted rows
+    need ``refresh_rollup`` instead, called after this.
+    """
+    if not len(df):
+        return
+
+    keys = ["date", *ROLLUP_DIMENSIONS]
+    aggregates = (
+        df.groupby(keys, dropna=False)
+        .agg(
+            accident_count=("date", "size"),
+            casualties_sum=("number_of_casualties", "sum"),
+            casualties_count=("number_of_casualties", "count"),
+            vehicles_sum=("number_of_vehicles", "sum"),
+            vehicles_count=("number_of_vehicles", "count"),
+        )
+        .astype("int64")
+        .reset_index()
+    )
+    records = aggregates.astype(object).where(aggregates.notna(), None)
+
+    table = AccidentDailyRollup.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        statement = postgresql_insert(table)
+    else:
+        statement = sqlite_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={
+            name: table.c[name] + statement.excluded[name]
+            for name in ROLLUP_MEASURES
+        },
+    )
+    db.execute(statement, records.to_dict("records"))
+
+
+def rebuild_rollup(db: Union[Session, Connection]):
+    db.execute(delete(AccidentDailyRollup))
+    db.execute(_aggregate())
+
+
+def _aggregate(*criteria):
+    # NULL cannot be part of the primary key, the rollup stores it as 0
+    keys = [Accident.date] + [
+        func.coalesce(getattr(Accident, name), literal_column("0"))
+        for name in ROLLUP_DIMENSIONS
+    ]
+    aggregates = select(
+        *keys,
+        func.count(Accident.id),
+        func.coalesce(func.sum(Accident.number_of_casualties), 0),
+        func.count(Accident.number_of_casualties),
+        func.coalesce(func.sum(Accident.number_of_vehicles), 0),
+        func.count(Accident.number_of_vehicles),
+    )
+    return insert(AccidentDailyRollup).from_select(
+        ["date", *ROLLUP_DIMENSIONS, *ROLLUP_MEASURES],
+        aggregates.where(*criteria).group_by(*keys),
+    )
@@ -0,0 +1,91 @@
+from typing import Any, Dict, List, Optional
+import pandas as pd
+from sqlalchemy import Float, Integer
+from config import get_settings
+from models import Accident
+
+settings = get_settings()
+
+HASH_COLUMNS = ["natural_key", "content_hash"]
+# Columns computed from the others, never uploaded nor hashed
+DERIVED_COLUMNS = HASH_COLUMNS + ["geohash"]
+SOURCE_COLUMNS = [
+    column.name
+    for column in Accident.__table__.columns
+    if not column.primary_key and column.name not in DERIVED_COLUMNS
+]
+NUMERIC_COLUMNS = [
+    column.name
+    for column in Accident.__table__.columns
+    if column.name in SOURCE_COLUMNS
+    and isinstance(column.type, (Integer, Float))
+]
+
+
+def whole_row_key() -> bool:
+    return settings.import_natural_key.strip() == "*"
+
+
+def natural_key_columns() -> List[str]:
+    if whole_row_key():
+        return SOURCE_COLUMNS
+    return [name.strip() for name in settings.import_natural_key.split(",")]
+
+
+def hash_rows(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+    """
+    Hash the given columns of every row to a signed 64-bit integer.
+    Values are hashed by their string form with NULL as an empty string
+    and whole numbers written without a fraction, so a row hashes the same
+    whether it came from a CSV chunk of any dtype, the API or the database.
+    """
+    canonical = pd.DataFrame(
+        {
+            name: canonical_strings(df[name], name in NUMERIC_COLUMNS)
+            for name in columns
+        },
+        index=df.index,
+    )
+    hashes = pd.util.hash_pandas_object(canonical, index=False)
+    return pd.Series(hashes.to_numpy().view("int64"), index=df.index)
+
+
+def canonical_strings(values: pd.Series, numeric: bool) -> pd.Series:
+    """The string form ``hash_rows`` hashes the values by."""
+    if not numeric:
+        values = values.astype(object)
+        return values.where(values.notna(), "").astype(str)
+    numbers = pd.to_numeric(values, errors="coerce").astype("float64")
+    strings = numbers.astype(str)
+    # Beyond 2**53 not every whole number is exactly a float
+    whole = (numbers % 1 == 0) & (numbers.abs() < 2**53)
+    strings[whole] = numbers[whole].astype("int64").astype(str)
+    return strings.where(numbers.notna(), "")
+
+
+def add_row_hashes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the hash columns. Accidents missing a part of their natural key
+    cannot be told apart by it, so their key is NULL and never matches,
+    unless the key is the whole row.
+    """
+    columns = natural_key_columns()
+    keys = hash_rows(df, columns).astype("Int64")
+    if not whole_row_key():
+        keys = keys.mask(df[columns].isna().any(axis=1))
+    return df.assign(
+        natural_key=keys,
+        content_hash=hash_rows(df, SOURCE_COLUMNS),
+    )
+
+
+def record_hashes(record: Dict[str, Any]) -> Dict[str, Optional[int]]:
+    """
+    Return the hash columns for a single accident given as a dict.
+    """
+    row = pd.DataFrame([{name: record.get(name) for name in SOURCE_COLUMNS}])
+    hashes = add_row_hashes(row)
+    return {
+        name: None if pd.isna(value) else int(value)
+        for name, value in hashes[HASH_COLUMNS].iloc[0].items()
+    }
@@ -0,0 +1,46 @@
+import json
+from datetime import date, time
+from decimal import Decimal
+from typing import Any, Dict, List, Sequence
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Encode ``value`` as compact UTF-8 JSON, with orjson when it is
+    installed. Dates and times are written in ISO format and Pydantic
+    models as FastAPI would.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(
+        value, default=_default, ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def rows_to_objects(rows: Sequence[Any]) -> List[Dict[str, Any]]:
+    """Result rows as one object per row."""
+    return [row._asdict() for row in rows]
+
+
+def rows_to_columns(
+    fields: Sequence[str], rows: Sequence[Any]
+) -> Dict[str, List[Any]]:
+    """Result rows as each field's array of values, named once."""
+    columns = zip(*rows) if rows else ([] for _ in fields)
+    return dict(zip(fields, map(list, columns)))
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True)
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
@@ -0,0 +1,428 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from contextvars import ContextVar
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import Integer, select
+from sqlalchemy.orm import Session
+from config import get_settings
+from database import SessionLocal
+from models import Accident
+from services.breakdown import BREAKDOWN_DIMENSIONS
+from services.cache import data_version
+from services.filters import EQUALITY_FILTERS, AccidentFilters
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Dictionary encoded, every column analytics can group or filter by
+CATEGORICAL_COLUMNS = sorted(set(BREAKDOWN_DIMENSIONS.values()))
+INTEGER_COLUMNS = [
+    column
+    for column in CATEGORICAL_COLUMNS
+    if isinstance(Accident.__table__.c[column].type, Integer)
+]
+SNAPSHOT_BATCH_SIZE = 50000
+# Changed rows are fetched by id in batches of this size
+CHANGED_BATCH_SIZE = 1000
+
+Summary = namedtuple(
+    "Summary",
+    [
+        "total_accidents",
+        "average_casualties",
+        "average_vehicles",
+        "total_casualties",
+        "total_vehicles",
+    ],
+)
+
+
+class Snapshot:
+    """
+    Read only columnar copy of the accidents analytics need, held as NumPy
+    arrays in id order. String and other categorical columns are stored as
+    integer codes into a list of their distinct values, -1 being NULL.
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, np.ndarray],
+        codes: Dict[str, np.ndarray],
+        categories: Dict[str, list],
+        version: int = 0,
+    ):
+        self.ids = columns["id"]
+        self.hashes = columns["content_hash"]
+        # Days since 1970-01-01
+        self.dates = columns["date"]
+        self.longitude = columns["longitude"]
+        self.latitude = columns["latitude"]
+        self.casualties = columns["number_of_casualties"]
+        self.vehicles = columns["number_of_vehicles"]
+        self.codes = codes
+        self.categories = categories
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [
+            self.ids,
+            self.hashes,
+            self.dates,
+            self.longitude,
+            self.latitude,
+            self.casualties,
+            self.vehicles,
+            *self.codes.values(),
+        ]
+        return sum(array.nbytes for array in arrays)
+
+    def mask(self, filters: AccidentFilters) -> np.ndarray:
+        keep = np.ones(len(self), dtype=bool)
+        if filters.start_date:
+            keep &= self.dates >= _day(filters.start_date)
+        if filters.end_date:
+            keep &= self.dates <= _day(filters.end_date)
+
+        for parameter, column in EQUALITY_FILTERS.items():
+            value = getattr(filters, parameter)
+            if value is not None:
+                keep &= self.codes[column] == self._code(column, value)
+
+        if filters.bounds:
+            west, south, east, north = filters.bounds
+            keep &= (self.longitude >= west) & (self.longitude <= east)
+            keep &= (self.latitude >= south) & (self.latitude <= north)
+        return keep
+
+    def summary(self, filters: AccidentFilters) -> Summary:
+        keep = self.mask(filters)
+        casualties = self.casualties[keep]
+        vehicles = self.vehicles[keep]
+        return Summary(
+            total_accidents=int(keep.sum()),
+            average_casualties=_mean(casualties),
+            average_vehicles=_mean(vehicles),
+            total_casualties=int(np.nansum(casualties)),
+            total_vehicles=int(np.nansum(vehicles)),
+        )
+
+    def breakdown(
+        self,
+        dimensions: List[str],
+        metrics: List[str],
+        filters: AccidentFilters,
+        limit: Optional[int] = None,
+    ) -> List[tuple]:
+        """
+        The rows services.breakdown.breakdown_statement returns, as
+        tuples of the dimension values then the metrics.
+        """
+        keep = self.mask(filters)
+        columns = [BREAKDOWN_DIMENSIONS[name] for name in dimensions]
+
+        # Combine the codes into one key per row, NULL taking the last code
+        sizes = [len(self.categories[column]) + 1 for column in columns]
+        keys = np.zeros(int(keep.sum()), dtype=np.int64)
+        for column, size in zip(columns, sizes):
+            codes = self.codes[column][keep]
+            keys = keys * size + np.where(codes < 0, size - 1, codes)
+        space = int(np.prod(sizes, dtype=np.int64))
+        if space <= max(len(keys), 1 << 16):
+            # Few possible keys, count each of them directly
+            inverse = keys
+            counts = np.bincount(keys, minlength=space)
+            groups = np.flatnonzero(counts)
+            counts = counts[groups]
+        else:
+            groups, inverse, counts = np.unique(
+                keys, return_inverse=True, return_counts=True
+            )
+
+        def total(weights: np.ndarray) -> np.ndarray:
+            sums = np.bincount(inverse, weights=weights, minlength=space)
+            return sums[groups] if inverse is keys else sums
+
+        values = {"count": counts}
+        if "percentage" in metrics:
+            values["percentage"] = counts * 100.0 / counts.sum()
+        if "row_percentage" in metrics:
+            first = groups // int(np.prod(sizes[1:], dtype=np.int64))
+            first_counts = np.bincount(first, weights=counts)
+            values["row_percentage"] = counts * 100.0 / first_counts[first]
+        for name, measure in [
+            ("casualties", self.casualties),
+            ("vehicles", self.vehicles),
+        ]:
+            measure = measure[keep]
+            known = ~np.isnan(measure)
+            totals = total(np.where(known, measure, 0))
+            known_counts = total(known)
+            values[f"total_{name}"] = totals.astype(np.int64)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values[f"average_{name}"] = np.where(
+                    known_counts > 0, totals / known_counts, np.nan
+                )
+
+        order = np.lexsort((groups, -counts))[:limit]
+        decoded = []
+        for column, size in reversed(list(zip(columns, sizes))):
+            codes = groups[order] % size
+            groups = groups // size
+            categories = self.categories[column] + [None]
+            decoded.insert(0, [categories[code] for code in codes])
+        measured = [
+            [_scalar(value) for value in values[name][order]]
+            for name in metrics
+        ]
+        return list(zip(*decoded, *measured))
+
+    def top_locations(
+        self, limit: int, filters: AccidentFilters
+    ) -> List[Tuple[float, float, int]]:
+        keep = self.mask(filters)
+        keep &= ~np.isnan(self.longitude) & ~np.isnan(self.latitude)
+        # As complex numbers the pairs sort and compare in one pass
+        locations, counts = np.unique(
+            self.longitude[keep] + 1j * self.latitude[keep],
+            return_counts=True,
+        )
+        order = np.argsort(-counts, kind="stable")[:limit]
+        return [
+            (float(location.real), float(location.imag), int(count))
+            for location, count in zip(locations[order], counts[order])
+        ]
+
+    def _code(self, column: str, value) -> int:
+        try:
+            return self.categories[column].index(value)
+        except ValueError:
+            # Matches no row
+            return -2
+
+
+_snapshot: Optional[Snapshot] = None
+_lock = threading.Lock()
+# The snapshot a request brought up to date off the event loop, which its
+# queries then use without checking the data version again
+_request_snapshot: ContextVar[Optional[Snapshot]] = ContextVar(
+    "request_snapshot", default=None
+)
+
+
+def current_snapshot() -> Optional[Snapshot]:
+    """
+    The analytics snapshot, or None when analytics run in SQL. It is
+    refreshed first when the accidents changed since it was taken, or
+    when it is older than ``snapshot_max_age_seconds`` in case they were
+    changed by another process.
+    """
+    global _snapshot
+    if settings.analytics_engine != "snapshot":
+        return None
+    if _request_snapshot.get() is not None:
+        return _request_snapshot.get()
+
+    snapshot = _snapshot
+    if snapshot is None or _stale(snapshot):
+        with _lock:
+            if _snapshot is None or _stale(_snapshot):
+                with SessionLocal() as db:
+                    _snapshot = refresh_snapshot(db, _snapshot)
+            snapshot = _snapshot
+    return snapshot
+
+
+def use_snapshot(snapshot: Optional[Snapshot]):
+    """Answer the rest of the current request from ``snapshot``."""
+    _request_snapshot.set(snapshot)
+
+
+def refresh_snapshot(
+    db: Session, snapshot: Optional[Snapshot] = None
+) -> Snapshot:
+    """
+    Bring the snapshot up to date, reading only the accidents added or
+    changed since it was taken, as told by their content hash. Without a
+    snapshot every accident is read.
+    """
+    version = data_version()
+    started = time.perf_counter()
+
+    current = pd.read_sql(
+        select(Accident.id, Accident.content_hash).order_by(Accident.id),
+        db.connection(),
+    )
+    ids = current["id"].to_numpy(dtype=np.int64)
+    hashes = current["content_hash"].fillna(0).to_numpy(dtype=np.int64)
+
+    if snapshot is None or not len(snapshot) or not len(ids):
+        kept = np.zeros(0, dtype=np.int64)
+        frames = list(_read_accidents(db))
+    else:
+        # Rows of the snapshot still present with the same content
+        position = np.searchsorted(ids, snapshot.ids)
+        position[position >= len(ids)] = 0
+        unchanged = (ids[position] == snapshot.ids) & (
+            hashes[position] == snapshot.hashes
+        )
+        kept = np.flatnonzero(unchanged)
+        missing = ~np.isin(ids, snapshot.ids[kept], assume_unique=True)
+        changed = ids[missing & (ids <= snapshot.ids.max())]
+        frames = list(
+            _read_accidents(db, Accident.id > int(snapshot.ids.max()))
+        )
+        for start in range(0, len(changed), CHANGED_BATCH_SIZE):
+            batch = changed[start:start + CHANGED_BATCH_SIZE].tolist()
+            frames.extend(_read_accidents(db, Accident.id.in_(batch)))
+
+    snapshot = _merge(snapshot, kept, frames, version)
+    logger.info(
+        "Analytics snapshot of %s accidents refreshed in %.2fs, %s bytes "
+        "(%s per million rows)",
+        len(snapshot),
+        time.perf_counter() - started,
+        snapshot.nbytes,
+        bytes_per_million_rows(snapshot),
+    )
+    return snapshot
+
+
+def bytes_per_million_rows(snapshot: Snapshot) -> int:
+    return snapshot.nbytes * 1000000 // max(len(snapshot), 1)
+
+
+def _stale(snapshot: Snapshot) -> bool:
+    age = time.monotonic() - snapshot.loaded_at
+    return (
+        snapshot.version != data_version()
+        or age > settings.snapshot_max_age_seconds
+    )
+
+
+def _read_accidents(db: Session, *criteria):
+    statement = select(
+        Accident.id,
+        Accident.content_hash,
+        Accident.date,
+        Accident.longitude,
+        Accident.latitude,
+        Accident.number_of_casualties,
+        Accident.number_of_vehicles,
+        *(getattr(Accident, column) for column in CATEGORICAL_COLUMNS),
+    ).where(*criteria)
+    yield from pd.read_sql(
+        statement, db.connection(), chunksize=SNAPSHOT_BATCH_SIZE
+    )
+
+
+def _merge(
+    snapshot: Optional[Snapshot],
+    kept: np.ndarray,
+    frames: List[pd.DataFrame],
+    version: int,
+) -> Snapshot:
+    """
+    The kept rows of the snapshot followed by the rows read, in id order.
+    Codes stay valid as values unseen so far are appended to the
+    categories.
+    """
+    columns = {
+        "id": [np.zeros(0, dtype=np.int64)],
+        "content_hash": [np.zeros(0, dtype=np.int64)],
+        "date": [np.zeros(0, dtype=np.int32)],
+        "longitude": [np.zeros(0)],
+        "latitude": [np.zeros(0)],
+        "number_of_casualties": [np.zeros(0, dtype=np.float32)],
+        "number_of_vehicles": [np.zeros(0, dtype=np.float32)],
+    }
+    codes = {column: [] for column in CATEGORICAL_COLUMNS}
+    categories = {column: [] for column in CATEGORICAL_COLUMNS}
+    if snapshot is not None:
+        columns["id"].append(snapshot.ids[kept])
+        columns["content_hash"].append(snapshot.hashes[kept])
+        columns["date"].append(snapshot.dates[kept])
+        columns["longitude"].append(snapshot.longitude[kept])
+        columns["latitude"].append(snapshot.latitude[kept])
+        columns["number_of_casualties"].append(snapshot.casualties[kept])
+        columns["number_of_vehicles"].append(snapshot.vehicles[kept])
+        for column in CATEGORICAL_COLUMNS:
+            codes[column].append(snapshot.codes[column][kept])
+            categories[column] = list(snapshot.categories[column])
+
+    for frame in frames:
+        columns["id"].append(frame["id"].to_numpy(dtype=np.int64))
+        columns["content_hash"].append(
+            frame["content_hash"].fillna(0).to_numpy(dtype=np.int64)
+        )
+        columns["date"].append(
+            pd.to_datetime(frame["date"])
+            .to_numpy(dtype="datetime64[D]")
+            .astype(np.int32)
+        )
+        for name in ["longitude", "latitude"]:
+            columns[name].append(frame[name].to_numpy(dtype=float))
+        for name in ["number_of_casualties", "number_of_vehicles"]:
+            columns[name].append(
+                pd.to_numeric(frame[name]).to_numpy(dtype=np.float32)
+            )
+        for column in CATEGORICAL_COLUMNS:
+            values = frame[column]
+            if column in INTEGER_COLUMNS:
+                # Read as floats when the column has NULLs
+                values = pd.to_numeric(values).astype("Int64")
+            values = values.astype(object)
+            values = values.where(values.notna(), None)
+            known = pd.Index(categories[column], dtype=object)
+            unseen = pd.unique(values[~values.isin(known) & values.notna()])
+            categories[column].extend(unseen.tolist())
+            index = pd.Index(categories[column], dtype=object)
+            codes[column].append(index.get_indexer(values))
+
+    merged = {name: np.concatenate(arrays) for name, arrays in columns.items()}
+    order = np.argsort(merged["id"], kind="stable")
+    merged = {name: array[order] for name, array in merged.items()}
+    return Snapshot(
+        merged,
+        {
+            column: np.concatenate(
+                [np.zeros(0, dtype=np.int64), *arrays]
+            )[order].astype(_code_type(len(categories[column])))
+            for column, arrays in codes.items()
+        },
+        categories,
+        version,
+    )
+
+
+def _code_type(count: int):
+    for code_type in [np.int8, np.int16, np.int32]:
+        if count < np.iinfo(code_type).max:
+            return code_type
+    return np.int64
+
+
+def _day(value: date) -> int:
+    return int(np.datetime64(value, "D").astype(np.int64))
+
+
+def _mean(values: np.ndarray) -> Optional[float]:
+    known = values[~np.isnan(values)]
+    return float(known.astype(float).mean()) if len(known) else None
+
+
+def _scalar(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    return value
@@ -0,0 +1,49 @@
+import math
+from sqlalchemy.orm import Query
+from models import Accident
+
+EARTH_RADIUS_METRES = 6371008.8
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS_METRES / 180
+
+
+def within_planar_radius(
+    query: Query, easting: float, northing: float, radius: float
+) -> Query:
+    """
+    Accidents within ``radius`` metres of a British National Grid point.
+    The square around the circle is matched on the easting and northing
+    indexes, the exact distance is only checked for the rows inside it.
+    """
+    dx = Accident.location_easting - easting
+    dy = Accident.location_northing - northing
+    return query.filter(
+        Accident.location_easting.between(easting - radius, easting + radius),
+        Accident.location_northing.between(
+            northing - radius, northing + radius
+        ),
+        dx * dx + dy * dy <= radius * radius,
+    )
+
+
+def within_radius(
+    query: Query, latitude: float, longitude: float, radius: float
+) -> Query:
+    """
+    Accidents within ``radius`` metres of a point given in degrees, using
+    the equirectangular approximation, accurate to well under a percent
+    at the distances a map shows. Like ``within_planar_radius`` the
+    surrounding box is matched on the latitude and longitude indexes.
+    """
+    scale = math.cos(math.radians(latitude))
+    lat_span = radius / METRES_PER_DEGREE
+    lon_span = min(radius / (METRES_PER_DEGREE * max(scale, 1e-6)), 180)
+
+    dx = (Accident.longitude - longitude) * (scale * METRES_PER_DEGREE)
+    dy = (Accident.latitude - latitude) * METRES_PER_DEGREE
+    return query.filter(
+        Accident.latitude.between(latitude - lat_span, latitude + lat_span),
+        Accident.longitude.between(
+            longitude - lon_span, longitude + lon_span
+        ),
+        dx * dx + dy * dy <= radius * radius,
+    )
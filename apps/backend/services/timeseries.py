@@ -0,0 +1,36 @@
+from sqlalchemy import Date, Integer, cast, extract, func
+from sqlalchemy.sql import ColumnElement
+
+# Intervals that only need the date, and can be answered by the rollup
+DATE_INTERVALS = ["day_of_week", "day", "week", "month", "year"]
+INTERVALS = ["hour"] + DATE_INTERVALS
+
+
+def bucket_expression(interval: str, table, dialect: str) -> ColumnElement:
+    """
+    The bucket of every row of ``table`` for the interval: the hour of day
+    (0-23), the STATS19 day of week (1 is Sunday) or the first day of the
+    day, week (starting Monday), month or year.
+    """
+    if dialect == "postgresql":
+        if interval == "hour":
+            return cast(extract("hour", table.time), Integer)
+        if interval == "day_of_week":
+            return cast(extract("dow", table.date), Integer) + 1
+        if interval == "day":
+            return table.date
+        return cast(func.date_trunc(interval, table.date), Date)
+
+    # SQLite date functions, on the ISO strings it stores
+    if interval == "hour":
+        return cast(func.strftime("%H", table.time), Integer)
+    if interval == "day_of_week":
+        return cast(func.strftime("%w", table.date), Integer) + 1
+    if interval == "day":
+        return table.date
+    modifiers = {
+        "week": ("weekday 0", "-6 days"),
+        "month": ("start of month",),
+        "year": ("start of year",),
+    }
+    return func.date(table.date, *modifiers[interval])
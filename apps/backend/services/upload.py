@@ -1,62 +1,245 @@
+import time
+from sqlalchemy import Float, Integer
 from sqlalchemy.orm import Session
 import pandas as pd
 from models import Accident
-from typing import Dict, Any
+from typing import (
+    Dict,
+    Any,
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from config import get_settings
+from services.bulk_load import BulkLoader
+from services.metrics import record_import
+from services.row_hashes import DERIVED_COLUMNS
 
+settings = get_settings()
 
-def process_csv_file(df: pd.DataFrame, db: Session) -> Dict[str, Any]:
+ACCIDENT_COLUMNS = [
+    column
+    for column in Accident.__table__.columns
+    if not column.primary_key and column.name not in DERIVED_COLUMNS
+]
+INTEGER_COLUMNS = [
+    column.name
+    for column in ACCIDENT_COLUMNS
+    if isinstance(column.type, Integer)
+]
+FLOAT_COLUMNS = [
+    column.name
+    for column in ACCIDENT_COLUMNS
+    if isinstance(column.type, Float)
+]
+REQUIRED_COLUMNS = ["date", "accident_severity"]
+# Error detail for files the CSV reader cannot decode
+NOT_UTF8 = "CSV file must be UTF-8 encoded"
+
+# Column names used by older exports, mapped onto the model columns
+COLUMN_ALIASES = {
+    "severity": "accident_severity",
+    "weather": "weather_conditions",
+    "casualties": "number_of_casualties",
+    "vehicles_involved": "number_of_vehicles",
+}
+
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y"]
+TIME_FORMATS = ["%H:%M", "%H:%M:%S"]
+
+
+def iter_csv_chunks(
+    source: Union[str, BinaryIO],
+    chunksize: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Read a CSV file or binary file object incrementally.
+    Only one chunk of ``chunksize`` rows is held in memory at a time.
+    """
+    reader = pd.read_csv(
+        source,
+        chunksize=chunksize or settings.upload_chunk_size,
+        encoding="utf-8",
+        dtype=str,
+    )
+    with reader:
+        yield from reader
+
+
+def read_csv_header(source: BinaryIO) -> list:
+    """
+    Return the column names of a CSV file object and rewind it.
+    """
+    columns = list(pd.read_csv(source, nrows=0, encoding="utf-8").columns)
+    source.seek(0)
+    return columns
+
+
+def normalize_columns(columns: Iterable[str]) -> List[str]:
+    names = [column.strip().lower() for column in columns]
+    return [COLUMN_ALIASES.get(name, name) for name in names]
+
+
+def _parse_formats(values: pd.Series, formats: List[str]) -> pd.Series:
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for fmt in formats:
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(
+            values[missing], format=fmt, errors="coerce"
+        )
+    return parsed
+
+
+def convert_chunk(
+    df: pd.DataFrame, offset: int = 0
+) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    Map, coerce and validate a chunk of raw CSV rows column by column.
+    Returns a frame with one column per ``Accident`` field holding only the
+    valid rows, and an error entry for every rejected row. ``offset`` is the
+    number of data rows preceding the chunk and is used for row numbers.
     """
-    Process the CSV file and insert records into the database.
+    df = df.set_axis(normalize_columns(df.columns), axis=1)
+    df = df.loc[:, ~df.columns.duplicated()]
+    raw = df.apply(lambda values: values.str.strip()).replace("", None)
+
+    converted = pd.DataFrame(index=raw.index)
+    problems = pd.Series("", index=raw.index)
+
+    def reject(mask: pd.Series, message: str):
+        problems[mask] = problems[mask] + message + "; "
+
+    for column in ACCIDENT_COLUMNS:
+        name = column.name
+        if name not in raw.columns:
+            converted[name] = None
+            continue
+
+        values = raw[name]
+        present = values.notna()
+        if name in INTEGER_COLUMNS or name in FLOAT_COLUMNS:
+            numbers = pd.to_numeric(values, errors="coerce")
+            reject(present & numbers.isna(), f"invalid number in {name}")
+            if name in INTEGER_COLUMNS:
+                fractional = numbers.notna() & (numbers % 1 != 0)
+                reject(fractional, f"invalid integer in {name}")
+                numbers = numbers.where(~fractional).astype("Int64")
+            else:
+                # Whole numbers alone would parse as int64
+                numbers = numbers.astype("float64")
+            converted[name] = numbers
+        elif name == "date":
+            dates = _parse_formats(values, DATE_FORMATS)
+            reject(present & dates.isna(), "invalid date")
+            converted[name] = dates.dt.date
+        elif name == "time":
+            times = _parse_formats(values, TIME_FORMATS)
+            reject(present & times.isna(), "invalid time")
+            converted[name] = times.dt.time
+        else:
+            converted[name] = values
+
+    for name in REQUIRED_COLUMNS:
+        if name in raw.columns:
+            reject(raw[name].isna(), f"missing {name}")
+
+    # Derive the calendar fields STATS19 exports carry when they are absent
+    dates = pd.to_datetime(converted["date"])
+    converted["year"] = (
+        converted["year"].astype("Int64").fillna(dates.dt.year.astype("Int64"))
+    )
+    converted["day_of_week"] = (
+        converted["day_of_week"]
+        .astype("Int64")
+        .fillna(((dates.dt.dayofweek + 1) % 7 + 1).astype("Int64"))
+    )
+
+    failed = problems != ""
+    errors = [
+        {"row": offset + int(position) + 1, "error": message.rstrip("; ")}
+        for position, message in zip(
+            failed.to_numpy().nonzero()[0], problems[failed]
+        )
+    ]
+    return converted[~failed], errors
+
+
+def process_csv_file(
+    chunks: Iterable[pd.DataFrame],
+    db: Session,
+    atomic: bool = False,
+    upsert: bool = True,
+    on_chunk: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Process the CSV file chunk by chunk and insert records into the database.
+    Returns a summary of the operation, see ``load_converted_chunks``.
+    """
+    converted = ((len(df), *convert_chunk(df)) for df in chunks)
+    return load_converted_chunks(converted, db, atomic, upsert, on_chunk)
+
+
+def load_converted_chunks(
+    chunks: Iterable[Tuple[int, pd.DataFrame, List[Dict[str, Any]]]],
+    db: Session,
+    atomic: bool = False,
+    upsert: bool = True,
+    on_chunk: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Insert ``(row_count, valid_rows, errors)`` chunks as produced by
+    ``convert_chunk``, in file order, with error row numbers relative to
+    the start of their chunk.
+    With ``atomic`` nothing is committed unless every chunk was loaded.
+    With ``upsert`` rows already imported are updated or skipped instead of
+    duplicated, see ``BulkLoader``.
+    ``on_chunk`` is called with the running summary after every chunk and
+    may raise to abort the import. Only the first ``upload_max_errors``
+    row errors are kept.
     Returns a summary of the operation.
     """
     results = {
-        "total_rows": len(df),
+        "total_rows": 0,
         "successful": 0,
         "failed": 0,
+        "inserted": 0,
+        "updated": 0,
+        "skipped": 0,
         "errors": [],
     }
+    loader = BulkLoader(db, atomic=atomic, upsert=upsert)
+    started = time.perf_counter()
+    outcome = "failure"
+
+    try:
+        for row_count, valid, errors in chunks:
+            offset = results["total_rows"]
+            results["total_rows"] += row_count
+
+            results["failed"] += len(errors)
+            room = settings.upload_max_errors - len(results["errors"])
+            results["errors"].extend(
+                {**error, "row": offset + error["row"]}
+                for error in errors[: max(room, 0)]
+            )
+            loader.load(valid)
+            results["successful"] = loader.rows_loaded
+            results["inserted"] = loader.inserted
+            results["updated"] = loader.updated
+            results["skipped"] = loader.skipped
 
-    # Process in batches of 1000
-    batch_size = 1000
-    for i in range(0, len(df), batch_size):
-        batch = df.iloc[i:i + batch_size]
-        accidents_to_create = []
-
-        for _, row in batch.iterrows():
-            try:
-                # Convert row to dictionary and create accident record
-                accident_data = {
-                    "date": pd.to_datetime(row["date"]).isoformat(),
-                    "location": {
-                        "latitude": float(row["latitude"]),
-                        "longitude": float(row["longitude"]),
-                        "address": str(row["address"]),
-                    },
-                    "severity": str(row["severity"]),
-                    "road_type": str(row["road_type"]),
-                    "weather": str(row["weather"]),
-                    "description": str(row["description"]),
-                    "casualties": int(row["casualties"]),
-                    "vehicles_involved": int(row["vehicles_involved"]),
-                }
-
-                # Validate the data
-                accident = Accident(**accident_data)
-                accidents_to_create.append(accident)
-                results["successful"] += 1
-
-            except Exception as e:
-                results["failed"] += 1
-                results["errors"].append(
-                    {"row": i + len(accidents_to_create) + 1, "error": str(e)}
-                )
-
-        # Bulk insert the valid records
-        if accidents_to_create:
-            db_accidents = [
-                Accident(**accident.dict()) for accident in accidents_to_create
-            ]
-            db.bulk_save_objects(db_accidents)
-            db.commit()
+            if on_chunk:
+                on_chunk(results)
 
+        results["successful"] = loader.finish()
+        outcome = "success"
+    finally:
+        record_import(results, time.perf_counter() - started, outcome)
     return results
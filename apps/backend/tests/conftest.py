@@ -0,0 +1,67 @@
+import os
+import tempfile
+
+# The app reads its settings when first imported, so the test database is
+# chosen before anything else. TEST_DATABASE_URL runs the suite against
+# PostgreSQL, whose tables it empties.
+_workdir = tempfile.mkdtemp(prefix="accident-analyser-tests-")
+os.environ["DATABASE_URL"] = os.environ.get(
+    "TEST_DATABASE_URL", f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+)
+os.environ["DATABASE_REPLICA_URL"] = ""
+os.environ["CACHE_BACKEND"] = "memory"
+for name, value in {
+    "DATABASE_HOST": "localhost",
+    "DATABASE_PORT": "5432",
+    "DATABASE_USER": "test",
+    "DATABASE_PASSWORD": "test",
+    "DATABASE_NAME": "test",
+}.items():
+    os.environ.setdefault(name, value)
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.generate import write_csv  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from models import (  # noqa: E402
+    Accident,
+    AccidentDailyRollup,
+    ImportJob,
+    User,
+)
+from services.cache import bump_data_version  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def db():
+    with SessionLocal() as db:
+        yield db
+
+
+@pytest.fixture(autouse=True)
+def empty_database():
+    with SessionLocal() as db:
+        for model in (Accident, AccidentDailyRollup, ImportJob, User):
+            db.execute(delete(model))
+        db.commit()
+    bump_data_version()
+    yield
+
+
+@pytest.fixture
+def accidents_csv(tmp_path):
+    """Write ``rows`` synthetic accidents to a CSV file and return its path."""
+
+    def write(rows: int = 100, seed: int = 0) -> str:
+        return write_csv(str(tmp_path / f"accidents-{seed}.csv"), rows, seed)
+
+    return write
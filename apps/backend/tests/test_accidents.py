@@ -0,0 +1,116 @@
+import json
+from datetime import date, time
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+from models import Accident
+from services import serialization
+from services.upload import iter_csv_chunks, process_csv_file
+
+ACCIDENTS = "/api/v1/accidents/"
+
+
+@pytest.fixture
+def accidents(db, accidents_csv):
+    process_csv_file(iter_csv_chunks(accidents_csv(300, seed=5)), db)
+
+
+def pages(client, url: str, **params) -> list:
+    """Every page of a listing, following the cursors."""
+    results = []
+    while True:
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        results.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return results
+        params = {**params, "cursor": cursor}
+
+
+def test_cursors_walk_the_filtered_accidents_in_id_order(
+    client, db, accidents
+):
+    expected = db.scalars(
+        select(Accident.id)
+        .where(Accident.accident_severity == "Slight")
+        .order_by(Accident.id)
+    ).all()
+
+    listed = pages(client, ACCIDENTS, severity="Slight", limit=40)
+
+    assert [len(page) for page in listed[:-1]] == [40] * (len(listed) - 1)
+    assert [item["id"] for page in listed for item in page] == expected
+    assert all(
+        item["accident_severity"] == "Slight"
+        for page in listed
+        for item in page
+    )
+
+
+def test_cursors_are_not_shifted_by_deletes(client, db, accidents):
+    first = client.get(ACCIDENTS, params={"limit": 10})
+    ids = [item["id"] for item in first.json()]
+    client.delete(f"{ACCIDENTS}{ids[0]}")
+
+    second = client.get(
+        ACCIDENTS,
+        params={"limit": 10, "cursor": first.headers["X-Next-Cursor"]},
+    )
+
+    # An offset skips the accident that followed the first page instead
+    skipped = client.get(ACCIDENTS, params={"skip": 10, "limit": 1})
+    assert second.json()[0]["id"] > ids[-1]
+    assert skipped.json()[0]["id"] == second.json()[1]["id"]
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "eyJpZCI6ICIxIn0"])
+def test_malformed_cursors_are_rejected(client, cursor):
+    response = client.get(ACCIDENTS, params={"cursor": cursor})
+
+    assert response.status_code == 400
+
+
+def test_fast_formats_hold_the_default_list(client, accidents):
+    params = {"severity": "Slight", "limit": 50}
+    default = client.get(ACCIDENTS, params=params)
+
+    fast = client.get(ACCIDENTS, params={**params, "format": "fast"})
+    columnar = client.get(ACCIDENTS, params={**params, "format": "columnar"})
+
+    assert fast.json() == default.json()
+    columns = columnar.json()
+    assert [
+        dict(zip(columns, values)) for values in zip(*columns.values())
+    ] == default.json()
+    for response in (fast, columnar):
+        assert response.headers["X-Next-Cursor"] == (
+            default.headers["X-Next-Cursor"]
+        )
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_json_is_encoded_alike_with_or_without_orjson(
+    monkeypatch, use_orjson
+):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(serialization, "orjson", None)
+    value = {
+        "date": date(2020, 1, 5),
+        "time": time(16, 45),
+        "share": Decimal("12.5"),
+        "name": "Café",
+    }
+
+    encoded = serialization.dumps(value)
+
+    assert json.loads(encoded) == {
+        "date": "2020-01-05",
+        "time": "16:45:00",
+        "share": 12.5,
+        "name": "Café",
+    }
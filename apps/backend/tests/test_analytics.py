@@ -0,0 +1,313 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+from models import Accident, AccidentDailyRollup
+from routers.analytics import (
+    breakdown_rows,
+    query_by_severity,
+    query_dashboard,
+    query_summary,
+)
+from services import rollup, snapshot
+from services.breakdown import BREAKDOWN_DIMENSIONS
+from services.filters import AccidentFilters
+from services.rollup import rebuild_rollup
+from services.timeseries import INTERVALS
+from services.upload import iter_csv_chunks, process_csv_file
+
+ANALYTICS = "/api/v1/analytics"
+DATES = {"start_date": "2016-01-01", "end_date": "2018-06-30"}
+
+
+@pytest.fixture
+def accidents(db, accidents_csv):
+    process_csv_file(iter_csv_chunks(accidents_csv(600, seed=3)), db)
+
+
+def get(client, path: str, **params):
+    response = client.get(f"{ANALYTICS}{path}", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+def counts(items, name: str) -> dict:
+    return {item[name]: item["count"] for item in items}
+
+
+def unordered(items) -> list:
+    # Rows with the same count may come in any order
+    return sorted(items, key=lambda item: sorted(item.items()))
+
+
+def test_dashboard_matches_the_separate_endpoints(client, accidents):
+    dashboard = get(client, "/dashboard", limit=1000, **DATES)
+
+    assert dashboard["summary"] == pytest.approx(
+        get(client, "/summary", **DATES)
+    )
+    assert counts(dashboard["by_severity"], "severity") == counts(
+        get(client, "/by-severity", **DATES), "severity"
+    )
+    assert counts(dashboard["by_road_type"], "road_type") == counts(
+        get(client, "/by-road-type", **DATES), "road_type"
+    )
+    assert unordered(dashboard["by_weather"]) == unordered(
+        get(client, "/by-weather", **DATES)
+    )
+    assert unordered(dashboard["top_locations"]) == unordered(
+        get(client, "/top-locations", limit=1000, **DATES)
+    )
+    assert 0 < dashboard["summary"]["total_accidents"] < 600
+
+
+def rollup_rows(db) -> list:
+    rows = db.execute(select(*AccidentDailyRollup.__table__.columns))
+    return sorted(map(tuple, rows), key=str)
+
+
+def test_writes_keep_the_rollup_equal_to_a_rebuild(client, db, accidents):
+    ids = db.scalars(select(Accident.id).order_by(Accident.id)).all()
+    responses = [
+        client.patch(
+            "/api/v1/accidents/batch",
+            json=[
+                {
+                    "id": ids[0],
+                    "date": "2021-02-03",
+                    "number_of_casualties": 9,
+                },
+                {"id": ids[1], "accident_severity": "Fatal"},
+            ],
+        ),
+        client.delete(f"/api/v1/accidents/{ids[2]}"),
+        client.request("DELETE", "/api/v1/accidents/batch", json=ids[3:10]),
+        client.delete("/api/v1/accidents/", params={"severity": "Serious"}),
+    ]
+    assert all(response.status_code == 200 for response in responses)
+
+    maintained = rollup_rows(db)
+    rebuild_rollup(db)
+    db.commit()
+
+    assert maintained == rollup_rows(db)
+
+
+def test_rollup_answers_like_the_accidents(monkeypatch, db, accidents):
+    dates = [date(2016, 1, 1), date(2018, 6, 30)]
+    from_rollup = query_summary(db, *dates)
+    monkeypatch.setattr(rollup.settings, "analytics_use_rollup", False)
+
+    assert from_rollup == query_summary(db, *dates)
+
+
+def bucket(interval: str, day: date, at) -> object:
+    if interval == "hour":
+        return at.hour
+    if interval == "day_of_week":
+        return (day.weekday() + 1) % 7 + 1
+    if interval == "week":
+        return (day - timedelta(days=day.weekday())).isoformat()
+    if interval == "month":
+        return day.replace(day=1).isoformat()
+    if interval == "year":
+        return day.replace(month=1, day=1).isoformat()
+    return day.isoformat()
+
+
+@pytest.mark.parametrize("interval", INTERVALS)
+def test_timeseries_buckets_every_accident(client, db, accidents, interval):
+    rows = db.execute(
+        select(
+            Accident.date,
+            Accident.time,
+            Accident.number_of_casualties,
+            Accident.accident_severity,
+        )
+    ).all()
+    expected = defaultdict(lambda: [0, 0])
+    for day, at, casualties, severity in rows:
+        if severity == "Fatal":
+            point = expected[bucket(interval, day, at)]
+            point[0] += 1
+            point[1] += casualties or 0
+
+    points = get(client, "/timeseries", interval=interval, severity="Fatal")
+
+    assert {
+        point["bucket"]: [point["count"], point["total_casualties"]]
+        for point in points
+    } == expected
+    buckets = [point["bucket"] for point in points]
+    assert buckets == sorted(buckets)
+
+
+def test_timeseries_split_by_a_dimension(client, accidents):
+    total = get(client, "/timeseries", interval="year")
+    split = get(client, "/timeseries", interval="year", split_by="severity")
+
+    by_year = defaultdict(int)
+    for point in split:
+        by_year[point["bucket"]] += point["count"]
+    assert {point["group"] for point in split} == {
+        "Slight",
+        "Serious",
+        "Fatal",
+    }
+    assert by_year == {point["bucket"]: point["count"] for point in total}
+
+
+@pytest.mark.parametrize(
+    "dims",
+    [
+        # Answered by the rollup, then only by the accidents
+        ["severity", "road_type"],
+        ["accident_severity", "light_conditions", "speed_limit"],
+    ],
+)
+def test_breakdown_matches_a_group_by(client, db, accidents, dims):
+    columns = [BREAKDOWN_DIMENSIONS[name] for name in dims]
+    df = pd.DataFrame(
+        db.execute(
+            select(
+                *(getattr(Accident, column) for column in columns),
+                Accident.number_of_casualties,
+                Accident.number_of_vehicles,
+            )
+        ).all()
+    ).fillna({column: "-" for column in columns})
+    groups = df.groupby(columns)
+    expected = pd.DataFrame(
+        {
+            "count": groups.size(),
+            "total_casualties": groups["number_of_casualties"].sum(),
+            "average_vehicles": groups["number_of_vehicles"].mean(),
+        }
+    )
+    expected["percentage"] = expected["count"] * 100 / len(df)
+    expected["row_percentage"] = (
+        expected["count"]
+        * 100
+        / expected.groupby(level=0)["count"].transform("sum")
+    )
+
+    rows = get(
+        client,
+        "/breakdown",
+        dims=",".join(dims),
+        metrics="count,percentage,row_percentage,total_casualties,"
+        "average_vehicles",
+    )
+
+    assert len(rows) == len(expected)
+    for row in rows:
+        key = tuple(
+            "-" if value is None else value
+            for value in row["dimensions"].values()
+        )
+        assert row["metrics"] == pytest.approx(
+            expected.loc[key if len(key) > 1 else key[0]].to_dict()
+        )
+    counts = [row["metrics"]["count"] for row in rows]
+    assert counts == sorted(counts, reverse=True)
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"dims": "colour"},
+        {"dims": "severity,severity"},
+        {"dims": "severity,road_type,weather,police_force"},
+        {"dims": "severity", "metrics": "median"},
+    ],
+)
+def test_invalid_breakdowns_are_rejected(client, params):
+    response = client.get(f"{ANALYTICS}/breakdown", params=params)
+
+    assert response.status_code == 400
+
+
+
+def answers(db) -> list:
+    """Analytics computed by the engine in use, as comparable values."""
+    filters = AccidentFilters(severity="Slight", start_date=date(2016, 1, 1))
+    severities = query_by_severity(db, None, None)
+    breakdown = breakdown_rows(
+        db, ["road_type", "year"], ["count", "total_casualties"], filters
+    )
+    return [
+        query_summary(db, date(2016, 1, 1), None).model_dump(),
+        *sorted(
+            (item.model_dump() for item in severities),
+            key=lambda item: item["severity"],
+        ),
+        *sorted(map(tuple, breakdown), key=str),
+    ]
+
+
+def test_snapshot_answers_like_sql(monkeypatch, client, db, accidents):
+    from_sql = answers(db)
+    monkeypatch.setattr(snapshot, "_snapshot", None)
+    monkeypatch.setattr(snapshot.settings, "analytics_engine", "snapshot")
+
+    from_snapshot = answers(db)
+
+    assert len(from_snapshot) == len(from_sql)
+    for item, expected in zip(from_snapshot, from_sql):
+        assert item == pytest.approx(expected)
+
+
+def dashboard_breakdowns(db) -> list:
+    dashboard = query_dashboard(db, 5, None, None)
+    return [
+        [(item.count, getattr(item, field)) for item in items]
+        for items, field in [
+            (dashboard.by_severity, "severity"),
+            (dashboard.by_road_type, "road_type"),
+            (dashboard.by_weather, "weather_condition"),
+        ]
+    ]
+
+
+def test_dashboard_breakdowns_are_ordered_by_count(monkeypatch, db, accidents):
+    from_sql = dashboard_breakdowns(db)
+    monkeypatch.setattr(snapshot, "_snapshot", None)
+    monkeypatch.setattr(snapshot.settings, "analytics_engine", "snapshot")
+
+    from_snapshot = dashboard_breakdowns(db)
+
+    assert from_snapshot == from_sql
+    for items in from_sql:
+        assert items == sorted(
+            items, key=lambda item: (-item[0], item[1] is None, item[1])
+        )
+
+
+def test_snapshot_refreshes_only_changed_accidents(client, db, accidents):
+    ids = db.scalars(select(Accident.id).order_by(Accident.id)).all()
+    taken = snapshot.refresh_snapshot(db)
+    client.patch(
+        "/api/v1/accidents/batch",
+        json=[{"id": ids[0], "accident_severity": "Fatal"}],
+    )
+    client.delete(f"/api/v1/accidents/{ids[1]}")
+    client.post(
+        "/api/v1/accidents/",
+        json={"date": "2020-01-01", "accident_severity": "Serious"},
+    )
+    db.rollback()
+
+    refreshed = snapshot.refresh_snapshot(db, taken)
+    rebuilt = snapshot.refresh_snapshot(db)
+
+    everything = AccidentFilters()
+    assert len(refreshed) == len(rebuilt) == len(ids)
+    assert refreshed.summary(everything) == rebuilt.summary(everything)
+    assert sorted(
+        refreshed.breakdown(["accident_severity"], ["count"], everything)
+    ) == sorted(
+        rebuilt.breakdown(["accident_severity"], ["count"], everything)
+    )
@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import delete
+
+from models import User
+from routers.auth import create_access_token, principal_cache
+from services import cache as cache_module
+from services.cache import MemoryCache
+
+USER = {"name": "Ada", "email": "ada@example.com", "password": "secret"}
+
+
+@pytest.fixture(autouse=True)
+def empty_principal_cache():
+    principal_cache.delete_prefix("")
+
+
+@pytest.fixture
+def headers(client):
+    assert client.post("/api/v1/auth/signup", json=USER).status_code == 200
+    response = client.post(
+        "/api/v1/auth/token",
+        data={"username": USER["email"], "password": USER["password"]},
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_wrong_password_is_rejected(client, headers):
+    response = client.post(
+        "/api/v1/auth/token",
+        data={"username": USER["email"], "password": "wrong"},
+    )
+
+    assert response.status_code == 401
+
+
+def test_principal_is_cached_per_token(client, db, headers):
+    assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+    db.execute(delete(User))
+    db.commit()
+
+    response = client.get("/api/v1/auth/me", headers=headers)
+
+    assert response.json()["email"] == USER["email"]
+
+
+def test_profile_change_invalidates_the_principal(client, headers):
+    client.get("/api/v1/auth/me", headers=headers)
+
+    client.patch("/api/v1/auth/me", json={"name": "Grace"}, headers=headers)
+
+    assert client.get("/api/v1/auth/me", headers=headers).json()["name"] == (
+        "Grace"
+    )
+
+
+def test_analytics_payloads_do_not_evict_principals(
+    monkeypatch, client, db, headers
+):
+    analytics_cache = MemoryCache(max_entries=1)
+    monkeypatch.setattr(cache_module, "get_cache", lambda: analytics_cache)
+    client.get("/api/v1/auth/me", headers=headers)
+    for path in ("summary", "by-severity", "by-road-type"):
+        client.get(f"/api/v1/analytics/{path}")
+    db.execute(delete(User))
+    db.commit()
+
+    assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+
+
+def test_unknown_users_leave_nothing_cached(client):
+    for number in range(20):
+        token = create_access_token({"sub": f"ghost{number}@example.com"})
+        response = client.get(
+            "/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 401
+
+    assert not principal_cache._entries
+    assert not principal_cache._counters
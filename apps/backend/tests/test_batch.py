@@ -0,0 +1,79 @@
+BATCH = "/api/v1/accidents/batch"
+
+
+def accident(force: str) -> dict:
+    return {
+        "date": "2020-01-01",
+        "time": "08:00",
+        "accident_severity": "Slight",
+        "latitude": 51.5,
+        "longitude": -0.1,
+        "police_force": force,
+    }
+
+
+def test_repeated_ids_are_deleted_once(client):
+    created = client.post(BATCH, json=[accident("Kent"), accident("Essex")])
+    first, second = (item["id"] for item in created.json())
+
+    response = client.request(
+        "DELETE", BATCH, json=[first, second, first, 0]
+    )
+
+    assert [item["status"] for item in response.json()] == [
+        "deleted",
+        "deleted",
+        "not_found",
+        "not_found",
+    ]
+
+
+def statuses(response) -> list:
+    assert response.status_code == 200
+    return [item["status"] for item in response.json()]
+
+
+def test_creates_skip_taken_natural_keys(client):
+    first = client.post(BATCH, json=[accident("Kent")])
+
+    response = client.post(
+        BATCH, json=[accident("Kent"), accident("Essex"), accident("Essex")]
+    )
+
+    assert statuses(response) == ["conflict", "created", "conflict"]
+    assert response.json()[0]["id"] == first.json()[0]["id"]
+    assert len(client.get("/api/v1/accidents/").json()) == 2
+
+
+def test_updates_report_every_item(client):
+    created = client.post(
+        BATCH,
+        json=[
+            accident(force) for force in ("Kent", "Essex", "Devon", "Dorset")
+        ],
+    )
+    kent, essex, devon, dorset = (item["id"] for item in created.json())
+
+    response = client.patch(
+        BATCH,
+        json=[
+            {"id": kent, "accident_severity": "Fatal"},
+            {"id": kent, "accident_severity": "Serious"},
+            {"id": essex, "police_force": "Essex"},
+            {"id": devon, "police_force": "Kent"},
+            {"id": dorset, "accident_severity": None},
+            {"id": 0, "accident_severity": "Fatal"},
+        ],
+    )
+
+    assert statuses(response) == [
+        "updated",
+        "conflict",
+        "unchanged",
+        # Would take Kent's natural key
+        "conflict",
+        "invalid",
+        "not_found",
+    ]
+    updated = client.get(f"/api/v1/accidents/{kent}").json()
+    assert updated["accident_severity"] == "Fatal"
@@ -0,0 +1,44 @@
+import pytest
+
+from benchmarks.generate import generate_accidents, parse_rows, write_csv
+from benchmarks.run import compare
+from services.upload import convert_chunk, iter_csv_chunks
+
+
+def test_files_depend_only_on_rows_and_seed(tmp_path):
+    first = write_csv(str(tmp_path / "first.csv"), 300, seed=4)
+    second = write_csv(str(tmp_path / "second.csv"), 300, seed=4)
+    other = write_csv(str(tmp_path / "other.csv"), 300, seed=5)
+
+    content = open(first).read()
+    assert content == open(second).read()
+    assert content != open(other).read()
+
+
+def test_generated_accidents_are_chunked_and_valid(tmp_path):
+    chunks = list(generate_accidents(250, seed=1, chunk_size=100))
+    path = write_csv(str(tmp_path / "accidents.csv"), 250, seed=1)
+
+    assert [len(df) for df in chunks] == [100, 100, 50]
+    converted, errors = convert_chunk(next(iter_csv_chunks(path)))
+    assert errors == []
+    assert len(converted) == 250
+
+
+@pytest.mark.parametrize(
+    "value, rows", [("10000", 10_000), ("10k", 10_000), ("1.5M", 1_500_000)]
+)
+def test_row_counts_take_a_suffix(value, rows):
+    assert parse_rows(value) == rows
+
+
+def test_comparisons_give_the_change_of_every_shared_figure():
+    baseline = {"meta": {"rows": 10.0}, "import": {"rows_per_s": 100.0}}
+    results = {
+        "meta": {"rows": 20.0},
+        "import": {"rows_per_s": 125.0, "seconds": 80.0},
+    }
+
+    assert compare(results, baseline) == [
+        "import.rows_per_s: 100.0 -> 125.0 (+25.0%)"
+    ]
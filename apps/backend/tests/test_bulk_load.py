@@ -0,0 +1,94 @@
+import pandas as pd
+import pytest
+from sqlalchemy import func, select
+
+from database import SessionLocal
+from models import Accident, AccidentDailyRollup
+from services.bulk_load import BulkLoader
+from services.rollup import rebuild_rollup
+from services.upload import convert_chunk, iter_csv_chunks
+
+
+def chunks(path: str, size: int):
+    for df in iter_csv_chunks(path, size):
+        yield convert_chunk(df)[0]
+
+
+def count(model=Accident) -> int:
+    with SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(model))
+
+
+def test_atomic_loads_are_visible_only_when_finished(db, accidents_csv):
+    path = accidents_csv(300)
+    loader = BulkLoader(db, atomic=True, upsert=False)
+
+    for df in chunks(path, 100):
+        loader.load(df)
+        assert count() == 0
+
+    assert loader.finish() == 300
+    assert count() == 300
+    assert count(AccidentDailyRollup) > 0
+
+
+def test_chunks_are_committed_as_loaded(db, accidents_csv):
+    loader = BulkLoader(db, upsert=False)
+
+    for loaded, df in enumerate(chunks(accidents_csv(300), 100), 1):
+        loader.load(df)
+        assert count() == 100 * loaded
+
+
+def test_upserts_update_changed_rows_only(db, tmp_path):
+    path = tmp_path / "accidents.csv"
+    header = "date,accident_severity,time,latitude,longitude,police_force\n"
+    rows = [
+        "2020-01-01,Slight,08:00,51.5,-0.1,Kent\n",
+        "2020-01-01,Slight,09:00,51.5,-0.1,Kent\n",
+    ]
+    path.write_text(header + "".join(rows))
+    BulkLoader(db).load(next(chunks(str(path), 10)))
+
+    # The natural key leaves out the severity, the content hash does not
+    path.write_text(header + rows[0] + rows[1].replace("Slight", "Fatal"))
+    loader = BulkLoader(db)
+    loader.load(next(chunks(str(path), 10)))
+
+    assert (loader.inserted, loader.updated, loader.skipped) == (0, 1, 1)
+    severities = db.scalars(
+        select(Accident.accident_severity).order_by(Accident.time)
+    ).all()
+    assert severities == ["Slight", "Fatal"]
+
+
+def rollup_rows(db) -> list:
+    rows = db.execute(select(*AccidentDailyRollup.__table__.columns))
+    return sorted(map(tuple, rows), key=str)
+
+
+@pytest.mark.parametrize(
+    "atomic, upsert", [(False, True), (True, True), (False, False)]
+)
+def test_loads_keep_the_rollup_equal_to_a_rebuild(
+    db, accidents_csv, tmp_path, atomic, upsert
+):
+    path = accidents_csv(300, seed=1)
+    changed = pd.read_csv(path)
+    changed.loc[::3, "number_of_casualties"] += 1
+    changed.loc[1::3, "accident_severity"] = "Fatal"
+    added = accidents_csv(100, seed=2)
+    reimport = str(tmp_path / "changed.csv")
+    pd.concat([changed, pd.read_csv(added)]).to_csv(reimport, index=False)
+
+    # Without upsert the same rows cannot be loaded twice
+    for source in [path, reimport if upsert else added]:
+        loader = BulkLoader(db, atomic=atomic, upsert=upsert)
+        for df in chunks(source, 100):
+            loader.load(df)
+        loader.finish()
+    maintained = rollup_rows(db)
+    rebuild_rollup(db)
+    db.commit()
+
+    assert maintained == rollup_rows(db)
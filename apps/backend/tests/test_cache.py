@@ -0,0 +1,115 @@
+import threading
+
+import database
+from config import get_settings
+from database import READ_PRIMARY_COOKIE
+from services import cache as cache_module
+from services.cache import RedisCache, data_version, get_cache
+
+SUMMARY = "/api/v1/analytics/summary"
+
+
+def cached_responses():
+    """The responses cached for the current data version."""
+    prefix = f"response:{data_version()}:"
+    return [key for key in get_cache()._entries if key.startswith(prefix)]
+
+
+def test_responses_are_cached_per_data_version(client):
+    first = client.get(SUMMARY)
+    assert client.get(SUMMARY).headers["ETag"] == first.headers["ETag"]
+    assert len(cached_responses()) == 1
+
+    created = client.post(
+        "/api/v1/accidents/",
+        json={"date": "2020-01-01", "accident_severity": "Slight"},
+    )
+    assert created.status_code == 200
+    second = client.get(SUMMARY)
+
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.json()["total_accidents"] == 1
+
+
+def test_not_modified_for_a_matching_etag(client):
+    etag = client.get(SUMMARY).headers["ETag"]
+
+    response = client.get(SUMMARY, headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+
+
+def test_replica_reads_are_not_cached(monkeypatch, client):
+    # Any engine other than the primary's stands for a replica
+    monkeypatch.setattr(database, "replica_engine", object())
+    client.cookies.clear()
+
+    assert client.get(SUMMARY).is_success
+    assert cached_responses() == []
+
+    client.cookies.set(READ_PRIMARY_COOKIE, "1")
+    try:
+        assert client.get(SUMMARY).is_success
+    finally:
+        client.cookies.clear()
+    assert len(cached_responses()) == 1
+
+
+class FakeRedis:
+    """The part of the Redis client API the cache uses, over a dict."""
+
+    def __init__(self, values: dict, threads: list):
+        self.values = values
+        self.threads = threads
+
+    def get(self, key):
+        self.threads.append(threading.current_thread())
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.threads.append(threading.current_thread())
+        self.values[key] = value
+
+    def incr(self, key, amount=1):
+        self.threads.append(threading.current_thread())
+        self.values[key] = int(self.values.get(key, 0)) + amount
+        return self.values[key]
+
+
+class FakeAsyncRedis(FakeRedis):
+    async def get(self, key):
+        return super().get(key)
+
+    async def set(self, key, value, ex=None):
+        super().set(key, value, ex)
+
+    async def incr(self, key, amount=1):
+        return super().incr(key, amount)
+
+
+def test_request_handlers_use_the_asyncio_redis_client(monkeypatch, client):
+    values = {}
+    sync_threads = []
+    loop_threads = []
+    redis = RedisCache(
+        FakeRedis(values, sync_threads), FakeAsyncRedis(values, loop_threads)
+    )
+    monkeypatch.setattr(cache_module, "get_cache", lambda: redis)
+    monkeypatch.setattr(get_settings(), "analytics_engine", "snapshot")
+
+    assert client.get(SUMMARY).is_success
+    assert client.post(
+        "/api/v1/accidents/",
+        json={"date": "2020-01-01", "accident_severity": "Slight"},
+    ).is_success
+    assert client.get(SUMMARY).json()["total_accidents"] == 1
+
+    assert values["accident-analyser:data_version"] == 1
+    assert len(cached_responses_in(values)) == 2
+    # The snapshot reads the version in a worker thread, never on the loop
+    assert loop_threads
+    assert not set(loop_threads) & set(sync_threads)
+
+
+def cached_responses_in(values: dict):
+    return [key for key in values if ":response:" in key]
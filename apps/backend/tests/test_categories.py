@@ -0,0 +1,140 @@
+from contextvars import Context
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import insert, text
+
+from database import SessionLocal, engine
+from models import AccidentCategory
+from services.cache import bump_data_version
+from services.categories import UNKNOWN_CODE, category_codes
+
+
+def new_value() -> str:
+    return f"Test value {uuid4().hex}"
+
+
+def test_committed_codes_are_seen_everywhere(db):
+    value = new_value()
+    category_codes.register(db, {"road_type": [value]})
+    code = category_codes.code("road_type", value)
+
+    assert Context().run(category_codes.code, "road_type", value) is None
+    db.commit()
+    assert Context().run(category_codes.code, "road_type", value) == code
+    assert category_codes.decode(code) == value
+
+
+def test_rolled_back_codes_are_forgotten(db):
+    value = new_value()
+    category_codes.register(db, {"road_type": [value]})
+    code = category_codes.code("road_type", value)
+    db.rollback()
+
+    assert category_codes.code("road_type", value) is None
+    assert category_codes.value(code) is None
+
+
+def test_codes_of_a_closed_session_are_forgotten():
+    value = new_value()
+    with SessionLocal() as db:
+        category_codes.register(db, {"road_type": [value]})
+
+    assert category_codes.code("road_type", value) is None
+
+
+def test_unknown_code_is_not_decoded():
+    with pytest.raises(LookupError):
+        category_codes.decode(2**31 - 1)
+
+
+def test_value_of_a_rejected_write_is_stored_later(client):
+    accident = {
+        "date": "2020-01-01",
+        "accident_severity": "Slight",
+        "time": "08:00",
+        "latitude": 51.5,
+        "longitude": -0.1,
+        "police_force": "Kent",
+    }
+    value = new_value()
+    assert client.post("/api/v1/accidents/", json=accident).status_code == 200
+    rejected = client.post(
+        "/api/v1/accidents/", json={**accident, "road_type": value}
+    )
+    created = client.post(
+        "/api/v1/accidents/",
+        json={**accident, "time": "09:00", "road_type": value},
+    )
+
+    assert rejected.status_code == 409
+    assert created.status_code == 200
+    accident_id = created.json()["id"]
+    stored = client.get(f"/api/v1/accidents/{accident_id}")
+    assert stored.json()["road_type"] == value
+
+
+def test_unknown_values_match_nothing(client):
+    value = new_value()
+
+    response = client.get("/api/v1/accidents/", params={"road_type": value})
+
+    assert response.status_code == 200
+    assert response.json() == []
+    assert category_codes.encode("road_type", value) == UNKNOWN_CODE
+
+
+def test_codes_another_process_stored_are_looked_up(client):
+    road_type, severity = new_value(), new_value()
+    # Written as another process would, leaving this one's codes stale
+    with engine.begin() as other:
+        codes = {
+            attribute: other.execute(
+                insert(AccidentCategory).values(
+                    attribute=attribute, value=value
+                )
+            ).inserted_primary_key[0]
+            for attribute, value in [
+                ("road_type", road_type),
+                ("accident_severity", severity),
+            ]
+        }
+        other.execute(
+            text(
+                "INSERT INTO accidents (date, accident_severity, road_type) "
+                "VALUES ('2020-01-01', :accident_severity, :road_type)"
+            ),
+            codes,
+        )
+    bump_data_version()
+
+    filtered = client.get("/api/v1/accidents/", params={"severity": severity})
+    listed = client.get("/api/v1/accidents/")
+
+    assert [item["road_type"] for item in filtered.json()] == [road_type]
+    assert listed.json() == filtered.json()
+    assert listed.json()[0]["accident_severity"] == severity
+
+
+def test_category_values_are_stored_as_shared_codes(client, db):
+    accident = {"date": "2020-01-01", "road_type": "Slip road"}
+    client.post(
+        "/api/v1/accidents/", json={**accident, "accident_severity": "Slight"}
+    )
+    client.post(
+        "/api/v1/accidents/", json={**accident, "accident_severity": "Fatal"}
+    )
+
+    stored = db.execute(
+        text("SELECT road_type, accident_severity FROM accidents")
+    ).all()
+    codes = {road_type for road_type, _ in stored}
+
+    assert len(codes) == 1
+    assert all(isinstance(code, int) for row in stored for code in row)
+    assert category_codes.decode(codes.pop()) == "Slip road"
+    listed = client.get("/api/v1/accidents/").json()
+    assert {item["accident_severity"] for item in listed} == {
+        "Slight",
+        "Fatal",
+    }
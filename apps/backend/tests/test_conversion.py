@@ -0,0 +1,47 @@
+from datetime import date, time
+
+import pandas as pd
+
+from services.upload import convert_chunk
+
+
+def test_columns_are_converted_as_a_whole():
+    raw = pd.DataFrame(
+        {
+            " Date ": ["05/01/2020", "2020-01-06"],
+            "Severity": [" Slight ", "Serious"],
+            "time": ["7:05", "16:45:30"],
+            "vehicles_involved": ["2", ""],
+            "latitude": ["51", "51.5"],
+        }
+    )
+
+    converted, errors = convert_chunk(raw)
+
+    assert errors == []
+    assert converted["date"].tolist() == [date(2020, 1, 5), date(2020, 1, 6)]
+    assert converted["time"].tolist() == [time(7, 5), time(16, 45, 30)]
+    assert converted["accident_severity"].tolist() == ["Slight", "Serious"]
+    assert converted["number_of_vehicles"].tolist() == [2, pd.NA]
+    assert converted["latitude"].dtype == "float64"
+    # Derived from the date when the file has no such column
+    assert converted["year"].tolist() == [2020, 2020]
+    assert converted["day_of_week"].tolist() == [1, 2]
+
+
+def test_invalid_rows_are_rejected_with_every_problem():
+    raw = pd.DataFrame(
+        {
+            "date": ["2020-01-01", "2020-13-01", "2020-01-01"],
+            "accident_severity": ["Slight", None, "Fatal"],
+            "speed_limit": ["30", "30", "30.5"],
+        }
+    )
+
+    converted, errors = convert_chunk(raw, offset=10)
+
+    assert len(converted) == 1
+    assert errors == [
+        {"row": 12, "error": "invalid date; missing accident_severity"},
+        {"row": 13, "error": "invalid integer in speed_limit"},
+    ]
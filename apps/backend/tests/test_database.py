@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import database
+from database import (
+    READ_PRIMARY_COOKIE,
+    Base,
+    async_database_url,
+    create_api_engine,
+    engine_options,
+    settings,
+)
+
+
+def test_api_engines_use_the_async_drivers():
+    assert async_database_url("postgresql://db/accidents").drivername == (
+        "postgresql+asyncpg"
+    )
+    assert async_database_url("sqlite:///accidents.db").drivername == (
+        "sqlite+aiosqlite"
+    )
+
+
+def test_statement_timeout_is_set_on_postgresql_only(monkeypatch):
+    monkeypatch.setattr(settings, "database_statement_timeout_ms", 1500)
+    url = make_url("postgresql+asyncpg://db/accidents")
+
+    options = engine_options(url, statement_timeout=True)
+
+    assert options["pool_size"] == settings.database_pool_size
+    assert options["connect_args"] == {
+        "server_settings": {"statement_timeout": "1500"}
+    }
+    assert "connect_args" not in engine_options(url)
+    assert engine_options(make_url("sqlite:///accidents.db")) == {}
+
+
+
+@pytest.fixture
+def lagging_replica(monkeypatch, tmp_path):
+    """An empty replica, as one that has not caught up with any write."""
+    url = f"sqlite:///{tmp_path / 'replica.db'}"
+    Base.metadata.create_all(create_engine(url))
+    replica = create_api_engine(url, "replica")
+    monkeypatch.setattr(settings, "database_replica_url", url)
+    monkeypatch.setattr(database, "replica_engine", replica)
+    monkeypatch.setattr(
+        database,
+        "ReadSessionLocal",
+        async_sessionmaker(replica, expire_on_commit=False),
+    )
+    yield
+    asyncio.run(replica.dispose())
+
+
+def test_clients_read_their_writes_from_the_primary(client, lagging_replica):
+    client.cookies.clear()
+    accident = {"date": "2020-01-01", "accident_severity": "Slight"}
+    try:
+        assert client.get("/api/v1/accidents/").json() == []
+        rejected = client.post("/api/v1/accidents/", json={})
+        assert READ_PRIMARY_COOKIE not in rejected.cookies
+
+        created = client.post("/api/v1/accidents/", json=accident)
+
+        assert READ_PRIMARY_COOKIE in created.cookies
+        assert len(client.get("/api/v1/accidents/").json()) == 1
+        client.cookies.clear()
+        assert client.get("/api/v1/accidents/").json() == []
+    finally:
+        client.cookies.clear()
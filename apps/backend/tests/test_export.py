@@ -0,0 +1,66 @@
+import gzip
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from services.upload import iter_csv_chunks, process_csv_file
+
+EXPORT = "/api/v1/accidents/export"
+
+
+@pytest.fixture
+def accidents(db, accidents_csv):
+    process_csv_file(iter_csv_chunks(accidents_csv(250, seed=7)), db)
+
+
+def export(client, **params) -> bytes:
+    response = client.get(EXPORT, params=params)
+    assert response.status_code == 200
+    return response.content
+
+
+def listed(client, **params) -> list:
+    response = client.get(
+        "/api/v1/accidents/", params={"limit": 1000, **params}
+    )
+    return response.json()
+
+
+def test_csv_exports_import_as_the_same_accidents(client, accidents):
+    content = export(client, severity="Slight")
+    expected = listed(client, severity="Slight")
+    client.delete("/api/v1/accidents/", params={"severity": "Slight"})
+
+    response = client.post(
+        "/api/v1/accidents/upload",
+        files={"file": ("accidents.csv", content, "text/csv")},
+    )
+
+    assert response.json()["inserted"] == len(expected)
+    # Only the ids are new
+    reimported = listed(client, severity="Slight")
+    assert [{**item, "id": None} for item in reimported] == [
+        {**item, "id": None} for item in expected
+    ]
+
+
+def test_ndjson_exports_hold_the_listed_accidents(client, accidents):
+    lines = export(client, format="ndjson").decode().splitlines()
+
+    assert [json.loads(line) for line in lines] == listed(client)
+
+
+def test_gzip_exports_decompress_to_the_plain_file(client, accidents):
+    compressed = export(client, compress="gzip")
+
+    assert gzip.decompress(compressed) == export(client)
+
+
+def test_parquet_exports_hold_the_listed_accidents(client, accidents):
+    pytest.importorskip("pyarrow")
+
+    df = pd.read_parquet(io.BytesIO(export(client, format="parquet")))
+
+    assert df["id"].tolist() == [item["id"] for item in listed(client)]
@@ -0,0 +1,87 @@
+import os
+import shutil
+import time
+
+from database import SessionLocal
+from models import ImportJob
+from services import import_jobs
+
+JOBS = "/api/v1/accidents/upload/jobs"
+
+
+def wait_for(client, job_id: str) -> dict:
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/v1/accidents/upload/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Import job {job_id} did not finish")
+
+
+def queued_job(db, cancel_requested: bool = False) -> str:
+    job = ImportJob(
+        id="job", filename="accidents.csv", cancel_requested=cancel_requested
+    )
+    db.add(job)
+    db.commit()
+    return job.id
+
+
+def test_jobs_report_their_progress(client, accidents_csv):
+    with open(accidents_csv(250), "rb") as file:
+        response = client.post(
+            JOBS, files={"file": ("accidents.csv", file, "text/csv")}
+        )
+
+    assert response.status_code == 202
+    job = wait_for(client, response.json()["id"])
+    assert job["status"] == "completed"
+    assert job["rows_processed"] == 250
+    assert job["rows_loaded"] == 250
+    assert job["finished_at"] is not None
+
+
+def test_unknown_jobs_are_not_found(client):
+    assert client.get("/api/v1/accidents/upload/missing").status_code == 404
+    response = client.post("/api/v1/accidents/upload/missing/cancel")
+    assert response.status_code == 404
+
+
+def test_jobs_cancelled_before_they_start_load_nothing(
+    db, tmp_path, accidents_csv
+):
+    path = shutil.copy(accidents_csv(10), tmp_path / "spool.csv")
+    job_id = queued_job(db, cancel_requested=True)
+
+    import_jobs.run_import_job(job_id, str(path))
+
+    db.expire_all()
+    job = db.get(ImportJob, job_id)
+    assert (job.status, job.rows_processed) == ("cancelled", 0)
+    assert not os.path.exists(path)
+
+
+def test_cancellation_stops_before_the_next_chunk(
+    monkeypatch, db, tmp_path, accidents_csv
+):
+    path = shutil.copy(accidents_csv(300), tmp_path / "spool.csv")
+    job_id = queued_job(db)
+    read_chunks = import_jobs.iter_csv_chunks
+
+    def cancel_after_first_chunk(source):
+        for position, chunk in enumerate(read_chunks(source, 100)):
+            if position == 1:
+                with SessionLocal() as other:
+                    import_jobs.cancel_import_job(other, job_id)
+            yield chunk
+
+    monkeypatch.setattr(
+        import_jobs, "iter_csv_chunks", cancel_after_first_chunk
+    )
+    import_jobs.run_import_job(job_id, str(path))
+
+    db.expire_all()
+    job = db.get(ImportJob, job_id)
+    assert job.status == "cancelled"
+    assert job.rows_processed == 200
@@ -0,0 +1,117 @@
+import re
+import threading
+import time
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, make_url, text
+
+from database import engine
+from services import metrics
+from services.upload import convert_chunk, load_converted_chunks
+
+
+def value(metric, **labels):
+    return metric._values.get(metric._key(labels), 0)
+
+
+def chunk(rows: int):
+    df = pd.DataFrame(
+        {
+            "date": ["2020-01-01"] * rows,
+            "accident_severity": ["Slight"] * rows,
+            "police_force": [f"Force {index}" for index in range(rows)],
+        }
+    )
+    return (rows, *convert_chunk(df))
+
+
+def test_checked_out_connections_are_returned():
+    before = value(metrics.pool_checked_out, engine="sync")
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        assert value(metrics.pool_checked_out, engine="sync") == before + 1
+
+    assert value(metrics.pool_checked_out, engine="sync") == before
+
+
+def test_new_connections_are_timed():
+    test_engine = create_engine("sqlite://")
+    metrics.instrument_engine(test_engine, "test")
+
+    with test_engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+    counts = metrics.pool_connect._values[("test",)]
+    assert sum(counts[:-1]) == 1
+
+
+def test_checkouts_are_timed_waiting_included(tmp_path):
+    url = make_url(f"sqlite:///{tmp_path / 'pool.db'}")
+    test_engine = create_engine(
+        url,
+        poolclass=metrics.timed_pool_class(url, "checkout"),
+        pool_size=1,
+        max_overflow=0,
+    )
+    held = threading.Event()
+
+    def hold():
+        with test_engine.connect():
+            held.set()
+            time.sleep(0.3)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    held.wait()
+    with test_engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    holder.join()
+
+    counts = metrics.pool_checkout._values[("checkout",)]
+    assert sum(counts[:-1]) == 2
+    assert counts[-1] >= 0.2
+
+
+def test_imports_are_counted_by_outcome(db):
+    def abort(results):
+        raise RuntimeError("aborted")
+
+    before = value(metrics.imports, outcome="failure")
+    successes = value(metrics.imports, outcome="success")
+    rows_before = value(
+        metrics.import_rows, result="inserted", outcome="failure"
+    )
+
+    with pytest.raises(RuntimeError):
+        load_converted_chunks([chunk(3)], db, on_chunk=abort)
+    db.rollback()
+    load_converted_chunks([chunk(2)], db)
+
+    assert value(metrics.imports, outcome="failure") == before + 1
+    assert value(
+        metrics.import_rows, result="inserted", outcome="failure"
+    ) == rows_before + 3
+    assert value(metrics.imports, outcome="success") == successes + 1
+    assert "accident_imports_total" in metrics.registry.render()
+
+
+def test_requests_are_timed_per_route_template(client):
+    created = client.post(
+        "/api/v1/accidents/",
+        json={"date": "2020-01-01", "accident_severity": "Slight"},
+    )
+    route = "/api/v1/accidents/{accident_id}"
+
+    response = client.get(f"/api/v1/accidents/{created.json()['id']}")
+
+    timing = response.headers["Server-Timing"]
+    assert re.fullmatch(
+        r'db;dur=[\d.]+;desc="[1-9]\d* statements", total;dur=[\d.]+',
+        timing,
+    )
+    body = client.get("/metrics").text
+    assert f'route="{route}"' in body
+    assert f'/api/v1/accidents/{created.json()["id"]}"' not in body
+    assert "# TYPE http_request_duration_seconds histogram" in body
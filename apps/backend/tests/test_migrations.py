@@ -0,0 +1,46 @@
+import importlib.util
+from pathlib import Path
+
+import sqlalchemy as sa
+
+VERSIONS = Path(__file__).resolve().parents[1] / "migrations" / "versions"
+
+
+def load_migration(name: str):
+    spec = importlib.util.spec_from_file_location(name, VERSIONS / name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_typed_dates_keep_times_the_orm_wrote():
+    migration = load_migration("0004_typed_dates_and_indexes.py")
+    engine = sa.create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(
+            sa.text(
+                "CREATE TABLE accidents "
+                "(id INTEGER PRIMARY KEY, date VARCHAR, time VARCHAR)"
+            )
+        )
+        connection.execute(
+            sa.text("INSERT INTO accidents VALUES (:id, :date, :time)"),
+            [
+                # As uploaded, and as written on SQLite after a downgrade
+                {"id": 1, "date": "05/01/2020", "time": "16:45"},
+                {"id": 2, "date": "2020-01-05", "time": "16:45:00.000000"},
+                {"id": 3, "date": "2020-01-05 00:00:00", "time": "7:05:30"},
+                {"id": 4, "date": "2020-01-05", "time": None},
+            ],
+        )
+        migration.normalize_date_strings(connection)
+        rows = connection.execute(
+            sa.text("SELECT date, time FROM accidents ORDER BY id")
+        ).all()
+
+    assert rows == [
+        ("2020-01-05", "16:45:00"),
+        ("2020-01-05", "16:45:00"),
+        ("2020-01-05", "07:05:30"),
+        ("2020-01-05", None),
+    ]
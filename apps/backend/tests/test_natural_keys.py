@@ -0,0 +1,91 @@
+from models import Accident
+from services.batch import KEY_CONFLICT
+from services.upload import iter_csv_chunks, process_csv_file
+
+HEADER = "date,accident_severity,time,latitude,longitude,police_force\n"
+
+
+def test_accidents_missing_a_key_part_are_all_imported(tmp_path, db):
+    path = tmp_path / "accidents.csv"
+    path.write_text(
+        HEADER
+        + "2020-01-01,Slight,,,,\n"
+        + "2020-01-01,Serious,,,,\n"
+        + "2020-01-01,Slight,08:00,51.5,-0.1,Kent\n"
+    )
+
+    first = process_csv_file(iter_csv_chunks(str(path)), db)
+
+    assert first["inserted"] == 3
+    keys = sorted(
+        (accident.natural_key is None, accident.accident_severity)
+        for accident in db.query(Accident)
+    )
+    assert keys == [(False, "Slight"), (True, "Serious"), (True, "Slight")]
+
+
+def test_keyless_accidents_do_not_conflict(client):
+    accident = {"date": "2020-01-01", "accident_severity": "Slight"}
+
+    first = client.post("/api/v1/accidents/", json=accident)
+    second = client.post("/api/v1/accidents/", json=accident)
+    batch = client.post("/api/v1/accidents/batch", json=[accident] * 2)
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert [item["status"] for item in batch.json()] == ["created"] * 2
+    ids = {first.json()["id"], second.json()["id"]}
+    ids.update(item["id"] for item in batch.json())
+    assert len(ids) == 4
+
+
+def test_keyed_accidents_still_conflict(client):
+    accident = {
+        "date": "2020-01-01",
+        "accident_severity": "Slight",
+        "time": "08:00",
+        "latitude": 51.5,
+        "longitude": -0.1,
+        "police_force": "Kent",
+    }
+
+    assert client.post("/api/v1/accidents/", json=accident).status_code == 200
+    assert client.post("/api/v1/accidents/", json=accident).status_code == 409
+    batch = client.post("/api/v1/accidents/batch", json=[accident])
+    assert batch.json()[0]["status"] == "conflict"
+
+
+def test_updates_clearing_a_required_field_are_invalid(client):
+    accident = {"date": "2020-01-01", "accident_severity": "Slight"}
+    created = client.post("/api/v1/accidents/", json=accident).json()
+    path = f"/api/v1/accidents/{created['id']}"
+
+    cleared = [
+        client.put(path, json={"date": None}),
+        client.put(path, json={"accident_severity": None}),
+    ]
+
+    assert [response.status_code for response in cleared] == [422, 422]
+    assert client.get(path).json() == created
+
+
+def test_updates_onto_an_existing_key_conflict(client):
+    accident = {
+        "date": "2020-01-01",
+        "accident_severity": "Slight",
+        "time": "08:00",
+        "latitude": 51.5,
+        "longitude": -0.1,
+        "police_force": "Kent",
+    }
+    client.post("/api/v1/accidents/", json=accident)
+    other = client.post(
+        "/api/v1/accidents/", json={**accident, "time": "09:00"}
+    ).json()
+
+    moved = client.put(
+        f"/api/v1/accidents/{other['id']}", json={"time": "08:00"}
+    )
+
+    assert moved.status_code == 409
+    assert moved.json()["detail"] == KEY_CONFLICT
@@ -0,0 +1,48 @@
+from sqlalchemy import select
+
+from models import Accident
+from services import parallel_import
+from services.parallel_import import (
+    process_csv_file_parallel,
+    split_line_ranges,
+)
+from services.upload import iter_csv_chunks, process_csv_file
+
+
+def test_ranges_cover_the_rows_on_line_boundaries(accidents_csv):
+    path = accidents_csv(500)
+    with open(path, "rb") as file:
+        content = file.read()
+
+    ranges = list(split_line_ranges(path, 4096))
+
+    header_end = content.index(b"\n") + 1
+    assert len(ranges) > 1
+    assert ranges[0][0] == header_end
+    assert ranges[-1][1] == len(content)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+        assert content[end - 1:end] == b"\n"
+
+
+def test_parallel_import_matches_a_serial_one(
+    monkeypatch, db, tmp_path, accidents_csv
+):
+    path = tmp_path / "accidents.csv"
+    lines = open(accidents_csv(400)).read().splitlines(keepends=True)
+    # An invalid row in the middle, numbered like a serial import does
+    lines.insert(200, lines[1].replace(lines[1].split(",")[0], "never", 1))
+    path.write_text("".join(lines))
+    monkeypatch.setattr(parallel_import.settings, "import_range_bytes", 8192)
+
+    parallel = process_csv_file_parallel(str(path), db, workers=2)
+    accidents = db.scalars(select(Accident.id)).all()
+    db.rollback()
+    serial = process_csv_file(iter_csv_chunks(str(path)), db)
+
+    assert len(accidents) == 400
+    assert parallel["total_rows"] == serial["total_rows"] == 401
+    assert parallel["errors"] == serial["errors"]
+    assert parallel["errors"][0]["row"] == 200
+    # Serially the same rows are only matched again
+    assert serial["inserted"] == 0
@@ -0,0 +1,49 @@
+from datetime import date
+
+from models import Accident
+from services.row_hashes import record_hashes
+from services.upload import iter_csv_chunks, process_csv_file
+
+HEADER = (
+    "date,accident_severity,time,latitude,longitude,police_force,"
+    "location_easting\n"
+)
+
+
+def test_reimport_with_other_chunk_size_changes_nothing(tmp_path, db):
+    path = tmp_path / "accidents.csv"
+    # Whole eastings alone in a chunk once parsed as integers
+    path.write_text(
+        HEADER
+        + "2020-01-01,Slight,08:00,51.5,-0.1,Kent,525130\n"
+        + "2020-01-02,Serious,09:00,51,-1,Kent,525131\n"
+        + "2020-01-03,Fatal,10:00,52.25,-1.5,Kent,525132.5\n"
+    )
+
+    first = process_csv_file(iter_csv_chunks(str(path), chunksize=3), db)
+    second = process_csv_file(iter_csv_chunks(str(path), chunksize=2), db)
+
+    assert first["inserted"] == 3
+    assert second["inserted"] == 0
+    assert second["updated"] == 0
+    assert second["skipped"] == 3
+
+
+def test_api_record_hashes_like_a_csv_row(tmp_path, db):
+    path = tmp_path / "accidents.csv"
+    path.write_text(HEADER + "2020-01-01,Slight,08:00,51.5,-0.1,Kent,525130\n")
+    process_csv_file(iter_csv_chunks(str(path)), db)
+
+    record = {
+        "date": date(2020, 1, 1),
+        "accident_severity": "Slight",
+        "time": "08:00:00",
+        "latitude": 51.5,
+        "longitude": -0.1,
+        "police_force": "Kent",
+        "location_easting": 525130.0,
+        "year": 2020,
+        "day_of_week": 4,
+    }
+    stored = db.query(Accident).one()
+    assert record_hashes(record)["content_hash"] == stored.content_hash
@@ -0,0 +1,140 @@
+import math
+from collections import Counter
+
+import pytest
+from sqlalchemy import select
+
+from models import Accident
+from services.geohash import encode_geohash
+from services.spatial import EARTH_RADIUS_METRES
+from services.upload import iter_csv_chunks, process_csv_file
+
+
+@pytest.fixture
+def accidents(db, accidents_csv):
+    process_csv_file(iter_csv_chunks(accidents_csv(400, seed=11)), db)
+
+
+def test_geohashes_match_the_reference_encoding():
+    assert encode_geohash(57.64911, 10.40744) == "u4pruydqq"
+    assert encode_geohash(42.605, -5.603)[:5] == "ezs42"
+    assert encode_geohash(91, 0) is None
+    assert encode_geohash(None, 0) is None
+
+
+def test_hotspots_count_the_accidents_per_cell(client, db, accidents):
+    rows = db.execute(select(Accident.latitude, Accident.longitude)).all()
+    expected = Counter(
+        encode_geohash(latitude, longitude)[:4]
+        for latitude, longitude in rows
+        if latitude is not None and longitude is not None
+    )
+
+    response = client.get(
+        "/api/v1/analytics/hotspots", params={"precision": 4, "limit": 10000}
+    )
+
+    hotspots = response.json()
+    assert {item["geohash"]: item["count"] for item in hotspots} == expected
+    counts = [item["count"] for item in hotspots]
+    assert counts == sorted(counts, reverse=True)
+
+
+def distance(latitude, longitude, other_latitude, other_longitude) -> float:
+    """Great circle distance in metres."""
+    phi, other_phi = math.radians(latitude), math.radians(other_latitude)
+    a = (
+        math.sin((other_phi - phi) / 2) ** 2
+        + math.cos(phi)
+        * math.cos(other_phi)
+        * math.sin(math.radians(other_longitude - longitude) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METRES * math.asin(math.sqrt(a))
+
+
+def within(client, **params) -> set:
+    response = client.get(
+        "/api/v1/accidents/within", params={"limit": 1000, **params}
+    )
+    assert response.status_code == 200
+    return {item["id"] for item in response.json()}
+
+
+def test_radius_queries_match_the_great_circle_distance(
+    client, db, accidents
+):
+    centre = (51.507, -0.128)
+    rows = db.execute(
+        select(Accident.id, Accident.latitude, Accident.longitude)
+    ).all()
+    distances = {
+        accident_id: distance(*centre, latitude, longitude)
+        for accident_id, latitude, longitude in rows
+        if latitude is not None
+    }
+
+    found = within(
+        client, latitude=centre[0], longitude=centre[1], radius=8000
+    )
+
+    assert found
+    # The approximation may only differ on the very edge of the circle
+    assert all(distances[accident_id] <= 8080 for accident_id in found)
+    assert {
+        accident_id
+        for accident_id, metres in distances.items()
+        if metres <= 7920
+    } <= found
+
+
+def test_grid_radius_and_bbox_queries(client, db, accidents):
+    east, north = db.execute(
+        select(Accident.location_easting, Accident.location_northing).where(
+            Accident.location_easting.isnot(None)
+        )
+    ).first()
+    rows = db.execute(
+        select(
+            Accident.id,
+            Accident.location_easting,
+            Accident.location_northing,
+            Accident.latitude,
+            Accident.longitude,
+        )
+    ).all()
+
+    by_grid = within(client, easting=east, northing=north, radius=20000)
+    by_bbox = within(client, bbox="-1,51,0,52")
+
+    assert by_grid and by_bbox
+    assert by_grid == {
+        row.id
+        for row in rows
+        if row.location_easting is not None
+        and math.hypot(
+            row.location_easting - east, row.location_northing - north
+        )
+        <= 20000
+    }
+    assert by_bbox == {
+        row.id
+        for row in rows
+        if row.latitude is not None
+        and 51 <= row.latitude <= 52
+        and -1 <= row.longitude <= 0
+    }
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {},
+        {"latitude": 51.5, "radius": 100},
+        {"latitude": 51.5, "longitude": -0.1},
+        {"latitude": 51.5, "longitude": -0.1, "easting": 1, "radius": 100},
+    ],
+)
+def test_incomplete_areas_are_rejected(client, params):
+    response = client.get("/api/v1/accidents/within", params=params)
+
+    assert response.status_code == 400
@@ -0,0 +1,80 @@
+import pytest
+
+from services.upload import settings
+
+UPLOAD = "/api/v1/accidents/upload"
+JOBS = "/api/v1/accidents/upload/jobs"
+HEADER = b"date,accident_severity,time,latitude,longitude,police_force\n"
+INVALID_FILES = {
+    "unclosed quote": HEADER + b'2020-01-01,"Slight\n',
+    "latin-1 header": b"d\xe9te,accident_severity\n2020-01-01,Slight\n",
+    "latin-1 row": HEADER + b"2020-01-01,Slight,08:00,51.5,-0.1,K\xe9nt\n",
+}
+
+
+def upload(client, url, content: bytes, **params):
+    return client.post(
+        url,
+        params=params,
+        files={"file": ("accidents.csv", content, "text/csv")},
+    )
+
+
+@pytest.mark.parametrize("url", [UPLOAD, JOBS])
+@pytest.mark.parametrize("name", INVALID_FILES)
+def test_unreadable_files_are_rejected(client, url, name):
+    response = upload(client, url, INVALID_FILES[name])
+
+    assert response.status_code == 400
+
+
+def test_rows_beyond_the_header_buffer_are_checked_too(client):
+    row = b"2020-01-01,Slight,08:00,51.5,-0.1,Kent\n"
+    content = HEADER + row * 5000 + b"2020-01-02,Slight,,,,K\xe9nt\n"
+
+    response = upload(client, UPLOAD, content)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "CSV file must be UTF-8 encoded"
+
+
+def test_reupload_is_a_no_op(client, accidents_csv):
+    with open(accidents_csv(200), "rb") as file:
+        content = file.read()
+
+    first = upload(client, UPLOAD, content)
+    second = upload(client, UPLOAD, content)
+
+    assert first.status_code == 200
+    assert first.json()["inserted"] + first.json()["skipped"] == 200
+    assert second.json()["inserted"] == 0
+    assert second.json()["updated"] == 0
+
+
+def test_append_rejects_imported_rows(client):
+    content = HEADER + b"2020-01-01,Slight,08:00,51.5,-0.1,Kent\n"
+
+    assert upload(client, UPLOAD, content, mode="append").status_code == 200
+    assert upload(client, UPLOAD, content, mode="append").status_code == 409
+
+
+def test_row_errors_are_numbered_across_chunks(monkeypatch, client):
+    monkeypatch.setattr(settings, "upload_chunk_size", 2)
+    monkeypatch.setattr(settings, "upload_max_errors", 2)
+    content = (
+        HEADER
+        + b"2020-01-01,Slight,08:00,51.5,-0.1,Kent\n"
+        + b"2020-01-01,Slight,8 o'clock,51.5,-0.1,Essex\n"
+        + b"2020-01-02,Serious,09:00,51.5,-0.1,Kent\n"
+        + b"not a date,Slight,09:00,51.5,-0.1,Kent\n"
+        + b"2020-01-03,,09:00,51.5,-0.1,Kent\n"
+    )
+
+    response = upload(client, UPLOAD, content)
+
+    body = response.json()
+    assert (body["count"], body["failed"]) == (2, 3)
+    assert body["errors"] == [
+        {"row": 2, "error": "invalid time"},
+        {"row": 4, "error": "invalid date"},
+    ]